@@ -0,0 +1,59 @@
+"""Cold-start time and peak RSS of loading the training checkpoint vs. exported weights.
+
+Every load runs in a fresh process, so the page cache is the only state
+shared between runs; the first load of each mode is a warm-up and is not
+reported. Run from ``reorder/``::
+
+    python -m LayoutLMv3_T5.benchmarks.cold_start --checkpoint-dir checkpoints --epoch 30 \\
+        --weights-file checkpoints/model_epoch_30.safetensors --repeats 3
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import statistics
+import time
+
+def _rss_mib() -> float:
+    # Linux reports ru_maxrss in KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _load(checkpoint_dir: str, epoch: int, weights_file: str, backend: str, results) -> None:
+    import torch
+    from ..inference.inference import InferenceConfig, load_models
+
+    config = InferenceConfig(checkpoint_dir=checkpoint_dir, epoch=epoch, weights_file=weights_file, backend=backend)
+    before = _rss_mib()
+    start = time.perf_counter()
+    load_models(config, torch.device("cpu"))
+    results.put({"seconds": time.perf_counter() - start, "peak_rss_mib": _rss_mib(), "import_rss_mib": before})
+
+def measure(checkpoint_dir: str, epoch: int, weights_file: str, backend: str) -> dict:
+    """Load the models once in a fresh process and return its timings."""
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_load, args=(checkpoint_dir, epoch, weights_file, backend, results))
+    process.start()
+    stats = results.get()
+    process.join()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkpoint-dir", required=True)
+    parser.add_argument("--epoch", type=int, required=True)
+    parser.add_argument("--weights-file", required=True, help="output of `main.py LayoutLMv3_T5 export_weights`")
+    parser.add_argument("--backend", default="fp32", choices=["fp32", "int8"])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'source':>11} {'seconds':>8} {'peak RSS MiB':>13} {'after import':>13}")
+    for name, weights_file in (("checkpoint", ""), ("safetensors", args.weights_file)):
+        measure(args.checkpoint_dir, args.epoch, weights_file, args.backend)
+        runs = [measure(args.checkpoint_dir, args.epoch, weights_file, args.backend) for _ in range(args.repeats)]
+        print(f"{name:>11} {statistics.median(r['seconds'] for r in runs):8.2f} "
+              f"{statistics.median(r['peak_rss_mib'] for r in runs):13.0f} "
+              f"{statistics.median(r['import_rss_mib'] for r in runs):13.0f}")
+
+if __name__ == "__main__":
+    main()
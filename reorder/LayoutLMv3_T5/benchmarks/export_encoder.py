@@ -0,0 +1,62 @@
+"""Latency of the exported encoder+projection against eager mode per bucket.
+
+Exports the checkpoint first when the export directory is empty, checks the
+graphs against eager mode, then times both on random pages. Run from
+``reorder/``::
+
+    python -m LayoutLMv3_T5.benchmarks.export_encoder --checkpoint-dir checkpoints \\
+        --epoch 30 --export-dir exported_encoder --batch-size 8
+"""
+
+import argparse
+import os
+import time
+
+import torch
+
+from ..inference.export import (
+    DEFAULT_BUCKETS, EXPORT_MANIFEST, EncoderProjection, ExportedEncoder,
+    example_inputs, export_encoder, verify_export
+)
+from ..inference.inference import InferenceConfig, load_models
+
+def _time_ms(fn, inputs, iters: int, warmup: int = 2) -> float:
+    with torch.no_grad():
+        for _ in range(warmup):
+            fn(**inputs)
+        start = time.perf_counter()
+        for _ in range(iters):
+            fn(**inputs)
+    return (time.perf_counter() - start) * 1000 / iters
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkpoint-dir", required=True)
+    parser.add_argument("--epoch", type=int, required=True)
+    parser.add_argument("--export-dir", required=True)
+    parser.add_argument("--buckets", type=int, nargs="+", default=list(DEFAULT_BUCKETS))
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--iters", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads; 0 keeps the default")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = torch.device("cpu")
+    config = InferenceConfig(checkpoint_dir=args.checkpoint_dir, epoch=args.epoch)
+    layout_model, projection, _ = load_models(config, device)
+    if not os.path.exists(os.path.join(args.export_dir, EXPORT_MANIFEST)):
+        export_encoder(layout_model, projection, args.export_dir, args.buckets, args.batch_size, device)
+    exported = ExportedEncoder(args.export_dir, device)
+    diffs = verify_export(exported, layout_model, projection)
+
+    eager = EncoderProjection(layout_model, projection).eval()
+    print(f"{'bucket':>6} {'eager ms':>9} {'graph ms':>9} {'speedup':>8} {'max diff':>9}")
+    for bucket in exported.buckets:
+        inputs = example_inputs(layout_model, args.batch_size, bucket, device)
+        eager_ms = _time_ms(eager, inputs, args.iters)
+        graph_ms = _time_ms(exported, inputs, args.iters)
+        print(f"{bucket:6d} {eager_ms:9.1f} {graph_ms:9.1f} {eager_ms / graph_ms:7.2f}x {diffs[bucket]:9.1e}")
+
+if __name__ == "__main__":
+    main()
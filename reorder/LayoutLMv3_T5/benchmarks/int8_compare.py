@@ -0,0 +1,123 @@
+"""Compare the dynamic int8 CPU backend against fp32 on a validation slice.
+
+Both backends run the same pages in separate processes, so peak memory is
+measured per backend. BLEU is computed with ``evaluation/reorder_bluescore.py``
+against the labelled validation NDJSON. Run from ``reorder/``::
+
+    python -m LayoutLMv3_T5.benchmarks.int8_compare --valid-json valid_dataset.json \\
+        --img-dir valid_images --checkpoint-dir checkpoints --epoch 30 --max-pages 200
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+from dataclasses import replace
+from queue import Empty
+
+import torch
+
+from ..inference.inference import InferenceConfig, load_models, run_inference
+from ..inference.quantization import export_int8_state
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+def _model_mb(models, backend: str) -> float:
+    """Size of the weights of the three models in MiB."""
+    total = 0
+    for model in models:
+        state = export_int8_state(model) if backend == "int8" else model.state_dict()
+        total += sum(t.numel() * t.element_size() for t in state.values() if torch.is_tensor(t))
+    return total / 1024 ** 2
+
+def _prepare_int8(config: InferenceConfig, queue) -> None:
+    """Quantize the fp32 checkpoint and save it (runs in its own process)."""
+    load_models(config, torch.device("cpu"))
+    queue.put(None)
+
+def _run_backend(config: InferenceConfig, queue) -> None:
+    """Run one backend and report its statistics (runs in its own process)."""
+    stats = run_inference(config, torch.device("cpu"))
+    # ru_maxrss is reported in KiB on Linux
+    stats["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    stats["model_mb"] = _model_mb(load_models(config, torch.device("cpu")), config.backend)
+    queue.put(stats)
+
+def _in_process(target, config: InferenceConfig):
+    """Run ``target(config, queue)`` in a fresh process and return what it reports."""
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=target, args=(config, queue))
+    proc.start()
+    result = None
+    while proc.is_alive() or not queue.empty():
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Empty:
+            continue
+    proc.join()
+    if proc.exitcode:
+        raise RuntimeError(f"{target.__name__} failed with exit code {proc.exitcode}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--valid-json", required=True, help="Labelled validation NDJSON")
+    parser.add_argument("--img-dir", required=True, help="Validation images")
+    parser.add_argument("--checkpoint-dir", required=True)
+    parser.add_argument("--epoch", type=int, required=True)
+    parser.add_argument("--max-pages", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads; 0 keeps the default")
+    parser.add_argument("--out-dir", default="int8_compare")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    base = InferenceConfig(
+        test_json=args.valid_json,
+        test_img_dir=args.img_dir,
+        checkpoint_dir=args.checkpoint_dir,
+        epoch=args.epoch,
+        batch_size=args.batch_size,
+        pin_memory=False,
+        cpu_threads=args.threads,
+        max_pages=args.max_pages,
+        resume=False,
+    )
+    configs = {
+        "fp32": replace(base, backend="fp32",
+                        output_json=os.path.join(args.out_dir, "predictions_fp32.json")),
+        "int8": replace(base, backend="int8",
+                        output_json=os.path.join(args.out_dir, "predictions_int8.json"),
+                        quantized_checkpoint=os.path.join(args.out_dir, f"model_epoch_{args.epoch}_int8.pth")),
+    }
+    # Quantize up front so the int8 run measures loading the saved checkpoint
+    if not os.path.exists(configs["int8"].quantized_checkpoint):
+        _in_process(_prepare_int8, configs["int8"])
+
+    sys.path.insert(0, REPO_ROOT)
+    from evaluation.reorder_bluescore import calculate_bleu_scores, load_cleaned_texts, load_valid_dataset
+    valid_data = load_valid_dataset(args.valid_json)
+
+    results = {}
+    for name, config in configs.items():
+        print(f"=== {name} ===")
+        results[name] = _in_process(_run_backend, config)
+        scores = calculate_bleu_scores(load_cleaned_texts(config.output_json), valid_data)
+        results[name]["bleu"] = sum(scores.values()) / max(len(scores), 1)
+
+    print()
+    print(f"{'backend':8} {'pages/s':>9} {'ms/page':>9} {'peak RSS MB':>12} {'model MB':>9} {'BLEU':>7}")
+    for name, r in results.items():
+        print(f"{name:8} {r['pages_per_sec']:9.2f} {r['seconds'] * 1000 / max(r['pages'], 1):9.1f} "
+              f"{r['peak_rss_mb']:12.0f} {r['model_mb']:9.1f} {r['bleu']:7.4f}")
+    fp32, int8 = results["fp32"], results["int8"]
+    print(f"\nSpeedup {int8['pages_per_sec'] / max(fp32['pages_per_sec'], 1e-9):.2f}x, "
+          f"peak RSS {int8['peak_rss_mb'] - fp32['peak_rss_mb']:+.0f} MB, "
+          f"model size {int8['model_mb'] / max(fp32['model_mb'], 1e-9):.2f}x, "
+          f"BLEU delta {int8['bleu'] - fp32['bleu']:+.4f}")
+
+if __name__ == "__main__":
+    main()
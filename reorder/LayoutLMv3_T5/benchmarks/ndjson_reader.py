@@ -0,0 +1,84 @@
+"""Benchmark the chunked ijson NDJSON reader against the byte-offset index.
+
+Run from ``reorder/``::
+
+    python -m LayoutLMv3_T5.benchmarks.ndjson_reader --json train_dataset.json
+    python -m LayoutLMv3_T5.benchmarks.ndjson_reader --json /tmp/synthetic.json --generate-gb 3
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+from ..fine_tune.data.ndjson_reader import iter_ndjson_in_chunks
+from ..fine_tune.data.ndjson_index import NdjsonIndex, build_ndjson_index, default_index_path
+
+def generate_synthetic_ndjson(path: str, target_gb: float, words_per_page: int = 400) -> None:
+    """Write a synthetic NDJSON file shaped like the reorder training set."""
+    rng = random.Random(0)
+    vocab = [f"word{i}" for i in range(5000)]
+    target_bytes = int(target_gb * 1024 ** 3)
+    written = 0
+    idx = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target_bytes:
+            words = [rng.choice(vocab) for _ in range(words_per_page)]
+            boxes = [[rng.randint(0, 1000) for _ in range(4)] for _ in words]
+            line = json.dumps({
+                "img_name": f"page_{idx}.png",
+                "src_word_list": words,
+                "src_wordbox_list": boxes,
+                "ordered_src_doc": sorted(words),
+            }) + "\n"
+            f.write(line)
+            written += len(line)
+            idx += 1
+    print(f"Generated {idx} records ({written / 1024 ** 3:.2f} GB) in {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", required=True, help="NDJSON file to read")
+    parser.add_argument("--generate-gb", type=float, default=0.0,
+                        help="Generate a synthetic file of this size first")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--random-reads", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.generate_gb > 0:
+        generate_synthetic_ndjson(args.json, args.generate_gb)
+    size_mb = os.path.getsize(args.json) / 1024 ** 2
+
+    start = time.perf_counter()
+    num_records = sum(len(chunk) for chunk in iter_ndjson_in_chunks(args.json, args.chunk_size))
+    legacy_s = time.perf_counter() - start
+    print(f"ijson chunk reader : {legacy_s:8.2f} s  {num_records / legacy_s:10.0f} rec/s  {size_mb / legacy_s:8.1f} MB/s")
+
+    index_path = default_index_path(args.json)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    start = time.perf_counter()
+    build_ndjson_index(args.json)
+    build_s = time.perf_counter() - start
+    print(f"index build        : {build_s:8.2f} s  ({os.path.getsize(index_path) / 1024 ** 2:.1f} MB sidecar)")
+
+    records = NdjsonIndex(args.json)
+    start = time.perf_counter()
+    for _ in records:
+        pass
+    seq_s = time.perf_counter() - start
+    print(f"indexed sequential : {seq_s:8.2f} s  {len(records) / seq_s:10.0f} rec/s  {size_mb / seq_s:8.1f} MB/s")
+
+    rng = random.Random(0)
+    picks = [rng.randrange(len(records)) for _ in range(args.random_reads)]
+    start = time.perf_counter()
+    for idx in picks:
+        records[idx]
+    rand_s = time.perf_counter() - start
+    print(f"indexed random     : {rand_s / len(picks) * 1e6:8.1f} us/record over {len(picks)} reads")
+    # The chunk reader has no seek: reaching a random record scans half the file on average
+    print(f"ijson random (est.): {legacy_s / 2 * 1e6:8.1f} us/record")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Load-test client for the LayoutLMv3 + T5 inference server.
+
+Sends pages of an NDJSON file from a number of concurrent connections and
+reports client-side throughput and latency next to the server's metrics.
+Start the server (``python main.py LayoutLMv3_T5 serve``), then run from
+``reorder/``::
+
+    python -m LayoutLMv3_T5.benchmarks.server_load --json valid_dataset.json \\
+        --img-dir valid_images --requests 500 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+import numpy as np
+
+from common.http import JsonHttpClient
+
+def load_payloads(json_path: str, img_dir: str, limit: int) -> list:
+    """Build ``/reorder`` request bodies for the first ``limit`` pages."""
+    payloads = []
+    with open(json_path, "r", encoding="utf-8") as f:
+        for line in islice((line for line in f if line.strip()), limit):
+            record = json.loads(line)
+            with open(os.path.join(img_dir, record["img_name"]), "rb") as img:
+                image = base64.b64encode(img.read()).decode("ascii")
+            payloads.append({
+                "img_name": record["img_name"],
+                "image": image,
+                "src_word_list": record["src_word_list"],
+                "src_wordbox_list": record["src_wordbox_list"],
+            })
+    return payloads
+
+async def run_load(host: str, port: int, payloads: list, num_requests: int, concurrency: int) -> None:
+    latencies = []
+    statuses = Counter()
+    next_request = iter(range(num_requests))
+
+    async def worker() -> None:
+        client = JsonHttpClient(host, port)
+        try:
+            for i in next_request:
+                start = time.perf_counter()
+                status, _ = await client.request("POST", "/reorder", payloads[i % len(payloads)])
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] += 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{num_requests} requests in {elapsed:.1f}s ({num_requests / elapsed:.1f} req/s) "
+          f"with {concurrency} connections")
+    print(f"Client latency p50 {p50:.1f} ms, p99 {p99:.1f} ms; status codes {dict(statuses)}")
+
+    client = JsonHttpClient(host, port)
+    _, metrics = await client.request("GET", "/metrics")
+    await client.close()
+    print(f"Server metrics: {json.dumps(metrics)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", required=True, help="NDJSON pages to send")
+    parser.add_argument("--img-dir", required=True, help="Page images")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=100, help="Distinct pages cycled through")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.json, args.img_dir, args.pages)
+    asyncio.run(run_load(args.host, args.port, payloads, args.requests, args.concurrency))
+
+if __name__ == "__main__":
+    main()
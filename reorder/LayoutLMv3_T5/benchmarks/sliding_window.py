@@ -0,0 +1,133 @@
+"""Truncation rate and encoder throughput of sliding windows against truncation.
+
+The word counts of ``--stats-pages`` pages are tokenized to measure how many
+pages exceed the LayoutLMv3 limit and how many words truncation drops, with
+and without windows. The first ``--max-pages`` pages are then collated and
+encoded (LayoutLMv3, projection and the T5 encoder) in both modes to compare
+pages/sec. Run from ``reorder/``::
+
+    python -m LayoutLMv3_T5.benchmarks.sliding_window --test-json valid_dataset.json \\
+        --img-dir valid_images --checkpoint-dir checkpoints --epoch 30
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import Subset
+
+from ..fine_tune.data.ndjson_index import NdjsonIndex
+from ..fine_tune.data.ndjson_reader import iter_ndjson_in_chunks
+from ..fine_tune.windowing import plan_windows
+from ..inference.inference import InferenceCollator, InferenceConfig, OcrInferenceDataset, ReorderSession
+
+def _sync(device: torch.device) -> None:
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+def truncation_stats(records, tokenizer, overlap: int, max_windows: int, chunk_size: int = 500) -> dict:
+    """Pages over the limit and words dropped with truncation and with windows.
+
+    Windows are planned in source order here; box order only changes which
+    words share a window, not how many fit.
+    """
+    max_tokens = tokenizer.model_max_length - tokenizer.num_special_tokens_to_add()
+    pages = long_pages = still_truncated = words = lost = lost_windowed = 0
+    tokens = []
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        encoded = tokenizer([r["src_word_list"] for r in chunk], boxes=[r["src_wordbox_list"] for r in chunk],
+                            add_special_tokens=False, verbose=False)
+        for i, record in enumerate(chunk):
+            counts = np.bincount(
+                [w for w in encoded.word_ids(i) if w is not None],
+                minlength=len(record["src_word_list"])
+            )
+            total = int(counts.sum())
+            kept = int(np.searchsorted(np.cumsum(counts), max_tokens, side="right"))
+            covered = plan_windows(counts.tolist(), max_tokens, overlap, max_windows)[-1][1]
+            pages += 1
+            words += len(counts)
+            tokens.append(total)
+            long_pages += total > max_tokens
+            still_truncated += covered < len(counts)
+            lost += len(counts) - kept
+            lost_windowed += len(counts) - covered
+    return {
+        "pages": pages,
+        "max_tokens": max_tokens,
+        "long_pages": long_pages,
+        "still_truncated": still_truncated,
+        "words": words,
+        "lost": lost,
+        "lost_windowed": lost_windowed,
+        "tokens_p50": float(np.percentile(tokens, 50)) if tokens else 0.0,
+        "tokens_p99": float(np.percentile(tokens, 99)) if tokens else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--test-json", required=True, help="NDJSON with src_word_list and src_wordbox_list")
+    parser.add_argument("--img-dir", required=True)
+    parser.add_argument("--checkpoint-dir", required=True)
+    parser.add_argument("--epoch", type=int, required=True)
+    parser.add_argument("--max-pages", type=int, default=128, help="pages encoded for throughput")
+    parser.add_argument("--stats-pages", type=int, default=5000, help="pages tokenized for the truncation rate")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--window-overlap", type=int, default=128)
+    parser.add_argument("--max-windows", type=int, default=4)
+    parser.add_argument("--backend", default="fp32", choices=["fp32", "int8"])
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads; 0 keeps the default")
+    args = parser.parse_args()
+
+    config = InferenceConfig(
+        test_json=args.test_json,
+        test_img_dir=args.img_dir,
+        checkpoint_dir=args.checkpoint_dir,
+        epoch=args.epoch,
+        backend=args.backend,
+        cpu_threads=args.threads
+    )
+    session = ReorderSession(config)
+    tokenizer = session.processor.tokenizer
+
+    stats_records = []
+    for chunk in iter_ndjson_in_chunks(args.test_json):
+        stats_records.extend(chunk[:args.stats_pages - len(stats_records)])
+        if len(stats_records) >= args.stats_pages:
+            break
+    stats = truncation_stats(stats_records, tokenizer, args.window_overlap, args.max_windows)
+    print(f"{stats['pages']} pages, tokens per page p50 {stats['tokens_p50']:.0f} / p99 {stats['tokens_p99']:.0f}, "
+          f"limit {stats['max_tokens']}")
+    print(f"Truncated: {stats['long_pages']} pages ({stats['long_pages'] / max(stats['pages'], 1):.2%}), "
+          f"{stats['lost']} words ({stats['lost'] / max(stats['words'], 1):.2%})")
+    print(f"With up to {args.max_windows} windows: {stats['still_truncated']} pages "
+          f"({stats['still_truncated'] / max(stats['pages'], 1):.2%}), {stats['lost_windowed']} words "
+          f"({stats['lost_windowed'] / max(stats['words'], 1):.2%})")
+
+    records = NdjsonIndex(args.test_json)
+    dataset = Subset(OcrInferenceDataset(records, args.img_dir), range(min(args.max_pages, len(records))))
+    print(f"{'mode':>10} {'seconds':>8} {'pages/s':>8} {'windows':>8} {'tokens':>8}")
+    for sliding_window in (False, True):
+        collator = InferenceCollator(session.processor, sliding_window=sliding_window,
+                                     window_overlap=args.window_overlap, max_windows=args.max_windows)
+        seconds = 0.0
+        windows = tokens = 0
+        with torch.no_grad(), torch.cuda.amp.autocast(enabled=session.device.type == "cuda"):
+            for start in range(0, len(dataset), args.batch_size):
+                items = [dataset[i] for i in range(start, min(start + args.batch_size, len(dataset)))]
+                t0 = time.perf_counter()
+                batch = collator(items)
+                feats, mask = session.encode_batch(batch)
+                session.t5_model.get_encoder()(inputs_embeds=feats, attention_mask=mask)
+                _sync(session.device)
+                seconds += time.perf_counter() - t0
+                windows += len(batch["input_ids"])
+                tokens += int(mask.sum())
+        name = "windowed" if sliding_window else "truncated"
+        print(f"{name:>10} {seconds:8.2f} {len(dataset) / max(seconds, 1e-9):8.2f} "
+              f"{windows / max(len(dataset), 1):8.2f} {tokens:8d}")
+
+if __name__ == "__main__":
+    main()
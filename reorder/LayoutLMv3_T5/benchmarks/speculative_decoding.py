@@ -0,0 +1,112 @@
+"""Tokens/sec of copy-draft speculative decoding against greedy ``generate``.
+
+Pages are encoded once, then decoded with ``t5_model.generate`` and with
+``CopySpeculativeDecoder``; only decoding is timed. The outputs must be
+identical, and any page where they differ is reported. Run from
+``reorder/``::
+
+    python -m LayoutLMv3_T5.benchmarks.speculative_decoding --test-json valid_dataset.json \\
+        --img-dir valid_images --checkpoint-dir checkpoints --epoch 30 --max-pages 64
+"""
+
+import argparse
+import time
+
+import torch
+from torch.utils.data import Subset
+
+from ..fine_tune.data.ndjson_index import NdjsonIndex
+from ..inference.inference import InferenceConfig, OcrInferenceDataset, ReorderSession
+
+def _sync(device: torch.device) -> None:
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+def _tokens(row: torch.Tensor, eos: int) -> list:
+    """Generated tokens up to and including the first EOS, without the start token."""
+    ids = row[1:].tolist()
+    return ids[:ids.index(eos) + 1] if eos in ids else ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--test-json", required=True, help="NDJSON with src_word_list and src_wordbox_list")
+    parser.add_argument("--img-dir", required=True)
+    parser.add_argument("--checkpoint-dir", required=True)
+    parser.add_argument("--epoch", type=int, required=True)
+    parser.add_argument("--max-pages", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--draft-tokens", type=int, default=10)
+    parser.add_argument("--draft-ngram", type=int, default=3)
+    parser.add_argument("--max-output-length", type=int, default=512)
+    parser.add_argument("--backend", default="fp32", choices=["fp32", "int8"])
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads; 0 keeps the default")
+    args = parser.parse_args()
+
+    config = InferenceConfig(
+        test_json=args.test_json,
+        test_img_dir=args.img_dir,
+        checkpoint_dir=args.checkpoint_dir,
+        epoch=args.epoch,
+        max_output_length=args.max_output_length,
+        backend=args.backend,
+        cpu_threads=args.threads,
+        speculative=True,
+        draft_tokens=args.draft_tokens,
+        draft_ngram=args.draft_ngram
+    )
+    session = ReorderSession(config)
+    records = NdjsonIndex(args.test_json)
+    dataset = Subset(OcrInferenceDataset(records, args.img_dir), range(min(args.max_pages, len(records))))
+    collator = session.collator()
+    decoder = session.speculative
+    eos = session.t5_model.config.eos_token_id
+
+    greedy_s = speculative_s = 0.0
+    greedy_tokens = greedy_passes = 0
+    mismatches = []
+    with torch.no_grad():
+        for start in range(0, len(dataset), args.batch_size):
+            batch = collator([dataset[i] for i in range(start, min(start + args.batch_size, len(dataset)))])
+            mask = batch["attention_mask"].to(session.device)
+            feats = session.encode(
+                input_ids=batch["input_ids"].to(session.device),
+                bbox=batch["bbox"].to(session.device),
+                attention_mask=mask,
+                pixel_values=batch["pixel_values"].to(session.device)
+            )
+
+            _sync(session.device)
+            t0 = time.perf_counter()
+            greedy = session.t5_model.generate(inputs_embeds=feats, attention_mask=mask,
+                                               max_length=args.max_output_length).cpu()
+            _sync(session.device)
+            t1 = time.perf_counter()
+            drafted = decoder.generate(feats, mask, batch["source_ids"], args.max_output_length)
+            _sync(session.device)
+            speculative_s += time.perf_counter() - t1
+            greedy_s += t1 - t0
+            greedy_passes += greedy.size(1) - 1
+
+            for row, img_name in enumerate(batch["img_names"]):
+                ids = _tokens(greedy[row], eos)
+                greedy_tokens += len(ids)
+                if ids != _tokens(drafted[row], eos):
+                    mismatches.append(img_name)
+
+    pages = len(dataset)
+    print(f"{pages} pages, batch size {args.batch_size}, {greedy_tokens} tokens, "
+          f"draft {args.draft_tokens} tokens / {args.draft_ngram}-gram lookup")
+    print(f"{'decoder':>12} {'seconds':>8} {'tokens/s':>9} {'passes':>7}")
+    print(f"{'greedy':>12} {greedy_s:8.2f} {greedy_tokens / max(greedy_s, 1e-9):9.1f} {greedy_passes:7d}")
+    print(f"{'speculative':>12} {speculative_s:8.2f} {decoder.tokens / max(speculative_s, 1e-9):9.1f} "
+          f"{decoder.passes:7d}")
+    print(f"Speedup {greedy_s / max(speculative_s, 1e-9):.2f}x, "
+          f"{decoder.tokens / max(decoder.passes, 1):.2f} tokens per pass, "
+          f"{decoder.accepted / max(decoder.drafted, 1):.0%} of draft tokens accepted")
+    if mismatches:
+        print(f"Outputs differ from greedy on {len(mismatches)} pages: {mismatches[:10]}")
+    else:
+        print("Outputs identical to greedy decoding")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Asynchronous, rotating and resumable training checkpoints."""
+
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import torch
+
+MANIFEST_FILE = "checkpoints.json"
+
+def snapshot_to_cpu(obj: Any) -> Any:
+    """Copy every tensor of a (nested) state dict into CPU memory.
+
+    The copy decouples the snapshot from the live parameters and optimizer
+    state, so training can continue while the snapshot is written.
+
+    Args:
+        obj: State dict, list or tensor
+
+    Returns:
+        Same structure holding CPU tensor copies
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot_to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot_to_cpu(v) for v in obj)
+    return obj
+
+def capture_rng_state() -> Dict:
+    """Return the torch CPU and CUDA random generator states."""
+    return {
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+    }
+
+def restore_rng_state(state: Dict) -> None:
+    """Restore generator states returned by ``capture_rng_state``."""
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+class CheckpointManager:
+    """Writes checkpoints in a background thread and rotates old ones.
+
+    Saving blocks only for the copy of the state to CPU memory; ``torch.save``
+    runs in a writer thread. Files are written under a temporary name and
+    renamed when complete, and ``checkpoints.json`` in the save directory
+    records the latest checkpoint and the files of every rotation pool.
+    """
+
+    def __init__(self, save_dir: str):
+        """Initialize manager.
+
+        Args:
+            save_dir: Directory holding checkpoints and the manifest
+        """
+        self.save_dir = save_dir
+        self.manifest_path = os.path.join(save_dir, MANIFEST_FILE)
+        self._thread = None
+        self._error = None
+
+    def _read_manifest(self) -> Dict:
+        if not os.path.exists(self.manifest_path):
+            return {"latest": None, "pools": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def save(self, state: Dict, filename: str, pool: str, keep_last: int = 0,
+             extra_paths: Sequence[str] = ()) -> None:
+        """Snapshot ``state`` and write it to ``filename`` in the background.
+
+        Waits for the previous write first, so at most one snapshot is held
+        in CPU memory.
+
+        Args:
+            state: Checkpoint dictionary (may hold GPU tensors)
+            filename: File name inside the save directory
+            pool: Rotation pool the checkpoint belongs to (e.g. ``"step"``)
+            keep_last: Number of checkpoints kept in ``pool`` (0 keeps all)
+            extra_paths: Files or directories deleted together with the
+                checkpoint when it is rotated out
+        """
+        self.wait()
+        snapshot = snapshot_to_cpu(state)
+        self._thread = threading.Thread(
+            target=self._write,
+            args=(snapshot, filename, pool, keep_last, list(extra_paths))
+        )
+        self._thread.start()
+
+    def _write(self, snapshot: Dict, filename: str, pool: str, keep_last: int,
+               extra_paths: List[str]) -> None:
+        try:
+            path = os.path.join(self.save_dir, filename)
+            torch.save(snapshot, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+            manifest = self._read_manifest()
+            manifest["latest"] = filename
+            entries = [e for e in manifest["pools"].get(pool, []) if e["file"] != filename]
+            entries.append({"file": filename, "extra": extra_paths})
+            while keep_last and len(entries) > keep_last:
+                old = entries.pop(0)
+                for old_path in [os.path.join(self.save_dir, old["file"])] + old["extra"]:
+                    if os.path.isdir(old_path):
+                        shutil.rmtree(old_path, ignore_errors=True)
+                    elif os.path.exists(old_path):
+                        os.remove(old_path)
+            manifest["pools"][pool] = entries
+            self._write_manifest(manifest)
+        except BaseException as e:  # re-raised by wait()
+            self._error = e
+
+    def wait(self) -> None:
+        """Block until the pending write is done, raising its error if any."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing checkpoint failed") from error
+
+    def latest(self) -> Optional[str]:
+        """Return the path of the newest complete checkpoint, if any."""
+        filename = self._read_manifest()["latest"]
+        if filename is None:
+            return None
+        path = os.path.join(self.save_dir, filename)
+        return path if os.path.exists(path) else None
@@ -1,9 +1,15 @@
 """Custom collator for LayoutLMv3 + T5 model."""
 
+import time
 from dataclasses import dataclass
+import torch
+from torch.nn.utils.rnn import pad_sequence
 from transformers import AutoTokenizer
 from typing import Dict, List
 
+from .pointer import target_order, word_positions
+from .windowing import encode_windows
+
 # Initialize tokenizer at module level
 t5_tokenizer = AutoTokenizer.from_pretrained("t5-small")
 
@@ -12,6 +18,11 @@ class CustomCollator:
     """Custom collator for processing batches of data."""
     
     processor: object  # LayoutLMv3 processor
+    timed: bool = False  # report stage times in ``stage_times``
+    pointer: bool = False  # pointer-head targets instead of T5 labels
+    sliding_window: bool = False  # overlapping windows instead of truncating pages over 512 tokens
+    window_overlap: int = 128  # tokens shared by consecutive windows
+    max_windows: int = 4  # windows per page
     
     def __call__(self, features: List[Dict]) -> Dict:
         """Process a batch of features.
@@ -25,30 +36,113 @@ class CustomCollator:
         images = [f["image"] for f in features]
         words = [f["words"] for f in features]
         boxes = [f["boxes"] for f in features]
-        targets = [f["target"] for f in features]
+        start = time.perf_counter() if self.timed else 0.0
 
         # Process with LayoutLMv3 processor
-        encoding = self.processor(
-            images,
-            words,
-            boxes=boxes,
-            return_tensors="pt",
-            padding=True,
-            truncation=True
-        )
-        
-        # Tokenize targets with T5 tokenizer
-        labels = t5_tokenizer(
-            targets,
-            return_tensors="pt",
-            padding=True,
-            truncation=True
-        ).input_ids
+        if self.sliding_window:
+            batch = encode_windows(self.processor, images, words, boxes, overlap=self.window_overlap,
+                                   max_windows=self.max_windows)
+        else:
+            encoding = self.processor(
+                images,
+                words,
+                boxes=boxes,
+                return_tensors="pt",
+                padding=True,
+                truncation=True
+            )
+
+            batch = {
+                "pixel_values": encoding["pixel_values"],
+                "input_ids": encoding["input_ids"],
+                "attention_mask": encoding["attention_mask"],
+                "bbox": encoding["bbox"]
+            }
+        if self.pointer:
+            # Reading order as indices into the words that survived truncation
+            word_index, word_mask = word_positions(encoding, len(features))
+            pointer_targets = torch.full_like(word_index, -100)
+            for i, f in enumerate(features):
+                order = target_order(f["words"], f["ordered_words"], int(word_mask[i].sum()))
+                pointer_targets[i, :len(order)] = torch.tensor(order, dtype=torch.long)
+            batch.update(word_index=word_index, word_mask=word_mask, pointer_targets=pointer_targets)
+        else:
+            # Tokenize targets with T5 tokenizer
+            batch["labels"] = t5_tokenizer(
+                [f["target"] for f in features],
+                return_tensors="pt",
+                padding=True,
+                truncation=True
+            ).input_ids
+        if self.timed:
+            stage_times = {"processor": time.perf_counter() - start}
+            for f in features:
+                for name, seconds in f.get("timing", {}).items():
+                    stage_times[name] = stage_times.get(name, 0.0) + seconds
+            batch["stage_times"] = stage_times
+        return batch
+
+@dataclass
+class CachedFeatureCollator:
+    """Collator for samples read from a feature cache.
+
+    Pads the unpadded cached sequences the same way ``CustomCollator`` pads
+    processor and tokenizer output, so both paths produce identical batches.
+    """
+
+    pad_token_id: int  # LayoutLMv3 tokenizer pad id
+    label_pad_token_id: int = t5_tokenizer.pad_token_id
 
+    def __call__(self, features: List[Dict]) -> Dict:
+        """Pad and stack a batch of cached features.
+
+        Args:
+            features: List of feature dictionaries from ``CachedFeatureDataset``
+
+        Returns:
+            Dictionary containing processed batch data
+        """
+        def pad(name, value):
+            return pad_sequence(
+                [f[name].long() for f in features],
+                batch_first=True,
+                padding_value=value
+            )
+
+        return {
+            "pixel_values": torch.stack([f["pixel_values"] for f in features]),
+            "input_ids": pad("input_ids", self.pad_token_id),
+            "attention_mask": pad("attention_mask", 0),
+            "bbox": pad("bbox", 0),
+            "labels": pad("labels", self.label_pad_token_id)
+        }
+
+
+@dataclass
+class HiddenStateCollator:
+    """Collator for samples read from a hidden state store."""
+
+    label_pad_token_id: int = t5_tokenizer.pad_token_id
+
+    def __call__(self, features: List[Dict]) -> Dict:
+        """Pad a batch of cached encoder states and labels.
+
+        Args:
+            features: List of feature dictionaries from ``HiddenStateDataset``
+
+        Returns:
+            Dictionary with padded hidden states, attention mask and labels
+        """
+        hidden_states = pad_sequence([f["hidden_states"] for f in features], batch_first=True)
+        lengths = torch.tensor([len(f["hidden_states"]) for f in features])
+        attention_mask = (torch.arange(hidden_states.size(1))[None, :] < lengths[:, None]).long()
+        labels = pad_sequence(
+            [f["labels"].long() for f in features],
+            batch_first=True,
+            padding_value=self.label_pad_token_id
+        )
         return {
-            "pixel_values": encoding["pixel_values"],
-            "input_ids": encoding["input_ids"],
-            "attention_mask": encoding["attention_mask"],
-            "bbox": encoding["bbox"],
+            "hidden_states": hidden_states,
+            "attention_mask": attention_mask,
             "labels": labels
-        }
\ No newline at end of file
+        }
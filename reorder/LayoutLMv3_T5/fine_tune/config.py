@@ -18,6 +18,39 @@ class TrainConfig:
     weight_decay: float = 0.01
     warmup_ratio: float = 0.1
     max_grad_norm: float = 1.0
+    head: str = "t5"  # "t5" generates the text; "pointer" predicts a permutation of the input words
+    sliding_window: bool = False  # encode pages over 512 tokens as overlapping windows instead of truncating
+    window_overlap: int = 128  # tokens shared by consecutive windows
+    max_windows: int = 4  # windows per page; words past the last window are still truncated
+    use_feature_cache: bool = True
+    feature_cache_dir: str = os.path.join(save_dir, "feature_cache")
+    cache_shard_size: int = 256
+    use_ndjson_index: bool = True
+    resample_each_epoch: bool = False  # new random max_samples subset every epoch
+    seed: int = 42
+    num_workers: int = 4
+    prefetch_factor: int = 2  # batches buffered per worker
+    pin_memory: bool = True
+    chunk_prefetch: int = 1  # NDJSON chunks parsed ahead when streaming
+    max_tokens: int = 0  # padded tokens per batch; 0 keeps fixed batch_size batches
+    max_batch_size: int = 64  # cap on samples per token-budget batch
+    init_checkpoint: str = ""  # optional .pth to start from (weights only)
+    freeze_encoder: bool = False  # train projection + T5 on cached LayoutLMv3 states
+    hidden_state_dir: str = os.path.join(save_dir, "hidden_states")
+    grad_accum_steps: int = 1  # batches per optimizer step
+    gradient_checkpointing: bool = False  # recompute LayoutLMv3/T5 activations in backward
+    checkpoint_every_epochs: int = 5
+    checkpoint_every_steps: int = 0  # optimizer steps between resumable checkpoints; 0 disables
+    keep_last_checkpoints: int = 3  # step checkpoints kept on disk
+    keep_epoch_checkpoints: int = 0  # epoch checkpoints kept on disk; 0 keeps all
+    resume: bool = True  # continue from the latest checkpoint in save_dir
+    stage_timing: bool = False  # time data/h2d/forward/backward/optimizer stages
+    timing_log_every: int = 50  # optimizer steps between timing and throughput logs; 0 disables
+    profile_start_step: int = 0  # optimizer step after which the torch.profiler trace starts
+    profile_num_steps: int = 0  # optimizer steps traced; 0 disables profiling
+    ddp_backend: str = ""  # torchrun backend: "nccl", "gloo" (CPU) or "" for automatic
+    ddp_timeout_minutes: int = 180  # collective timeout; rank 0 builds missing caches while the others wait
+    scale_lr_with_world_size: bool = True  # linear LR scaling for the global batch
 
 @dataclass
 class ModelConfig:
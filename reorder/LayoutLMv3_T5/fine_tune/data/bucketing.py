@@ -0,0 +1,73 @@
+"""Token-budget length bucketing for LayoutLMv3 + T5 batches."""
+
+import random
+from typing import List, Optional, Sequence
+
+from torch.utils.data import Sampler
+
+from .pipeline import ChunkBatchSampler
+
+class TokenBudgetBatchSampler(ChunkBatchSampler):
+    """Batch sampler building batches under a padded-token budget.
+
+    Each chunk of the epoch order is sorted by length and cut greedily into
+    batches whose padded size ``len(batch) * longest`` stays within
+    ``max_tokens``, so long pages end up together in small batches and short
+    pages in large ones. Sorting only within a chunk keeps epochs random for
+    training, and batch order inside a chunk is shuffled when ``shuffle`` is
+    set. Without shuffling, batches come in length order and callers must
+    restore the original order themselves.
+    """
+
+    def __init__(self, sampler: Sampler, lengths: Sequence[int], max_tokens: int,
+                 chunk_size: int, shuffle: bool = True, max_length: int = 512,
+                 max_batch_size: Optional[int] = None, seed: int = 0):
+        """Initialize batch sampler.
+
+        Args:
+            sampler: Sampler giving the epoch order of dataset indices
+            lengths: Length of every dataset item (e.g. ``len(src_word_list)``)
+            max_tokens: Maximum padded tokens per batch
+            chunk_size: Number of samples sorted together
+            shuffle: Whether to shuffle batch order within each chunk
+            max_length: Truncation length applied by the processor
+            max_batch_size: Optional cap on samples per batch
+            seed: Base seed for shuffling, combined with the sampler epoch
+        """
+        super().__init__(sampler, max_batch_size or len(lengths), chunk_size, seed=seed)
+        self.lengths = lengths
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.max_length = max_length
+
+    def batch_chunk(self, chunk: List[int], rng: random.Random) -> List[List[int]]:
+        """Split one chunk into length-sorted, token-budgeted batches.
+
+        Args:
+            chunk: Dataset indices of the chunk, in epoch order
+            rng: Random generator of the current epoch
+
+        Returns:
+            List of batches of dataset indices
+        """
+        # Stable sort: ties keep the (shuffled) epoch order
+        ordered = sorted(chunk, key=lambda idx: self.lengths[idx])
+        batches = []
+        current = []
+        longest = 0
+        for idx in ordered:
+            length = max(1, min(int(self.lengths[idx]), self.max_length))
+            grown = max(longest, length)
+            if current and (grown * (len(current) + 1) > self.max_tokens
+                            or len(current) >= self.batch_size):
+                batches.append(current)
+                current = []
+                grown = length
+            current.append(idx)
+            longest = grown
+        if current:
+            batches.append(current)
+
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
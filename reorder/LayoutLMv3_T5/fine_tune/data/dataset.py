@@ -1,6 +1,7 @@
 """Dataset classes for LayoutLMv3 + T5 model."""
 
 import os
+import time
 from typing import Dict, List
 from PIL import Image
 from torch.utils.data import Dataset
@@ -8,17 +9,19 @@ from torch.utils.data import Dataset
 class OcrReorderDataset(Dataset):
     """Dataset for OCR reordering task using LayoutLMv3 and T5."""
     
-    def __init__(self, data_list: List[Dict], image_dir: str, processor):
+    def __init__(self, data_list: List[Dict], image_dir: str, processor, timed: bool = False):
         """Initialize dataset.
         
         Args:
             data_list: List of data items (dictionaries)
             image_dir: Directory containing images
             processor: LayoutLMv3 processor
+            timed: Whether items report JSON parse and image decode times
         """
         self.data_list = data_list
         self.image_dir = image_dir
         self.processor = processor
+        self.timed = timed
 
     def __len__(self) -> int:
         """Return number of items in dataset."""
@@ -31,12 +34,35 @@ class OcrReorderDataset(Dataset):
             idx: Index of item to retrieve
             
         Returns:
-            Dictionary containing image, words, boxes, and target text
+            Dictionary containing image, words, boxes, target text and the
+            target words
         """
+        if self.timed:
+            return self._timed_item(idx)
         item = self.data_list[idx]
         image_path = os.path.join(self.image_dir, item["img_name"])
         image = Image.open(image_path).convert("RGB")
         words = item["src_word_list"]
         boxes = item["src_wordbox_list"]
-        target = " ".join(item.get("ordered_src_doc", words))
-        return {"image": image, "words": words, "boxes": boxes, "target": target}
\ No newline at end of file
+        ordered_words = item.get("ordered_src_doc", words)
+        return {"image": image, "words": words, "boxes": boxes,
+                "target": " ".join(ordered_words), "ordered_words": ordered_words}
+
+    def _timed_item(self, idx: int) -> Dict:
+        """Get an item together with its ``json`` and ``image`` stage times."""
+        start = time.perf_counter()
+        # Records of an ``NdjsonIndex`` are parsed on access
+        item = self.data_list[idx]
+        parsed = time.perf_counter()
+        image = Image.open(os.path.join(self.image_dir, item["img_name"])).convert("RGB")
+        decoded = time.perf_counter()
+        words = item["src_word_list"]
+        ordered_words = item.get("ordered_src_doc", words)
+        return {
+            "image": image,
+            "words": words,
+            "boxes": item["src_wordbox_list"],
+            "target": " ".join(ordered_words),
+            "ordered_words": ordered_words,
+            "timing": {"json": parsed - start, "image": decoded - parsed},
+        }
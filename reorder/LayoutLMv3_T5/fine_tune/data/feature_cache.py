@@ -0,0 +1,284 @@
+"""Memory-mapped cache of preprocessed LayoutLMv3 + T5 training features."""
+
+import bisect
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+from tqdm import tqdm
+
+from .ndjson_reader import iter_ndjson_in_chunks
+
+CACHE_VERSION = 1
+INDEX_FILE = "index.json"
+
+# On-disk dtype of every cached field. Token level fields are stored flat per
+# shard and sliced with the per-sample offsets in ``offsets.npy``.
+FIELD_DTYPES = {
+    "pixel_values": np.float32,
+    "input_ids": np.int32,
+    "bbox": np.int16,
+    "attention_mask": np.int8,
+    "labels": np.int32,
+}
+
+def _tokenizer_signature(tokenizer) -> Dict:
+    """Describe a tokenizer well enough to detect configuration changes."""
+    return {
+        "class": type(tokenizer).__name__,
+        "name_or_path": getattr(tokenizer, "name_or_path", None),
+        "vocab_size": len(tokenizer),
+        "model_max_length": tokenizer.model_max_length,
+        "padding_side": tokenizer.padding_side,
+        "truncation_side": getattr(tokenizer, "truncation_side", None),
+    }
+
+def cache_fingerprint(json_path: str, image_dir: str, processor, label_tokenizer,
+                      max_samples: Optional[int]) -> str:
+    """Compute the cache key for a source file and preprocessing setup.
+
+    The key covers the NDJSON file (path, size and mtime), the image directory,
+    the LayoutLMv3 image processor and tokenizer configuration and the T5
+    tokenizer used for the labels, so a change to any of them yields a new key.
+
+    Args:
+        json_path: Path to the source NDJSON file
+        image_dir: Directory containing images
+        processor: LayoutLMv3 processor
+        label_tokenizer: Tokenizer used for the target text
+        max_samples: Maximum number of records cached
+
+    Returns:
+        Hex digest identifying the cache
+    """
+    stat = os.stat(json_path)
+    payload = {
+        "version": CACHE_VERSION,
+        "json_path": os.path.abspath(json_path),
+        "json_size": stat.st_size,
+        "json_mtime_ns": stat.st_mtime_ns,
+        "image_dir": os.path.abspath(image_dir),
+        "image_processor": processor.image_processor.to_dict(),
+        "tokenizer": _tokenizer_signature(processor.tokenizer),
+        "label_tokenizer": _tokenizer_signature(label_tokenizer),
+        "max_samples": max_samples,
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+def _write_shard(shard_dir: str, samples: List[Dict]) -> None:
+    """Write one shard of preprocessed samples as ``.npy`` files."""
+    os.makedirs(shard_dir, exist_ok=True)
+
+    pixel_shape = (len(samples),) + samples[0]["pixel_values"].shape
+    pixels = np.lib.format.open_memmap(
+        os.path.join(shard_dir, "pixel_values.npy"),
+        mode="w+",
+        dtype=FIELD_DTYPES["pixel_values"],
+        shape=pixel_shape
+    )
+    for i, sample in enumerate(samples):
+        pixels[i] = sample["pixel_values"]
+    pixels.flush()
+    del pixels
+
+    for field, offsets_name in (("input_ids", "offsets"), ("labels", "label_offsets")):
+        lengths = [len(s[field]) for s in samples]
+        offsets = np.zeros(len(samples) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        np.save(os.path.join(shard_dir, f"{offsets_name}.npy"), offsets)
+
+    for field in ("input_ids", "bbox", "attention_mask", "labels"):
+        flat = np.concatenate([np.asarray(s[field]) for s in samples])
+        np.save(os.path.join(shard_dir, f"{field}.npy"), flat.astype(FIELD_DTYPES[field]))
+
+def build_feature_cache(json_path: str, image_dir: str, processor, label_tokenizer,
+                        cache_path: str, max_samples: Optional[int] = None,
+                        shard_size: int = 256, chunk_size: int = 1000) -> None:
+    """Run the processor once over a dataset and store the result on disk.
+
+    Args:
+        json_path: Path to the source NDJSON file
+        image_dir: Directory containing images
+        processor: LayoutLMv3 processor
+        label_tokenizer: Tokenizer used for the target text
+        cache_path: Directory the cache is written to
+        max_samples: Maximum number of records to cache (None for all)
+        shard_size: Number of samples per shard
+        chunk_size: Number of NDJSON records read at a time
+    """
+    tmp_path = cache_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    shards = []
+    pending = []
+    processed = 0
+
+    def flush():
+        name = f"shard_{len(shards):05d}"
+        _write_shard(os.path.join(tmp_path, name), pending)
+        shards.append({"name": name, "num_samples": len(pending)})
+        pending.clear()
+
+    bar = tqdm(total=max_samples, desc="Building feature cache")
+    for chunk in iter_ndjson_in_chunks(json_path, chunk_size=chunk_size):
+        if max_samples is not None and processed >= max_samples:
+            break
+        if max_samples is not None and processed + len(chunk) > max_samples:
+            chunk = chunk[: (max_samples - processed)]
+
+        for item in chunk:
+            image = Image.open(os.path.join(image_dir, item["img_name"])).convert("RGB")
+            words = item["src_word_list"]
+            target = " ".join(item.get("ordered_src_doc", words))
+            encoding = processor(
+                image,
+                words,
+                boxes=item["src_wordbox_list"],
+                return_tensors="np",
+                truncation=True
+            )
+            pending.append({
+                "pixel_values": encoding["pixel_values"][0],
+                "input_ids": encoding["input_ids"][0],
+                "bbox": encoding["bbox"][0],
+                "attention_mask": encoding["attention_mask"][0],
+                "labels": label_tokenizer(target, truncation=True)["input_ids"],
+            })
+            if len(pending) == shard_size:
+                flush()
+            bar.update(1)
+        processed += len(chunk)
+
+    if pending:
+        flush()
+    bar.close()
+
+    with open(os.path.join(tmp_path, INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": CACHE_VERSION,
+            "source": os.path.abspath(json_path),
+            "num_samples": processed,
+            "shards": shards
+        }, f, indent=2)
+
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+
+def load_or_build_feature_cache(json_path: str, image_dir: str, processor, label_tokenizer,
+                                cache_dir: str, max_samples: Optional[int] = None,
+                                shard_size: int = 256, chunk_size: int = 1000) -> str:
+    """Return the cache directory for a dataset, building it if needed.
+
+    Args:
+        json_path: Path to the source NDJSON file
+        image_dir: Directory containing images
+        processor: LayoutLMv3 processor
+        label_tokenizer: Tokenizer used for the target text
+        cache_dir: Root directory holding feature caches
+        max_samples: Maximum number of records to cache (None for all)
+        shard_size: Number of samples per shard
+        chunk_size: Number of NDJSON records read at a time
+
+    Returns:
+        Path of the (possibly freshly built) cache
+    """
+    key = cache_fingerprint(json_path, image_dir, processor, label_tokenizer, max_samples)
+    cache_path = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(cache_path, INDEX_FILE)):
+        print(f"Using feature cache {cache_path}")
+        return cache_path
+
+    print(f"Feature cache {key} not found, preprocessing {json_path}")
+    os.makedirs(cache_dir, exist_ok=True)
+    build_feature_cache(
+        json_path, image_dir, processor, label_tokenizer, cache_path,
+        max_samples=max_samples, shard_size=shard_size, chunk_size=chunk_size
+    )
+    return cache_path
+
+class CachedFeatureDataset(Dataset):
+    """Dataset reading preprocessed features from a feature cache.
+
+    Shards are memory-mapped lazily in each process, so the dataset can be
+    handed to DataLoader workers without pickling the arrays, and items are
+    returned as tensors viewing the mapped pages rather than copies.
+    """
+
+    def __init__(self, cache_path: str):
+        """Initialize dataset.
+
+        Args:
+            cache_path: Directory returned by ``load_or_build_feature_cache``
+        """
+        self.cache_path = cache_path
+        with open(os.path.join(cache_path, INDEX_FILE), "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.shard_starts = []
+        total = 0
+        for shard in self.index["shards"]:
+            self.shard_starts.append(total)
+            total += shard["num_samples"]
+        self.num_samples = total
+        self._shards = None
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def lengths(self) -> np.ndarray:
+        """Return the token count of every cached sample."""
+        return np.concatenate([
+            np.diff(np.load(os.path.join(self.cache_path, shard["name"], "offsets.npy")))
+            for shard in self.index["shards"]
+        ])
+
+    def _open_shards(self) -> List[Dict]:
+        """Memory-map every shard of the cache."""
+        shards = []
+        for shard in self.index["shards"]:
+            shard_dir = os.path.join(self.cache_path, shard["name"])
+            shards.append({
+                name: np.load(os.path.join(shard_dir, f"{name}.npy"), mmap_mode="c")
+                for name in list(FIELD_DTYPES) + ["offsets", "label_offsets"]
+            })
+        return shards
+
+    def __len__(self) -> int:
+        """Return number of items in dataset."""
+        return self.num_samples
+
+    def __getitem__(self, idx: int) -> Dict:
+        """Get a single preprocessed item.
+
+        Args:
+            idx: Index of item to retrieve
+
+        Returns:
+            Dictionary of unpadded tensors for one sample
+        """
+        if self._shards is None:
+            self._shards = self._open_shards()
+        if idx < 0:
+            idx += self.num_samples
+        shard_id = bisect.bisect_right(self.shard_starts, idx) - 1
+        shard = self._shards[shard_id]
+        local = idx - self.shard_starts[shard_id]
+
+        start, end = shard["offsets"][local], shard["offsets"][local + 1]
+        label_start, label_end = shard["label_offsets"][local], shard["label_offsets"][local + 1]
+        return {
+            "pixel_values": torch.from_numpy(shard["pixel_values"][local]),
+            "input_ids": torch.from_numpy(shard["input_ids"][start:end]),
+            "bbox": torch.from_numpy(shard["bbox"][start:end]),
+            "attention_mask": torch.from_numpy(shard["attention_mask"][start:end]),
+            "labels": torch.from_numpy(shard["labels"][label_start:label_end]),
+        }
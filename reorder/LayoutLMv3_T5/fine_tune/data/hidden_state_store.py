@@ -0,0 +1,177 @@
+"""On-disk store of frozen LayoutLMv3 hidden states for decoder-only training."""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from tqdm import tqdm
+
+STORE_VERSION = 1
+INDEX_FILE = "index.json"
+HIDDEN_FILE = "hidden_states.f16"
+
+def hidden_state_fingerprint(source_key: str, encoder_name: str,
+                             encoder_checkpoint: Optional[str] = None) -> str:
+    """Compute the store key for a data source and a frozen encoder.
+
+    Args:
+        source_key: Key identifying the samples and their preprocessing
+            (e.g. ``cache_fingerprint`` of the source NDJSON)
+        encoder_name: Pretrained LayoutLMv3 model name
+        encoder_checkpoint: Checkpoint the encoder weights were loaded from
+
+    Returns:
+        Hex digest identifying the store
+    """
+    payload = {
+        "version": STORE_VERSION,
+        "source": source_key,
+        "encoder": encoder_name,
+        "checkpoint": None,
+    }
+    if encoder_checkpoint:
+        stat = os.stat(encoder_checkpoint)
+        payload["checkpoint"] = [os.path.abspath(encoder_checkpoint), stat.st_size, stat.st_mtime_ns]
+    blob = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+def hidden_state_store_exists(store_path: str) -> bool:
+    """Return whether a complete store exists at ``store_path``."""
+    return os.path.exists(os.path.join(store_path, INDEX_FILE))
+
+@torch.no_grad()
+def build_hidden_state_store(loader, layout_model, store_path: str, device: torch.device,
+                             label_pad_token_id: int = 0) -> None:
+    """Run the frozen encoder once and store unpadded text hidden states.
+
+    For every sample the text part of ``last_hidden_state`` (the positions
+    covered by its attention mask) is written as float16 to one flat file,
+    together with the unpadded T5 labels and per-sample offsets.
+
+    Args:
+        loader: Sequential DataLoader yielding collated training batches
+        layout_model: LayoutLMv3 encoder (frozen)
+        store_path: Directory the store is written to
+        device: Device to run the encoder on
+        label_pad_token_id: Pad id used in the collated labels
+    """
+    tmp_path = store_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    layout_model.eval()
+    lengths = []
+    labels = []
+    hidden_size = layout_model.config.hidden_size
+    with open(os.path.join(tmp_path, HIDDEN_FILE), "wb") as out:
+        for batch in tqdm(loader, desc="Encoding hidden states"):
+            input_ids = batch["input_ids"].to(device)
+            mask = batch["attention_mask"].to(device)
+            with torch.cuda.amp.autocast():
+                layout_out = layout_model(
+                    pixel_values=batch["pixel_values"].to(device),
+                    input_ids=input_ids,
+                    attention_mask=mask,
+                    bbox=batch["bbox"].to(device)
+                )
+            text_feats = layout_out.last_hidden_state[:, :input_ids.size(1), :]
+            text_feats = text_feats.to(torch.float16).cpu().numpy()
+
+            for i, sample_mask in enumerate(batch["attention_mask"]):
+                n = int(sample_mask.sum())
+                out.write(np.ascontiguousarray(text_feats[i, :n]).tobytes())
+                lengths.append(n)
+                sample_labels = batch["labels"][i]
+                keep = (sample_labels != label_pad_token_id).nonzero()
+                end = int(keep.max()) + 1 if len(keep) else 0
+                labels.append(sample_labels[:end].numpy().astype(np.int32))
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    label_offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum([len(l) for l in labels], out=label_offsets[1:])
+    np.save(os.path.join(tmp_path, "label_offsets.npy"), label_offsets)
+    np.save(os.path.join(tmp_path, "labels.npy"),
+            np.concatenate(labels) if labels else np.zeros(0, dtype=np.int32))
+
+    with open(os.path.join(tmp_path, INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": STORE_VERSION,
+            "num_samples": len(lengths),
+            "num_tokens": int(offsets[-1]),
+            "hidden_size": hidden_size
+        }, f, indent=2)
+
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.replace(tmp_path, store_path)
+
+class HiddenStateDataset(Dataset):
+    """Dataset reading cached encoder hidden states and labels.
+
+    The float16 states are memory-mapped lazily per process and returned as
+    tensor views, so decoder-only epochs need neither images nor LayoutLMv3.
+    """
+
+    def __init__(self, store_path: str):
+        """Initialize dataset.
+
+        Args:
+            store_path: Directory written by ``build_hidden_state_store``
+        """
+        self.store_path = store_path
+        with open(os.path.join(store_path, INDEX_FILE), "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        self._arrays = None
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def _open(self) -> Dict:
+        """Memory-map the store."""
+        path = self.store_path
+        return {
+            "hidden_states": np.memmap(
+                os.path.join(path, HIDDEN_FILE),
+                dtype=np.float16,
+                mode="c",
+                shape=(self.index["num_tokens"], self.index["hidden_size"])
+            ),
+            "offsets": np.load(os.path.join(path, "offsets.npy")),
+            "labels": np.load(os.path.join(path, "labels.npy"), mmap_mode="c"),
+            "label_offsets": np.load(os.path.join(path, "label_offsets.npy")),
+        }
+
+    def lengths(self) -> np.ndarray:
+        """Return the number of text tokens of every sample."""
+        return np.diff(np.load(os.path.join(self.store_path, "offsets.npy")))
+
+    def __len__(self) -> int:
+        """Return number of items in dataset."""
+        return self.index["num_samples"]
+
+    def __getitem__(self, idx: int) -> Dict:
+        """Get the hidden states and labels of one sample.
+
+        Args:
+            idx: Index of item to retrieve
+
+        Returns:
+            Dictionary with ``hidden_states`` (tokens x hidden) and ``labels``
+        """
+        if self._arrays is None:
+            self._arrays = self._open()
+        arrays = self._arrays
+        start, end = arrays["offsets"][idx], arrays["offsets"][idx + 1]
+        label_start, label_end = arrays["label_offsets"][idx], arrays["label_offsets"][idx + 1]
+        return {
+            "hidden_states": torch.from_numpy(arrays["hidden_states"][start:end]),
+            "labels": torch.from_numpy(arrays["labels"][label_start:label_end]),
+        }
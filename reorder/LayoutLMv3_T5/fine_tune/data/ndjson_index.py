@@ -0,0 +1,209 @@
+"""Byte-offset index and random access for NDJSON files."""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"NDJSIDX1"
+# magic, source size, source mtime (ns), number of records
+INDEX_HEADER = struct.Struct("<8sqqq")
+
+def default_index_path(json_path: str) -> str:
+    """Return the sidecar index path for an NDJSON file."""
+    return json_path + INDEX_SUFFIX
+
+def build_ndjson_index(json_path: str, index_path: Optional[str] = None) -> str:
+    """Scan an NDJSON file once and write the start offset of every record.
+
+    The sidecar holds ``num_records + 1`` int64 offsets; the last one is the
+    file size, so record ``i`` spans ``offsets[i]:offsets[i + 1]``. Blank
+    lines are skipped, matching ``iter_ndjson_in_chunks``.
+
+    Args:
+        json_path: Path to the NDJSON file
+        index_path: Where to write the index (defaults to ``<json_path>.idx``)
+
+    Returns:
+        Path of the written index
+    """
+    index_path = index_path or default_index_path(json_path)
+    stat = os.stat(json_path)
+
+    offsets = []
+    position = 0
+    with open(json_path, "rb") as f:
+        for line in f:
+            if line.strip():
+                offsets.append(position)
+            position += len(line)
+    offsets.append(position)
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(offsets) - 1))
+        f.write(np.asarray(offsets, dtype="<i8").tobytes())
+    os.replace(tmp_path, index_path)
+    return index_path
+
+def _index_is_current(json_path: str, index_path: str) -> bool:
+    """Check that an index exists and was built from the current file."""
+    if not os.path.exists(index_path):
+        return False
+    with open(index_path, "rb") as f:
+        header = f.read(INDEX_HEADER.size)
+    if len(header) != INDEX_HEADER.size:
+        return False
+    magic, size, mtime_ns, _ = INDEX_HEADER.unpack(header)
+    stat = os.stat(json_path)
+    return magic == INDEX_MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+def load_ndjson_offsets(json_path: str, index_path: Optional[str] = None) -> np.ndarray:
+    """Memory-map the offsets of an NDJSON file, (re)building a stale index.
+
+    Args:
+        json_path: Path to the NDJSON file
+        index_path: Sidecar index path (defaults to ``<json_path>.idx``)
+
+    Returns:
+        Read-only int64 array of ``num_records + 1`` offsets
+    """
+    index_path = index_path or default_index_path(json_path)
+    if not _index_is_current(json_path, index_path):
+        print(f"Building NDJSON index {index_path}")
+        build_ndjson_index(json_path, index_path)
+    return np.memmap(index_path, dtype="<i8", mode="r", offset=INDEX_HEADER.size)
+
+class NdjsonIndex:
+    """Random-access, list-like view over the records of an NDJSON file.
+
+    Records are parsed on demand from a read-only ``mmap`` of the file, so any
+    record can be fetched in O(1) without reading the ones before it. The file
+    and index are mapped lazily per process, which keeps the object cheap to
+    pass to DataLoader workers.
+    """
+
+    def __init__(self, json_path: str, index_path: Optional[str] = None):
+        """Initialize index.
+
+        Args:
+            json_path: Path to the NDJSON file
+            index_path: Sidecar index path (defaults to ``<json_path>.idx``)
+        """
+        self.json_path = json_path
+        self.index_path = index_path or default_index_path(json_path)
+        self.num_records = len(load_ndjson_offsets(json_path, self.index_path)) - 1
+        self._offsets = None
+        self._mm = None
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_offsets"] = None
+        state["_mm"] = None
+        return state
+
+    def _open(self) -> None:
+        """Map the index and the NDJSON file into memory."""
+        self._offsets = load_ndjson_offsets(self.json_path, self.index_path)
+        with open(self.json_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        """Return number of records in the file."""
+        return self.num_records
+
+    def __getitem__(self, idx: int) -> Any:
+        """Parse and return record ``idx``.
+
+        Args:
+            idx: Index of the record
+
+        Returns:
+            Parsed JSON object
+        """
+        if self._mm is None:
+            self._open()
+        if idx < 0:
+            idx += self.num_records
+        if not 0 <= idx < self.num_records:
+            raise IndexError(f"record {idx} out of range for {self.num_records} records")
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return json.loads(self._mm[start:end])
+
+    def __iter__(self) -> Iterator[Any]:
+        for idx in range(self.num_records):
+            yield self[idx]
+
+def load_record_lengths(index: NdjsonIndex, key: str = "src_word_list") -> np.ndarray:
+    """Return ``len(record[key])`` for every record, cached next to the index.
+
+    Args:
+        index: Indexed NDJSON file
+        key: List-valued field to measure
+
+    Returns:
+        int32 array with one length per record
+    """
+    path = f"{index.index_path}.{key}.len.npy"
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(index.index_path):
+        lengths = np.load(path)
+        if len(lengths) == len(index):
+            return lengths
+
+    lengths = np.fromiter((len(record.get(key, [])) for record in index),
+                          dtype=np.int32, count=len(index))
+    np.save(path, lengths)
+    return lengths
+
+class EpochSubsetSampler(Sampler):
+    """Sampler drawing a seeded random subset of records for every epoch.
+
+    With ``resample=True`` each epoch takes the first ``max_samples`` entries
+    of a fresh global permutation, so successive epochs see different records.
+    Otherwise the first ``max_samples`` records in file order are used and
+    only their order is shuffled.
+    """
+
+    def __init__(self, num_records: int, max_samples: Optional[int] = None,
+                 shuffle: bool = True, resample: bool = False, seed: int = 0):
+        """Initialize sampler.
+
+        Args:
+            num_records: Number of records available
+            max_samples: Number of records per epoch (None for all)
+            shuffle: Whether to shuffle the epoch order
+            resample: Whether to draw a new subset each epoch
+            seed: Base random seed, combined with the epoch number
+        """
+        self.num_records = num_records
+        self.num_samples = min(num_records, max_samples or num_records)
+        self.shuffle = shuffle
+        self.resample = resample
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        """Select the permutation used for ``epoch``."""
+        self.epoch = epoch
+
+    def epoch_indices(self) -> list:
+        """Return the record indices of the current epoch, in order."""
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        if self.resample:
+            return torch.randperm(self.num_records, generator=generator)[: self.num_samples].tolist()
+        if self.shuffle:
+            return torch.randperm(self.num_samples, generator=generator).tolist()
+        return list(range(self.num_samples))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.epoch_indices())
+
+    def __len__(self) -> int:
+        return self.num_samples
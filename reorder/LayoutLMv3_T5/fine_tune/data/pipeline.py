@@ -0,0 +1,265 @@
+"""Long-lived, multi-worker data loading for LayoutLMv3 + T5."""
+
+import queue
+import random
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+import torch
+from torch.utils.data import DataLoader, Sampler
+
+class ChunkBatchSampler(Sampler):
+    """Batch sampler that batches an epoch's indices chunk by chunk.
+
+    The order comes from ``sampler``; the indices are split into
+    ``chunk_size`` chunks and each chunk is batched on its own, so batches
+    never straddle chunks and the batch layout matches the former
+    one-DataLoader-per-chunk loop. The plan of an epoch is computed once and
+    reused until the sampler moves to another epoch. Iteration starts at
+    batch ``start_batch`` of the epoch, which lets a resumed run skip the
+    batches it already trained on without loading them.
+
+    After ``shard`` each process of a data-parallel run plans the same global
+    batches and keeps every ``num_replicas``-th batch of each chunk, so ranks
+    read disjoint records and step the same number of times.
+    """
+
+    def __init__(self, sampler: Sampler, batch_size: int, chunk_size: int, seed: int = 0):
+        """Initialize batch sampler.
+
+        Args:
+            sampler: Sampler giving the epoch order of dataset indices
+            batch_size: Number of samples per batch
+            chunk_size: Number of samples per chunk
+            seed: Base seed for any randomness added on top of ``sampler``
+        """
+        self.sampler = sampler
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.start_batch = 0
+        self.num_replicas = 1
+        self.rank = 0
+        self._plan = None
+
+    def shard(self, num_replicas: int, rank: int) -> None:
+        """Restrict the batches to those of one data-parallel process.
+
+        Args:
+            num_replicas: Number of processes
+            rank: Rank of this process
+        """
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self._plan = None
+
+    def _shard_chunk(self, batches: List[List[int]]) -> List[List[int]]:
+        """Keep this rank's batches, repeating batches so all ranks get as many."""
+        target = -(-len(batches) // self.num_replicas) * self.num_replicas
+        padded = (batches * self.num_replicas)[:target]
+        return padded[self.rank::self.num_replicas]
+
+    def batch_chunk(self, chunk: List[int], rng: random.Random) -> List[List[int]]:
+        """Split the indices of one chunk into batches.
+
+        Args:
+            chunk: Dataset indices of the chunk, in epoch order
+            rng: Random generator of the current epoch
+
+        Returns:
+            List of batches of dataset indices
+        """
+        return [chunk[b:b + self.batch_size] for b in range(0, len(chunk), self.batch_size)]
+
+    def epoch_chunks(self) -> List[List[List[int]]]:
+        """Return the batches of the current epoch, grouped by chunk."""
+        # Samplers without epochs are re-planned on every call
+        epoch = getattr(self.sampler, "epoch", None)
+        if self._plan is None or epoch is None or self._plan[0] != epoch:
+            rng = random.Random(None if epoch is None else f"{self.seed}-{epoch}")
+            indices = list(self.sampler)
+            chunks = [indices[start:start + self.chunk_size]
+                      for start in range(0, len(indices), self.chunk_size)]
+            plan = [self.batch_chunk(chunk, rng) for chunk in chunks]
+            if self.num_replicas > 1:
+                plan = [self._shard_chunk(batches) for batches in plan]
+            self._plan = (epoch, plan)
+        return self._plan[1]
+
+    def __iter__(self) -> Iterator[List[int]]:
+        # Built eagerly so ``start_batch`` is read when the iterator is created
+        batches = [batch for chunk in self.epoch_chunks() for batch in chunk]
+        return iter(batches[self.start_batch:])
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self.epoch_chunks()) - self.start_batch
+
+class QueueWaitTimer:
+    """Measures how long the training loop waits for each batch."""
+
+    def __init__(self):
+        self.last = 0.0
+        self.total = 0.0
+        self.steps = 0
+
+    def reset(self) -> None:
+        """Clear the accumulated totals."""
+        self.total = 0.0
+        self.steps = 0
+
+    def wrap(self, iterable: Iterable) -> Iterator:
+        """Yield from ``iterable``, timing every ``next`` call.
+
+        Args:
+            iterable: Batch source to time
+
+        Yields:
+            Items of ``iterable``
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.last = time.perf_counter() - start
+            self.total += self.last
+            self.steps += 1
+            yield item
+
+class ChunkPrefetcher:
+    """Reads chunks from a (slow) iterator in a background thread.
+
+    At most ``depth`` parsed chunks are buffered, so the next chunk is parsed
+    while the current one trains without reading the whole file ahead.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterator: Iterable, depth: int = 1):
+        """Start the background reader.
+
+        Args:
+            iterator: Iterable of chunks, e.g. ``iter_ndjson_in_chunks(...)``
+            depth: Maximum number of chunks buffered ahead
+        """
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(iterator,), daemon=True)
+        self._thread.start()
+
+    def _run(self, iterator: Iterable) -> None:
+        try:
+            for item in iterator:
+                self._queue.put(item)
+        except BaseException as e:  # re-raised in the consumer
+            self._error = e
+        finally:
+            self._queue.put(self._DONE)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+def build_loader(dataset, collate_fn: Callable, num_workers: int = 0, prefetch_factor: int = 2,
+                 pin_memory: bool = False, persistent: bool = False, seed: int = 0,
+                 **kwargs) -> DataLoader:
+    """Build a DataLoader with the pipeline settings of a config.
+
+    The loader gets its own random generator, so creating iterators never
+    advances the global torch RNG and a resumed run replays the same
+    dropout masks.
+
+    Args:
+        dataset: Dataset to load from
+        collate_fn: Batch collator
+        num_workers: Number of worker processes (0 loads in the main process)
+        prefetch_factor: Batches buffered per worker
+        pin_memory: Whether batches are copied into pinned memory
+        persistent: Whether workers outlive a single pass over the loader
+        seed: Seed of the loader's generator (worker seeds, shuffling)
+        **kwargs: Forwarded to DataLoader (batch_size, shuffle, batch_sampler, ...)
+
+    Returns:
+        Configured DataLoader
+    """
+    if num_workers > 0:
+        kwargs["prefetch_factor"] = prefetch_factor
+        kwargs["persistent_workers"] = persistent
+    kwargs.setdefault("generator", torch.Generator().manual_seed(seed))
+    return DataLoader(
+        dataset,
+        collate_fn=collate_fn,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        **kwargs
+    )
+
+class DataPipeline:
+    """Single loading pipeline reused for every chunk and epoch of a run.
+
+    Worker processes are started once and kept alive across epochs; each
+    worker keeps up to ``prefetch_factor`` collated (optionally pinned)
+    batches ready, so the following batches, including those of the next
+    chunk, are prepared while the current step runs.
+    """
+
+    def __init__(self, dataset, batch_sampler: ChunkBatchSampler, collate_fn: Callable,
+                 num_workers: int = 0, prefetch_factor: int = 2, pin_memory: bool = False):
+        """Initialize pipeline.
+
+        Args:
+            dataset: Random-access dataset covering the whole run
+            batch_sampler: Batch sampler defining chunks and batches of an epoch
+            collate_fn: Batch collator
+            num_workers: Number of worker processes
+            prefetch_factor: Batches buffered per worker
+            pin_memory: Whether batches are copied into pinned memory
+        """
+        self.batch_sampler = batch_sampler
+        self.loader = build_loader(
+            dataset,
+            collate_fn,
+            num_workers=num_workers,
+            prefetch_factor=prefetch_factor,
+            pin_memory=pin_memory,
+            persistent=True,
+            seed=batch_sampler.seed,
+            batch_sampler=batch_sampler
+        )
+
+    def iter_chunks(self, start_chunk: int = 1,
+                    start_batch: int = 0) -> Iterator[Tuple[int, Iterator[Any], int, int, int]]:
+        """Iterate one epoch chunk by chunk.
+
+        Each chunk's batch iterator must be exhausted before the next chunk
+        is requested, since all chunks share one underlying loader iterator.
+
+        Args:
+            start_chunk: 1-based chunk to start at when resuming
+            start_batch: Batches of ``start_chunk`` already trained on
+
+        Yields:
+            Tuples of (chunk number, batch iterator, batches left in chunk,
+            samples in chunk, samples processed so far)
+        """
+        chunks = self.batch_sampler.epoch_chunks()
+        self.batch_sampler.start_batch = sum(len(chunk) for chunk in chunks[:start_chunk - 1]) + start_batch
+        batches = iter(self.loader)
+        self.batch_sampler.start_batch = 0
+        processed = 0
+        for chunk_idx, chunk in enumerate(chunks, start=1):
+            num_samples = sum(len(batch) for batch in chunk)
+            processed += num_samples
+            skip = start_batch if chunk_idx == start_chunk else 0
+            if chunk_idx < start_chunk or len(chunk) <= skip:
+                continue
+            yield chunk_idx, islice(batches, len(chunk) - skip), len(chunk) - skip, num_samples, processed
@@ -0,0 +1,115 @@
+"""Data-parallel training helpers for LayoutLMv3 + T5.
+
+Runs are launched with ``torchrun``, which sets ``RANK``, ``LOCAL_RANK`` and
+``WORLD_SIZE``; without them training stays single-process. For example::
+
+    torchrun --nproc_per_node=4 main.py LayoutLMv3_T5 finetune
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Iterable, List
+
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+
+@dataclass
+class DistContext:
+    """Process group membership of the current process."""
+    rank: int = 0
+    local_rank: int = 0
+    world_size: int = 1
+    device: torch.device = torch.device("cpu")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether more than one process takes part in training."""
+        return self.world_size > 1
+
+    @property
+    def is_main(self) -> bool:
+        """Whether this process writes logs and checkpoints."""
+        return self.rank == 0
+
+def init_distributed(backend: str = "", timeout_minutes: int = 0) -> DistContext:
+    """Join the process group described by the ``torchrun`` environment.
+
+    Args:
+        backend: ``"nccl"`` or ``"gloo"``; empty picks nccl when CUDA is
+            available and gloo otherwise. With gloo training runs on CPU,
+            so several processes can be tested on one machine.
+        timeout_minutes: Longest wait in a collective, such as the barrier
+            while rank 0 builds the caches; 0 keeps the torch default
+
+    Returns:
+        Context with rank, world size and the device of this process
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    use_cuda = torch.cuda.is_available() and backend != "gloo"
+    if world_size == 1:
+        return DistContext(device=torch.device("cuda" if use_cuda else "cpu"))
+
+    rank = int(os.environ["RANK"])
+    local_rank = int(os.environ.get("LOCAL_RANK", 0))
+    if use_cuda:
+        torch.cuda.set_device(local_rank)
+        device = torch.device("cuda", local_rank)
+    else:
+        device = torch.device("cpu")
+    timeout = timedelta(minutes=timeout_minutes) if timeout_minutes else None
+    dist.init_process_group(backend or ("nccl" if use_cuda else "gloo"), timeout=timeout)
+    return DistContext(rank=rank, local_rank=local_rank, world_size=world_size, device=device)
+
+def barrier(ctx: DistContext) -> None:
+    """Wait for all processes (no-op when not distributed)."""
+    if ctx.enabled:
+        dist.barrier()
+
+def cleanup_distributed(ctx: DistContext) -> None:
+    """Leave the process group."""
+    if ctx.enabled:
+        dist.destroy_process_group()
+
+def all_gather_object(obj: Any, ctx: DistContext) -> List[Any]:
+    """Collect a picklable object from every process, in rank order.
+
+    Args:
+        obj: Object of this process
+        ctx: Distributed context
+
+    Returns:
+        One object per rank (only ``obj`` when not distributed)
+    """
+    if not ctx.enabled:
+        return [obj]
+    objects = [None] * ctx.world_size
+    dist.all_gather_object(objects, obj)
+    return objects
+
+def all_reduce_gradients(params: Iterable[nn.Parameter], ctx: DistContext) -> None:
+    """Average gradients accumulated under ``no_sync`` across processes.
+
+    Args:
+        params: Trained parameters
+        ctx: Distributed context
+    """
+    if not ctx.enabled:
+        return
+    for param in params:
+        if param.grad is not None:
+            dist.all_reduce(param.grad)
+            param.grad.div_(ctx.world_size)
+
+class NullWriter:
+    """Stand-in for SummaryWriter on processes that do not log."""
+
+    def add_scalar(self, *args, **kwargs) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
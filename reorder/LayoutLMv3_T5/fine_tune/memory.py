@@ -0,0 +1,67 @@
+"""Memory-saving helpers for LayoutLMv3 + T5 training."""
+
+import functools
+from typing import Optional
+
+import torch
+from torch.utils.checkpoint import checkpoint
+
+def _checkpoint_layers(layers) -> None:
+    """Wrap the forward of every layer in ``torch.utils.checkpoint``."""
+    for layer in layers:
+        forward = layer.forward
+
+        @functools.wraps(forward)
+        def checkpointed(*args, _forward=forward, _layer=layer, **kwargs):
+            if not (_layer.training and torch.is_grad_enabled()):
+                return _forward(*args, **kwargs)
+            return checkpoint(_forward, *args, use_reentrant=False, **kwargs)
+
+        layer.forward = checkpointed
+
+def enable_activation_checkpointing(*models) -> None:
+    """Recompute transformer layer activations in the backward pass.
+
+    Models without built-in Hugging Face support (LayoutLMv3) get each
+    ``encoder.layer`` module checkpointed directly.
+
+    Args:
+        *models: Hugging Face transformer models
+    """
+    for model in models:
+        if model.supports_gradient_checkpointing:
+            model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
+        else:
+            _checkpoint_layers(model.encoder.layer)
+        if hasattr(model.config, "use_cache"):
+            # The decoder cache is useless in training and clashes with checkpointing
+            model.config.use_cache = False
+
+class PeakMemoryMeter:
+    """Reports the peak CUDA memory allocated between optimizer steps."""
+
+    def __init__(self, device: torch.device):
+        """Initialize meter.
+
+        Args:
+            device: Training device; the meter is a no-op on CPU
+        """
+        self.device = device
+        self.enabled = device.type == "cuda"
+        self.max_peak_mb = 0.0
+        if self.enabled:
+            torch.cuda.reset_peak_memory_stats(device)
+
+    def step(self) -> Optional[float]:
+        """Return the peak since the previous call in MiB and start a new window."""
+        if not self.enabled:
+            return None
+        peak_mb = torch.cuda.max_memory_allocated(self.device) / 2 ** 20
+        torch.cuda.reset_peak_memory_stats(self.device)
+        self.max_peak_mb = max(self.max_peak_mb, peak_mb)
+        return peak_mb
+
+    def reset(self) -> float:
+        """Return the largest peak seen so far and clear it."""
+        max_peak_mb, self.max_peak_mb = self.max_peak_mb, 0.0
+        return max_peak_mb
@@ -0,0 +1,186 @@
+"""Pointer decoding head predicting the reading order over the input words.
+
+Instead of regenerating the page text subword by subword with T5, the
+pointer head emits a permutation of the input words: at every step it
+scores the words not yet placed against the decoder state and picks one.
+Decoding takes exactly one step per word, the softmax covers only the
+words of the page, and the output can only contain source words.
+"""
+
+from collections import defaultdict, deque
+from typing import List, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+def first_token_positions(word_ids: Sequence) -> List[int]:
+    """Position of the first subword token of every encoded word.
+
+    Args:
+        word_ids: Word index per token from the processor encoding
+            (``encoding.word_ids(i)``), ``None`` for special tokens
+
+    Returns:
+        Token positions, one per word that survived truncation, in word order
+    """
+    positions = {}
+    for pos, word in enumerate(word_ids):
+        if word is not None and word not in positions:
+            positions[word] = pos
+    return [positions[word] for word in range(len(positions))]
+
+def word_positions(encoding, batch_size: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Padded first-token positions of the words of a processor batch.
+
+    Args:
+        encoding: Processor output of a batch (fast tokenizer)
+        batch_size: Number of pages in the batch
+
+    Returns:
+        Tuple of (word_index, word_mask), both of shape (batch, max_words)
+    """
+    positions = [first_token_positions(encoding.word_ids(i)) for i in range(batch_size)]
+    num_words = max(1, max(len(p) for p in positions))
+    word_index = torch.zeros(batch_size, num_words, dtype=torch.long)
+    word_mask = torch.zeros(batch_size, num_words, dtype=torch.long)
+    for i, p in enumerate(positions):
+        word_index[i, :len(p)] = torch.tensor(p, dtype=torch.long)
+        word_mask[i, :len(p)] = 1
+    return word_index, word_mask
+
+def target_order(words: Sequence[str], ordered_words: Sequence[str], num_words: int) -> List[int]:
+    """Reading order of the first ``num_words`` source words.
+
+    Every ordered word is matched to the first unused source word with the
+    same text. Source words left unmatched keep their relative order at the
+    end, and words cut off by truncation are dropped, so the result is a
+    permutation of ``range(num_words)``.
+
+    Args:
+        words: Source words (``src_word_list``)
+        ordered_words: The same words in reading order (``ordered_src_doc``)
+        num_words: Number of source words that survived truncation
+
+    Returns:
+        Source word indices in reading order
+    """
+    unused = defaultdict(deque)
+    for i, word in enumerate(words[:num_words]):
+        unused[word].append(i)
+    order = [unused[word].popleft() for word in ordered_words if unused[word]]
+    placed = set(order)
+    return order + [i for i in range(num_words) if i not in placed]
+
+def gather_words(feats: torch.Tensor, word_index: torch.Tensor) -> torch.Tensor:
+    """Select the token features at ``word_index``, shape (batch, words, dim)."""
+    return feats.gather(1, word_index.unsqueeze(-1).expand(-1, -1, feats.size(-1)))
+
+class PointerHead(nn.Module):
+    """LSTM pointer network over the projected word features.
+
+    The decoder starts from the mean of the page's word features, reads the
+    features of the word placed last, and scores every word with a scaled
+    dot product. Padding words and words already placed are masked out.
+    """
+
+    def __init__(self, d_model: int):
+        """Initialize head.
+
+        Args:
+            d_model: Size of the projected LayoutLMv3 features
+        """
+        super().__init__()
+        self.start = nn.Parameter(torch.randn(d_model) * 0.02)
+        self.init_state = nn.Linear(d_model, d_model)
+        self.decoder = nn.LSTM(d_model, d_model, batch_first=True)
+        self.query = nn.Linear(d_model, d_model)
+        self.key = nn.Linear(d_model, d_model)
+        self.scale = d_model ** -0.5
+
+    def _initial_state(self, word_feats: torch.Tensor, word_mask: torch.Tensor):
+        mask = word_mask.unsqueeze(-1).to(word_feats.dtype)
+        pooled = (word_feats * mask).sum(1) / mask.sum(1).clamp(min=1)
+        h0 = torch.tanh(self.init_state(pooled)).unsqueeze(0)
+        return h0, torch.zeros_like(h0)
+
+    def _scores(self, states: torch.Tensor, keys: torch.Tensor, blocked: torch.Tensor) -> torch.Tensor:
+        scores = torch.matmul(self.query(states), keys.transpose(1, 2)) * self.scale
+        return scores.masked_fill(blocked, torch.finfo(scores.dtype).min)
+
+    def forward(self, word_feats: torch.Tensor, word_mask: torch.Tensor,
+                targets: torch.Tensor) -> torch.Tensor:
+        """Teacher-forced cross-entropy of the target permutations.
+
+        Args:
+            word_feats: Word features of shape (batch, words, d_model)
+            word_mask: 1 for real words, 0 for padding
+            targets: Word index per step, -100 after the last word
+
+        Returns:
+            Scalar loss averaged over all steps
+        """
+        valid = targets >= 0
+        steps = targets.clamp(min=0)
+        # Step t reads the word placed at step t - 1
+        placed = gather_words(word_feats, steps)
+        start = self.start.to(word_feats.dtype).expand(word_feats.size(0), 1, -1)
+        states, _ = self.decoder(torch.cat([start, placed[:, :-1]], dim=1),
+                                 self._initial_state(word_feats, word_mask))
+
+        chosen = F.one_hot(steps, word_feats.size(1)) * valid.unsqueeze(-1)
+        visited = chosen.cumsum(1) - chosen
+        blocked = (visited > 0) | (word_mask == 0).unsqueeze(1)
+        scores = self._scores(states, self.key(word_feats), blocked)
+        if not valid.any():
+            return scores.sum() * 0.0
+        return F.cross_entropy(scores[valid].float(), targets[valid])
+
+    @torch.no_grad()
+    def decode(self, word_feats: torch.Tensor, word_mask: torch.Tensor) -> torch.Tensor:
+        """Greedily decode one permutation per page.
+
+        Args:
+            word_feats: Word features of shape (batch, words, d_model)
+            word_mask: 1 for real words, 0 for padding
+
+        Returns:
+            Word indices in reading order, shape (batch, words), -1 after the
+            last word of each page
+        """
+        batch_size, num_words, _ = word_feats.shape
+        keys = self.key(word_feats)
+        counts = word_mask.sum(1)
+        blocked = (word_mask == 0).unsqueeze(1)
+        state = self._initial_state(word_feats, word_mask)
+        step_input = self.start.to(word_feats.dtype).expand(batch_size, 1, -1)
+        order = torch.full((batch_size, num_words), -1, dtype=torch.long, device=word_feats.device)
+        rows = torch.arange(batch_size, device=word_feats.device)
+        for t in range(int(counts.max().item()) if batch_size else 0):
+            out, state = self.decoder(step_input, state)
+            choice = self._scores(out, keys, blocked).squeeze(1).argmax(-1)
+            active = t < counts
+            order[:, t] = torch.where(active, choice, order[:, t])
+            blocked[rows, 0, choice] = True
+            step_input = word_feats[rows, choice].unsqueeze(1)
+        return order
+
+def pointer_texts(order: torch.Tensor, words: Sequence[Sequence[str]]) -> List[str]:
+    """Join the source words of every page in decoded order.
+
+    Words the processor truncated away were never scored; they follow the
+    decoded words in source order.
+
+    Args:
+        order: Output of ``PointerHead.decode`` (on CPU)
+        words: Source words per page
+
+    Returns:
+        Reordered text per page
+    """
+    texts = []
+    for row, page_words in zip(order.tolist(), words):
+        placed = [i for i in row if i >= 0]
+        rest = range(len(placed), len(page_words))
+        texts.append(" ".join(page_words[i] for i in [*placed, *rest]))
+    return texts
@@ -0,0 +1,25 @@
+"""Build the preprocessed feature cache used by LayoutLMv3 + T5 training."""
+
+from transformers import AutoProcessor
+
+from .config import TrainConfig, ModelConfig
+from .collate import t5_tokenizer
+from .data.feature_cache import load_or_build_feature_cache
+
+def start_execution():
+    """Preprocess the training set once so every epoch can reuse it."""
+    config = TrainConfig()
+    model_config = ModelConfig()
+
+    processor = AutoProcessor.from_pretrained(model_config.layoutlm_model_name, apply_ocr=False)
+    cache_path = load_or_build_feature_cache(
+        config.train_json,
+        config.train_img_dir,
+        processor,
+        t5_tokenizer,
+        config.feature_cache_dir,
+        max_samples=config.max_samples,
+        shard_size=config.cache_shard_size,
+        chunk_size=config.chunk_size
+    )
+    print(f"Feature cache ready at {cache_path}")
@@ -0,0 +1,136 @@
+"""Hot-path instrumentation for the LayoutLMv3 + T5 training loop."""
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+import torch
+from torch.profiler import ProfilerActivity, profile, record_function, tensorboard_trace_handler
+
+_NO_TIMING = nullcontext()
+
+class StageTimer:
+    """Accumulates per-stage time, throughput and padding between logs.
+
+    Loop stages are timed with ``stage``; on CUDA the device is synchronized
+    around each stage so asynchronous kernels are attributed correctly. Data
+    stages that run in loader workers are reported by the dataset and
+    collator and added with ``add``. When disabled, ``stage`` returns a
+    shared no-op context and nothing is timed, synchronized or counted.
+    """
+
+    def __init__(self, enabled: bool, device: torch.device):
+        """Initialize timer.
+
+        Args:
+            enabled: Whether instrumentation is active
+            device: Training device
+        """
+        self.enabled = enabled
+        self.sync = enabled and device.type == "cuda"
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the accumulated totals and restart the throughput clock."""
+        self.totals = defaultdict(float)
+        self.batches = 0
+        self.samples = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.start = time.perf_counter()
+
+    def stage(self, name: str):
+        """Return a context manager timing stage ``name``."""
+        if not self.enabled:
+            return _NO_TIMING
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str):
+        if self.sync:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        with record_function(name):
+            yield
+        if self.sync:
+            torch.cuda.synchronize()
+        self.totals[name] += time.perf_counter() - start
+
+    def add(self, times: Optional[Dict[str, float]]) -> None:
+        """Add stage times measured elsewhere (e.g. in loader workers)."""
+        if not self.enabled or not times:
+            return
+        for name, seconds in times.items():
+            self.totals[name] += seconds
+
+    def count_batch(self, attention_mask: torch.Tensor) -> None:
+        """Count the samples, real tokens and padded tokens of a batch."""
+        if not self.enabled:
+            return
+        self.batches += 1
+        self.samples += attention_mask.size(0)
+        self.tokens += int(attention_mask.sum())
+        self.padded_tokens += attention_mask.numel()
+
+    def log(self, writer, step: int) -> None:
+        """Write per-batch stage times and throughput, then reset.
+
+        Args:
+            writer: TensorBoard SummaryWriter
+            step: Global step the values are logged at
+        """
+        if not self.enabled or not self.batches:
+            return
+        elapsed = time.perf_counter() - self.start
+        for name, seconds in self.totals.items():
+            writer.add_scalar(f'Timing/{name}_ms', seconds * 1000 / self.batches, step)
+        writer.add_scalar('Throughput/samples_per_sec', self.samples / elapsed, step)
+        writer.add_scalar('Throughput/tokens_per_sec', self.tokens / elapsed, step)
+        writer.add_scalar('Throughput/padding_ratio', 1 - self.tokens / max(self.padded_tokens, 1), step)
+        self.reset()
+
+class ProfilerWindow:
+    """Records a ``torch.profiler`` trace over a range of optimizer steps.
+
+    The trace is written in TensorBoard's profiler plugin format.
+    """
+
+    def __init__(self, start_step: int, num_steps: int, trace_dir: str, device: torch.device):
+        """Initialize window.
+
+        Args:
+            start_step: Optimizer step after which tracing starts
+            num_steps: Number of optimizer steps traced (0 disables)
+            trace_dir: Directory the trace is written to
+            device: Training device
+        """
+        self.start_step = start_step
+        self.num_steps = num_steps
+        self.trace_dir = trace_dir
+        self.activities = [ProfilerActivity.CPU]
+        if device.type == "cuda":
+            self.activities.append(ProfilerActivity.CUDA)
+        self.profiler = None
+
+    def step(self, global_step: int) -> None:
+        """Start or stop tracing after optimizer step ``global_step``."""
+        if not self.num_steps:
+            return
+        if self.profiler is None and global_step == self.start_step:
+            print(f"Profiling steps {global_step + 1}-{global_step + self.num_steps}")
+            self.profiler = profile(
+                activities=self.activities,
+                record_shapes=True,
+                profile_memory=True,
+                on_trace_ready=tensorboard_trace_handler(self.trace_dir)
+            )
+            self.profiler.start()
+        elif self.profiler is not None and global_step == self.start_step + self.num_steps:
+            self.close()
+
+    def close(self) -> None:
+        """Stop an active trace and write it out."""
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
@@ -5,10 +5,16 @@ sys.setrecursionlimit(10000)  # Increase recursion limit to avoid RecursionError
 
 import os
 import math
+import time
 import torch
-from torch.utils.data import DataLoader
+from contextlib import nullcontext
+from itertools import chain
+from typing import Dict
+from torch.utils.data import Subset
 from torch.utils.tensorboard import SummaryWriter
 from torch.optim import AdamW
+from torch.nn.parallel import DistributedDataParallel
+import torch.nn as nn
 import torch.nn.utils as nn_utils
 from tqdm import tqdm
 
@@ -22,8 +28,327 @@ from transformers import (
 from .config import TrainConfig, ModelConfig
 from .data.ndjson_reader import iter_ndjson_in_chunks
 from .data.dataset import OcrReorderDataset
-from .collate import CustomCollator
+from .data.feature_cache import CachedFeatureDataset, cache_fingerprint, load_or_build_feature_cache
+from .data.hidden_state_store import (
+    HiddenStateDataset,
+    build_hidden_state_store,
+    hidden_state_fingerprint,
+    hidden_state_store_exists
+)
+from .data.ndjson_index import NdjsonIndex, EpochSubsetSampler, load_record_lengths
+from .data.bucketing import TokenBudgetBatchSampler
+from .data.pipeline import ChunkBatchSampler, ChunkPrefetcher, DataPipeline, QueueWaitTimer, build_loader
+from .collate import CustomCollator, CachedFeatureCollator, HiddenStateCollator, t5_tokenizer
 from .projection import build_projection
+from .pointer import PointerHead, gather_words
+from .windowing import merge_windows
+from .memory import PeakMemoryMeter, enable_activation_checkpointing
+from .checkpoint import CheckpointManager, capture_rng_state, restore_rng_state
+from .profiling import ProfilerWindow, StageTimer
+from .distributed import (
+    NullWriter,
+    all_gather_object,
+    all_reduce_gradients,
+    barrier,
+    cleanup_distributed,
+    init_distributed
+)
+
+def iter_limited_chunks(config: TrainConfig):
+    """Yield NDJSON chunks in file order, stopping at ``max_samples`` records.
+
+    Args:
+        config: Training configuration
+
+    Yields:
+        Lists of parsed records
+    """
+    processed = 0
+    for chunk in iter_ndjson_in_chunks(config.train_json, chunk_size=config.chunk_size):
+        if processed >= config.max_samples:
+            break
+        if processed + len(chunk) > config.max_samples:
+            chunk = chunk[: (config.max_samples - processed)]
+        processed += len(chunk)
+        yield chunk
+
+def chunk_batch_sampler(config: TrainConfig, lengths, chunk_idx: int, epoch: int,
+                        num_replicas: int = 1, rank: int = 0) -> ChunkBatchSampler:
+    """Build the batch sampler of one streamed NDJSON chunk.
+
+    Args:
+        config: Training configuration
+        lengths: Word count of every record of the chunk
+        chunk_idx: 1-based chunk number
+        epoch: Current epoch, seeds the shuffle
+        num_replicas: Number of data-parallel processes
+        rank: Rank of this process
+
+    Returns:
+        Batch sampler over the chunk's record positions, sharded for ``rank``
+    """
+    # Seeded per chunk and epoch so an interrupted chunk replays identically
+    sampler = EpochSubsetSampler(len(lengths), seed=config.seed + chunk_idx * (config.num_epochs + 1))
+    sampler.set_epoch(epoch)
+    if config.max_tokens:
+        batch_sampler = TokenBudgetBatchSampler(
+            sampler,
+            lengths,
+            config.max_tokens,
+            len(lengths),
+            shuffle=True,
+            max_batch_size=config.max_batch_size,
+            seed=config.seed
+        )
+    else:
+        batch_sampler = ChunkBatchSampler(sampler, config.batch_size, len(lengths))
+    batch_sampler.shard(num_replicas, rank)
+    return batch_sampler
+
+def iter_train_chunks(config: TrainConfig, processor, data_collator, pipeline=None,
+                      epoch: int = 1, start_chunk: int = 1, start_batch: int = 0,
+                      num_replicas: int = 1, rank: int = 0):
+    """Yield the per-chunk batch iterators of one training epoch.
+
+    Args:
+        config: Training configuration
+        processor: LayoutLMv3 processor
+        data_collator: Batch collator for the streamed path
+        pipeline: Long-lived pipeline over a random-access dataset (feature
+            cache or indexed NDJSON); the NDJSON file is streamed in file
+            order, one loader per chunk, when None
+        epoch: Current epoch, seeds the streamed shuffle
+        start_chunk: 1-based chunk to start at when resuming
+        start_batch: Batches of ``start_chunk`` already trained on
+        num_replicas: Number of data-parallel processes (streamed path)
+        rank: Rank of this process; it loads only its batches of each chunk
+
+    Yields:
+        Tuples of (chunk number, batch iterator, batches left in chunk,
+        samples in chunk, samples processed so far)
+    """
+    if pipeline is not None:
+        yield from pipeline.iter_chunks(start_chunk, start_batch)
+        return
+
+    processed = 0
+    # The next chunk is parsed in a background thread while this one trains
+    prefetcher = ChunkPrefetcher(iter_limited_chunks(config), depth=config.chunk_prefetch)
+    for chunk_idx, chunk in enumerate(prefetcher, start=1):
+        processed += len(chunk)
+        if chunk_idx < start_chunk:
+            continue
+        dataset = OcrReorderDataset(chunk, config.train_img_dir, processor, timed=config.stage_timing)
+        batch_sampler = chunk_batch_sampler(config, [len(item["src_word_list"]) for item in chunk],
+                                            chunk_idx, epoch, num_replicas, rank)
+        batch_sampler.start_batch = start_batch if chunk_idx == start_chunk else 0
+        if len(batch_sampler) == 0:
+            continue
+        loader = build_loader(
+            dataset,
+            data_collator,
+            num_workers=config.num_workers,
+            prefetch_factor=config.prefetch_factor,
+            pin_memory=config.pin_memory and torch.cuda.is_available(),
+            seed=config.seed,
+            batch_sampler=batch_sampler
+        )
+        yield chunk_idx, loader, len(batch_sampler), len(chunk), processed
+
+def count_optimizer_steps(config: TrainConfig, batch_sampler=None, lengths=None,
+                          num_replicas: int = 1, rank: int = 0) -> int:
+    """Count the optimizer steps of the whole run from the batch plan of every epoch.
+
+    Token budgets and resampling change the number of batches from epoch to
+    epoch, so every epoch is planned the way training will plan it.
+
+    Args:
+        config: Training configuration
+        batch_sampler: Sharded batch sampler of a random-access dataset; None
+            when the NDJSON file is streamed
+        lengths: Word count of every record of a streamed file; without it
+            streamed chunks are assumed full
+        num_replicas: Number of data-parallel processes
+        rank: Rank of this process
+
+    Returns:
+        Optimizer steps over ``num_epochs``, counting the flush of leftover
+        batches at the end of every epoch
+    """
+    total = 0
+    for epoch in range(1, config.num_epochs + 1):
+        if batch_sampler is not None:
+            batch_sampler.sampler.set_epoch(epoch)
+            num_batches = len(batch_sampler)
+        elif lengths is not None:
+            num_samples = min(len(lengths), config.max_samples)
+            num_batches = sum(
+                len(chunk_batch_sampler(config, lengths[start:min(start + config.chunk_size, num_samples)],
+                                        chunk_idx, epoch, num_replicas, rank))
+                for chunk_idx, start in enumerate(range(0, num_samples, config.chunk_size), start=1)
+            )
+        else:
+            num_batches = math.ceil(config.max_samples / (config.batch_size * num_replicas))
+        total += math.ceil(num_batches / config.grad_accum_steps)
+    return total
+
+def build_train_source(config: TrainConfig, model_config: ModelConfig, processor,
+                       layout_model, device: torch.device):
+    """Set up the training dataset and collator.
+
+    Depending on the config the samples come from the hidden state store
+    (frozen encoder), the preprocessed feature cache, the indexed NDJSON file
+    or, without a random-access dataset, a plain NDJSON stream.
+
+    Args:
+        config: Training configuration
+        model_config: Model configuration
+        processor: LayoutLMv3 processor
+        layout_model: LayoutLMv3 encoder (used to fill the hidden state store)
+        device: Training device
+
+    Returns:
+        Tuple of (random-access dataset or None when streaming, collator,
+        per-sample lengths for token budgets or None; when streaming they
+        are in file order)
+    """
+    if config.head == "pointer" and (config.use_feature_cache or config.freeze_encoder):
+        # Cached samples hold T5 labels but not the word positions the pointer needs
+        raise ValueError("head='pointer' needs use_feature_cache=False and freeze_encoder=False")
+    if config.sliding_window and (config.head == "pointer" or config.use_feature_cache or config.freeze_encoder):
+        # Cached samples were truncated by the processor, and pointer positions index unwindowed tokens
+        raise ValueError("sliding_window needs head='t5', use_feature_cache=False and freeze_encoder=False")
+
+    # Resampling draws from the whole file, so caches have to cover it
+    num_samples = None if config.resample_each_epoch else config.max_samples
+
+    store_path = None
+    if config.freeze_encoder:
+        source_key = cache_fingerprint(config.train_json, config.train_img_dir, processor,
+                                       t5_tokenizer, num_samples)
+        store_key = hidden_state_fingerprint(source_key, model_config.layoutlm_model_name,
+                                             config.init_checkpoint or None)
+        store_path = os.path.join(config.hidden_state_dir, store_key)
+        if hidden_state_store_exists(store_path):
+            print(f"Using hidden state store {store_path}")
+            return _hidden_state_source(config, store_path)
+
+    train_dataset = None
+    lengths = None
+    if config.use_feature_cache:
+        cache_path = load_or_build_feature_cache(
+            config.train_json,
+            config.train_img_dir,
+            processor,
+            t5_tokenizer,
+            config.feature_cache_dir,
+            max_samples=num_samples,
+            shard_size=config.cache_shard_size,
+            chunk_size=config.chunk_size
+        )
+        train_dataset = CachedFeatureDataset(cache_path)
+        data_collator = CachedFeatureCollator(processor.tokenizer.pad_token_id)
+        if config.max_tokens and store_path is None:
+            lengths = train_dataset.lengths()
+    else:
+        data_collator = CustomCollator(processor, timed=config.stage_timing,
+                                       pointer=config.head == "pointer",
+                                       sliding_window=config.sliding_window,
+                                       window_overlap=config.window_overlap,
+                                       max_windows=config.max_windows)
+        if config.use_ndjson_index:
+            records = NdjsonIndex(config.train_json)
+            train_dataset = OcrReorderDataset(records, config.train_img_dir, processor,
+                                              timed=config.stage_timing)
+            if config.max_tokens and store_path is None:
+                lengths = load_record_lengths(records)
+        elif config.max_tokens and store_path is None:
+            # Streamed chunks are batched from their own records; the lengths only count the steps
+            lengths = load_record_lengths(NdjsonIndex(config.train_json))
+
+    if store_path is None:
+        return train_dataset, data_collator, lengths
+
+    # Encode the training set once with the frozen encoder
+    print(f"Hidden state store {store_path} not found, encoding training set")
+    os.makedirs(config.hidden_state_dir, exist_ok=True)
+    loader_kwargs = {
+        "num_workers": config.num_workers,
+        "prefetch_factor": config.prefetch_factor,
+        "pin_memory": config.pin_memory and device.type == "cuda",
+        "batch_size": config.batch_size,
+        "shuffle": False
+    }
+    if train_dataset is not None:
+        limit = len(train_dataset) if num_samples is None else min(len(train_dataset), num_samples)
+        batches = build_loader(Subset(train_dataset, range(limit)), data_collator, **loader_kwargs)
+    else:
+        batches = chain.from_iterable(
+            build_loader(OcrReorderDataset(chunk, config.train_img_dir, processor), data_collator, **loader_kwargs)
+            for chunk in iter_limited_chunks(config)
+        )
+    build_hidden_state_store(batches, layout_model, store_path, device, t5_tokenizer.pad_token_id)
+    return _hidden_state_source(config, store_path)
+
+def _hidden_state_source(config: TrainConfig, store_path: str):
+    """Return the dataset, collator and lengths of a hidden state store."""
+    train_dataset = HiddenStateDataset(store_path)
+    lengths = train_dataset.lengths() if config.max_tokens else None
+    return train_dataset, HiddenStateCollator(), lengths
+
+def compute_loss(layout_model, projection, t5_model, batch: Dict, pointer_head=None) -> torch.Tensor:
+    """Run the forward pass of one batch and return the T5 or pointer loss.
+
+    Batches from the hidden state store carry precomputed encoder states in
+    ``hidden_states`` and skip LayoutLMv3 entirely.
+
+    Args:
+        layout_model: LayoutLMv3 encoder
+        projection: Projection from LayoutLMv3 to T5 embedding space
+        t5_model: T5 model
+        batch: Collated batch, already on the training device
+        pointer_head: Pointer head trained instead of T5 when given
+
+    Returns:
+        Scalar loss
+    """
+    mask = batch["attention_mask"]
+    if "hidden_states" in batch:
+        text_feats = batch["hidden_states"].float()
+    else:
+        layout_out = layout_model(
+            pixel_values=batch["pixel_values"],
+            input_ids=batch["input_ids"],
+            attention_mask=batch.get("window_attention_mask", mask),
+            bbox=batch["bbox"]
+        )
+        seq_len = batch["input_ids"].size(1)
+        text_feats = layout_out.last_hidden_state[:, :seq_len, :]
+        if "window_index" in batch:
+            text_feats = merge_windows(text_feats, batch["window_index"])
+    proj_feats = projection(text_feats)
+    if pointer_head is not None:
+        word_feats = gather_words(proj_feats, batch["word_index"])
+        return pointer_head(word_feats, batch["word_mask"], batch["pointer_targets"])
+    outputs = t5_model(
+        inputs_embeds=proj_feats,
+        attention_mask=mask,
+        labels=batch["labels"]
+    )
+    return outputs.loss
+
+class ReorderLoss(nn.Module):
+    """Bundles the models so one DDP wrapper synchronizes all of them."""
+
+    def __init__(self, layout_model, projection, t5_model, pointer_head=None):
+        super().__init__()
+        self.layout_model = layout_model
+        self.projection = projection
+        self.t5_model = t5_model
+        self.pointer_head = pointer_head
+
+    def forward(self, batch: Dict) -> torch.Tensor:
+        return compute_loss(self.layout_model, self.projection, self.t5_model, batch, self.pointer_head)
 
 def start_execution():
     """Main training function."""
@@ -31,34 +356,138 @@ def start_execution():
     config = TrainConfig()
     model_config = ModelConfig()
     
+    # Data parallelism (single process unless launched with torchrun)
+    dist_ctx = init_distributed(config.ddp_backend, config.ddp_timeout_minutes)
+    device = dist_ctx.device
+
     # Setup directories
     os.makedirs(config.save_dir, exist_ok=True)
     os.makedirs(config.log_dir, exist_ok=True)
     
-    # Initialize TensorBoard
-    writer = SummaryWriter(log_dir=config.log_dir)
+    # Initialize TensorBoard; only rank 0 logs
+    writer = SummaryWriter(log_dir=config.log_dir) if dist_ctx.is_main else NullWriter()
     
     # Device setup
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    pin_memory = config.pin_memory and device.type == "cuda"
     
     # Initialize models and processor
     processor = AutoProcessor.from_pretrained(model_config.layoutlm_model_name, apply_ocr=False)
     layout_model = LayoutLMv3Model.from_pretrained(model_config.layoutlm_model_name).to(device)
     t5_model = T5ForConditionalGeneration.from_pretrained(model_config.t5_model_name).to(device)
     projection = build_projection(t5_model).to(device)
+    # The pointer head replaces the T5 decoder; T5 only fixes the projection size
+    pointer_head = PointerHead(t5_model.config.d_model).to(device) if config.head == "pointer" else None
+
+    if config.init_checkpoint:
+        print(f"Initializing weights from {config.init_checkpoint}")
+        ckpt = torch.load(config.init_checkpoint, map_location="cpu")
+        layout_model.load_state_dict(ckpt['layout_model'])
+        t5_model.load_state_dict(ckpt['t5_model'])
+        projection.load_state_dict(ckpt['projection'])
+        if pointer_head is not None and 'pointer_head' in ckpt:
+            pointer_head.load_state_dict(ckpt['pointer_head'])
+        del ckpt
+
+    # Resume from the newest checkpoint of this run
+    checkpoints = CheckpointManager(config.save_dir)
+    resume_path = checkpoints.latest() if config.resume else None
+    resume_state = None
+    if resume_path is not None:
+        print(f"Resuming from {resume_path}")
+        resume_state = torch.load(resume_path, map_location="cpu")
+        layout_model.load_state_dict(resume_state['layout_model'])
+        t5_model.load_state_dict(resume_state['t5_model'])
+        projection.load_state_dict(resume_state['projection'])
+        if pointer_head is not None:
+            pointer_head.load_state_dict(resume_state['pointer_head'])
+
+    # Frozen encoder: only the projection and T5 are trained
+    if config.freeze_encoder:
+        layout_model.requires_grad_(False)
+        layout_model.eval()
+    if pointer_head is not None:
+        t5_model.requires_grad_(False)
+    decoder = t5_model if pointer_head is None else pointer_head
+    trainable_params = [
+        p for module in (layout_model, decoder, projection)
+        for p in module.parameters() if p.requires_grad
+    ]
+
+    # Activation checkpointing trades recomputation for activation memory
+    if config.gradient_checkpointing:
+        checkpointed = [] if config.freeze_encoder else [layout_model]
+        if pointer_head is None:
+            checkpointed.append(t5_model)
+        enable_activation_checkpointing(*checkpointed)
     
-    # Optimizer
+    loss_model = ReorderLoss(layout_model, projection, t5_model, pointer_head)
+    if dist_ctx.enabled:
+        # LayoutLMv3's relative position bias tables receive no gradient
+        loss_model = DistributedDataParallel(
+            loss_model,
+            device_ids=[dist_ctx.local_rank] if device.type == "cuda" else None,
+            find_unused_parameters=not config.freeze_encoder
+        )
+
+    # Optimizer; each step averages gradients over the global batch
+    global_batch_size = config.batch_size * config.grad_accum_steps * dist_ctx.world_size
+    learning_rate = config.learning_rate
+    if config.scale_lr_with_world_size:
+        learning_rate *= dist_ctx.world_size
+    print(f"Rank {dist_ctx.rank}/{dist_ctx.world_size} on {device} - global batch size "
+          f"{global_batch_size}, learning rate {learning_rate:g}")
     optimizer = AdamW(
-        list(layout_model.parameters()) +
-        list(t5_model.parameters()) +
-        list(projection.parameters()),
-        lr=config.learning_rate,
+        trainable_params,
+        lr=learning_rate,
         weight_decay=config.weight_decay
     )
     
-    # Scheduler
-    steps_per_ep = math.ceil(config.max_samples / config.batch_size)
-    total_steps = steps_per_ep * config.num_epochs
+    # Data source; rank 0 builds any missing cache or index before the others load it,
+    # which may take longer than the default collective timeout (see ddp_timeout_minutes)
+    if not dist_ctx.is_main:
+        barrier(dist_ctx)
+    train_dataset, data_collator, lengths = build_train_source(
+        config, model_config, processor, layout_model, device
+    )
+    if dist_ctx.is_main:
+        barrier(dist_ctx)
+
+    sampler = None
+    batch_sampler = None
+    pipeline = None
+    if train_dataset is not None:
+        sampler = EpochSubsetSampler(
+            len(train_dataset),
+            max_samples=config.max_samples,
+            resample=config.resample_each_epoch,
+            seed=config.seed
+        )
+        if config.max_tokens:
+            batch_sampler = TokenBudgetBatchSampler(
+                sampler,
+                lengths,
+                config.max_tokens,
+                config.chunk_size,
+                shuffle=True,
+                max_batch_size=config.max_batch_size,
+                seed=config.seed
+            )
+        else:
+            batch_sampler = ChunkBatchSampler(sampler, config.batch_size, config.chunk_size)
+        # Every rank plans the same epoch and keeps its share of each chunk
+        batch_sampler.shard(dist_ctx.world_size, dist_ctx.rank)
+        pipeline = DataPipeline(
+            train_dataset,
+            batch_sampler,
+            data_collator,
+            num_workers=config.num_workers,
+            prefetch_factor=config.prefetch_factor,
+            pin_memory=pin_memory
+        )
+    wait_timer = QueueWaitTimer()
+
+    # Scheduler steps once per optimizer update; leftover batches are flushed per epoch
+    total_steps = count_optimizer_steps(config, batch_sampler, lengths, dist_ctx.world_size, dist_ctx.rank)
     warmup_steps = int(config.warmup_ratio * total_steps)
     scheduler = get_linear_schedule_with_warmup(
         optimizer,
@@ -69,124 +498,228 @@ def start_execution():
     # Mixed precision scaler
     scaler = torch.cuda.amp.GradScaler()
     
-    # Data collator
-    data_collator = CustomCollator(processor)
     global_step = 0
+    # Next batch to train on; epoch_samples doubles as the record offset in the epoch
+    position = {"epoch": 1, "chunk": 1, "batch": 0, "epoch_loss": 0.0, "epoch_samples": 0}
+    if resume_state is not None:
+        optimizer.load_state_dict(resume_state['optimizer'])
+        scheduler.load_state_dict(resume_state['scheduler'])
+        scaler.load_state_dict(resume_state['scaler'])
+        global_step = resume_state['global_step']
+        position = resume_state['position']
+        # One generator state per rank; checkpoints of older runs hold rank 0's only
+        rng_states = resume_state['rng']
+        rng_states = [rng_states] if isinstance(rng_states, dict) else rng_states
+        if dist_ctx.rank < len(rng_states):
+            restore_rng_state(rng_states[dist_ctx.rank])
+        print(f"Continuing at epoch {position['epoch']}, chunk {position['chunk']}, "
+              f"batch {position['batch']} (step {global_step})")
+        del resume_state
+    micro_batches = 0  # backward passes since the last optimizer step
+    accum_loss = 0.0
+    accum_wait = 0.0
+    memory_meter = PeakMemoryMeter(device)
+    stage_timer = StageTimer(config.stage_timing, device)
+    profiler_window = ProfilerWindow(
+        config.profile_start_step,
+        config.profile_num_steps if dist_ctx.is_main else 0,
+        os.path.join(config.log_dir, "profile"),
+        device
+    )
+
+    def optimizer_step():
+        """Apply the accumulated gradients and log the optimizer step."""
+        nonlocal global_step, micro_batches, accum_loss, accum_wait
+        with stage_timer.stage("optimizer"):
+            scaler.unscale_(optimizer)
+            nn_utils.clip_grad_norm_(trainable_params, max_norm=config.max_grad_norm)
+            scaler.step(optimizer)
+            scaler.update()
+            scheduler.step()
+            optimizer.zero_grad()
+        global_step += 1
+        profiler_window.step(global_step)
+
+        step_loss = accum_loss / micro_batches
+        writer.add_scalar('Loss/train_batch', step_loss, global_step)
+        writer.add_scalar('LearningRate', scheduler.get_last_lr()[0], global_step)
+        writer.add_scalar('Pipeline/queue_wait_ms', accum_wait * 1000, global_step)
+        peak_mb = memory_meter.step()
+        if peak_mb is not None:
+            writer.add_scalar('Memory/peak_allocated_mb', peak_mb, global_step)
+        if config.timing_log_every and global_step % config.timing_log_every == 0:
+            stage_timer.log(writer, global_step)
+        micro_batches = 0
+        accum_loss = 0.0
+        accum_wait = 0.0
+        return peak_mb
+
+    def save_checkpoint(filename: str, pool: str, keep_last: int, next_position: Dict,
+                        avg_loss: float, extra_paths=()):
+        """Snapshot the full training state and write it in the background.
+
+        Called on every rank, which contributes its generator state; only
+        rank 0 writes.
+        """
+        start = time.perf_counter()
+        rng_states = all_gather_object(capture_rng_state(), dist_ctx)
+        if not dist_ctx.is_main:
+            return
+        state = {'pointer_head': pointer_head.state_dict()} if pointer_head is not None else {}
+        checkpoints.save({
+            'layout_model': layout_model.state_dict(),
+            't5_model': t5_model.state_dict(),
+            'projection': projection.state_dict(),
+            **state,
+            'optimizer': optimizer.state_dict(),
+            'scheduler': scheduler.state_dict(),
+            'scaler': scaler.state_dict(),
+            'global_step': global_step,
+            'epoch': epoch,
+            'avg_loss': avg_loss,
+            'position': next_position,
+            'rng': rng_states
+        }, filename, pool, keep_last=keep_last, extra_paths=extra_paths)
+        writer.add_scalar('Checkpoint/blocking_ms', (time.perf_counter() - start) * 1000, global_step)
     
     # Training loop
-    for epoch in range(1, config.num_epochs + 1):
+    profiler_window.step(global_step)
+    for epoch in range(position["epoch"], config.num_epochs + 1):
         print(f"\n===== STARTING EPOCH {epoch}/{config.num_epochs} =====")
-        processed = 0
-        chunk_idx = 0
-        epoch_loss = 0.0
-        epoch_samples = 0
-
-        for chunk in iter_ndjson_in_chunks(config.train_json, chunk_size=config.chunk_size):
-            if processed >= config.max_samples:
-                break
-            if processed + len(chunk) > config.max_samples:
-                chunk = chunk[: (config.max_samples - processed)]
-            processed += len(chunk)
-            chunk_idx += 1
-            print(f"  --> Chunk {chunk_idx}: {len(chunk)} samples (Total {processed}/{config.max_samples})")
-
-            dataset = OcrReorderDataset(chunk, config.train_img_dir, processor)
-            loader = DataLoader(
-                dataset,
-                batch_size=config.batch_size,
-                shuffle=True,
-                collate_fn=data_collator
-            )
+        resuming = epoch == position["epoch"]
+        start_chunk = position["chunk"] if resuming else 1
+        start_batch = position["batch"] if resuming else 0
+        epoch_loss = position["epoch_loss"] if resuming else 0.0
+        epoch_samples = position["epoch_samples"] if resuming else 0
+        epoch_truncated = 0  # pages whose words did not all fit into max_windows
+        epoch_start = time.perf_counter()
+        wait_timer.reset()
 
-            layout_model.train(); t5_model.train(); projection.train()
+        if sampler is not None:
+            sampler.set_epoch(epoch)
+
+        for chunk_idx, batches, num_batches, num_samples, processed in iter_train_chunks(
+                config, processor, data_collator, pipeline, epoch, start_chunk, start_batch,
+                dist_ctx.world_size, dist_ctx.rank):
+            if dist_ctx.is_main:
+                print(f"  --> Chunk {chunk_idx}: {num_samples} samples (Total {processed}/{config.max_samples})")
+            # Batches of this chunk trained on, including those of an earlier run
+            chunk_offset = start_batch if chunk_idx == start_chunk else 0
+
+            decoder.train(); projection.train()
+            if not config.freeze_encoder:
+                layout_model.train()
             total_loss = 0
             chunk_samples = 0
-            bar = tqdm(loader, desc=f"Epoch {epoch} Chunk {chunk_idx}")
+            chunk_batches = 0
+            bar = tqdm(
+                wait_timer.wrap(batches),
+                total=num_batches,
+                desc=f"Epoch {epoch} Chunk {chunk_idx}",
+                disable=not dist_ctx.is_main
+            )
 
             for batch in bar:
-                optimizer.zero_grad()
-                pv = batch["pixel_values"].to(device)
-                input_ids = batch["input_ids"].to(device)
-                mask = batch["attention_mask"].to(device)
-                bbox = batch["bbox"].to(device)
-                labels = batch["labels"].to(device)
-
-                with torch.cuda.amp.autocast():
-                    # Forward pass
-                    layout_out = layout_model(
-                        pixel_values=pv,
-                        input_ids=input_ids,
-                        attention_mask=mask,
-                        bbox=bbox
-                    )
-                    seq_len = input_ids.size(1)
-                    text_feats = layout_out.last_hidden_state[:, :seq_len, :]
-                    proj_feats = projection(text_feats)
-                    outputs = t5_model(
-                        inputs_embeds=proj_feats,
-                        attention_mask=mask,
-                        labels=labels
-                    )
-                    loss = outputs.loss
-
-                # Backward pass
-                scaler.scale(loss).backward()
-                scaler.unscale_(optimizer)
-                nn_utils.clip_grad_norm_(
-                    list(layout_model.parameters()) +
-                    list(t5_model.parameters()) +
-                    list(projection.parameters()),
-                    max_norm=config.max_grad_norm
-                )
-                scaler.step(optimizer)
-                scaler.update()
-                scheduler.step()
+                stage_timer.add(batch.get("stage_times"))
+                epoch_truncated += batch.get("truncated", 0)
+                stage_timer.count_batch(batch["attention_mask"])
+                with stage_timer.stage("h2d"):
+                    batch = {
+                        k: v.to(device, non_blocking=pin_memory)
+                        for k, v in batch.items() if torch.is_tensor(v)
+                    }
+
+                # Gradients are all-reduced only by the batch completing an optimizer step
+                accumulating = dist_ctx.enabled and micro_batches + 1 < config.grad_accum_steps
+                with loss_model.no_sync() if accumulating else nullcontext():
+                    with stage_timer.stage("forward"), torch.cuda.amp.autocast():
+                        loss = loss_model(batch)
+
+                    # Backward pass, accumulated over grad_accum_steps batches
+                    with stage_timer.stage("backward"):
+                        scaler.scale(loss / config.grad_accum_steps).backward()
 
                 # Log metrics
                 batch_loss = loss.item()
                 total_loss += batch_loss
-                epoch_loss += batch_loss * len(batch["input_ids"])
-                epoch_samples += len(batch["input_ids"])
-                chunk_samples += len(batch["input_ids"])
-                global_step += 1
-                
-                writer.add_scalar('Loss/train_batch', batch_loss, global_step)
-                writer.add_scalar('LearningRate', scheduler.get_last_lr()[0], global_step)
-                
-                bar.set_postfix(loss=batch_loss, lr=scheduler.get_last_lr()[0])
+                batch_size = len(batch["attention_mask"])
+                epoch_loss += batch_loss * batch_size
+                epoch_samples += batch_size
+                chunk_samples += batch_size
+                chunk_batches += 1
+                chunk_offset += 1
+                micro_batches += 1
+                accum_loss += batch_loss
+                accum_wait += wait_timer.last
+                if stage_timer.enabled:
+                    stage_timer.add({"wait": wait_timer.last})
+
+                postfix = {"loss": batch_loss, "lr": scheduler.get_last_lr()[0], "wait_ms": wait_timer.last * 1000}
+                if micro_batches == config.grad_accum_steps:
+                    peak_mb = optimizer_step()
+                    if peak_mb is not None:
+                        postfix["peak_mb"] = peak_mb
+                    if config.checkpoint_every_steps and global_step % config.checkpoint_every_steps == 0:
+                        save_checkpoint(
+                            f"checkpoint_step_{global_step}.pth",
+                            "step",
+                            config.keep_last_checkpoints,
+                            {"epoch": epoch, "chunk": chunk_idx, "batch": chunk_offset,
+                             "epoch_loss": epoch_loss, "epoch_samples": epoch_samples},
+                            epoch_loss / epoch_samples
+                        )
+                bar.set_postfix(postfix)
 
             # Log chunk metrics
-            avg_chunk_loss = total_loss / len(loader)
+            avg_chunk_loss = total_loss / chunk_batches
             writer.add_scalar('Loss/train_chunk', avg_chunk_loss, global_step)
-            print(f"Chunk {chunk_idx} done - Avg Loss: {avg_chunk_loss:.4f}")
+            if dist_ctx.is_main:
+                print(f"Chunk {chunk_idx} done - Avg Loss: {avg_chunk_loss:.4f}")
 
-            del dataset, loader
-            torch.cuda.empty_cache()
+        if micro_batches:
+            # Each loss was divided by grad_accum_steps; average over the batches actually accumulated
+            for param in trainable_params:
+                if param.grad is not None:
+                    param.grad.mul_(config.grad_accum_steps / micro_batches)
+            all_reduce_gradients(trainable_params, dist_ctx)
+            optimizer_step()
 
         # Log epoch metrics
         avg_epoch_loss = epoch_loss / epoch_samples
+        input_bound = wait_timer.total / (time.perf_counter() - epoch_start)
         writer.add_scalar('Loss/train_epoch', avg_epoch_loss, epoch)
         writer.add_scalar('Loss/train_epoch_avg', avg_epoch_loss, epoch)
-        print(f"Epoch {epoch} complete - Avg Loss: {avg_epoch_loss:.4f}")
+        writer.add_scalar('Pipeline/input_bound_fraction', input_bound, epoch)
+        print(f"Epoch {epoch} complete - Avg Loss: {avg_epoch_loss:.4f} "
+              f"- Queue wait {wait_timer.total:.1f}s ({input_bound:.0%} of epoch)")
+        if config.sliding_window:
+            truncated = sum(all_gather_object(epoch_truncated, dist_ctx))
+            writer.add_scalar('Data/truncated_pages', truncated, epoch)
+            if dist_ctx.is_main:
+                print(f"Pages still truncated after max_windows={config.max_windows} windows: {truncated}")
+        if memory_meter.enabled:
+            max_peak_mb = memory_meter.reset()
+            writer.add_scalar('Memory/epoch_peak_allocated_mb', max_peak_mb, epoch)
+            print(f"Peak GPU memory this epoch: {max_peak_mb:.0f} MiB")
 
         # Save checkpoint
-        if epoch % 5 == 0:
-            ckpt_path = os.path.join(config.save_dir, f"model_epoch_{epoch}.pth")
+        if epoch % config.checkpoint_every_epochs == 0:
             proc_path = os.path.join(config.save_dir, f"processor_epoch_{epoch}")
-            print(f"Saving checkpoint for epoch {epoch}")
-            torch.save({
-                'layout_model': layout_model.state_dict(),
-                't5_model': t5_model.state_dict(),
-                'projection': projection.state_dict(),
-                'optimizer': optimizer.state_dict(),
-                'scheduler': scheduler.state_dict(),
-                'scaler': scaler.state_dict(),
-                'global_step': global_step,
-                'epoch': epoch,
-                'avg_loss': avg_epoch_loss
-            }, ckpt_path)
-            processor.save_pretrained(proc_path)
+            if dist_ctx.is_main:
+                print(f"Saving checkpoint for epoch {epoch}")
+                processor.save_pretrained(proc_path)
+            save_checkpoint(
+                f"model_epoch_{epoch}.pth",
+                "epoch",
+                config.keep_epoch_checkpoints,
+                {"epoch": epoch + 1, "chunk": 1, "batch": 0, "epoch_loss": 0.0, "epoch_samples": 0},
+                avg_epoch_loss,
+                extra_paths=[proc_path]
+            )
             writer.flush()
 
+    profiler_window.close()
+    checkpoints.wait()
     writer.close()
-    print("\nTraining complete. Models saved every 5 epochs.")
+    cleanup_distributed(dist_ctx)
+    print(f"\nTraining complete. Models saved every {config.checkpoint_every_epochs} epochs.")
@@ -0,0 +1,144 @@
+"""Sliding windows over pages longer than the LayoutLMv3 sequence limit.
+
+The processor truncates every page to 512 tokens, so the words of dense
+pages past that point never reach T5. In windowing mode such pages are
+sorted by box position (top to bottom, then left to right) and cut into
+overlapping windows that each fit the limit. The windows of all pages in a
+batch are encoded together, and every word keeps the features of the
+window it sits furthest inside, so it sees context on both sides. T5 uses
+relative positions, so the merged page may be longer than 512 tokens.
+Pages that fit are encoded exactly as without windowing.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+def box_order(boxes: Sequence[Sequence[int]]) -> List[int]:
+    """Word indices sorted by the top, then the left edge of their boxes."""
+    return sorted(range(len(boxes)), key=lambda i: (boxes[i][1], boxes[i][0]))
+
+def plan_windows(token_counts: Sequence[int], max_tokens: int, overlap: int = 128,
+                 max_windows: int = 4) -> List[Tuple[int, int]]:
+    """Split a page into overlapping word spans.
+
+    Every window holds at most ``max_tokens`` tokens (a single longer word
+    gets a window of its own and is truncated), and consecutive windows
+    share at least ``overlap`` tokens where the window size allows.
+
+    Args:
+        token_counts: Tokens per word, in window order
+        max_tokens: Tokens per window without special tokens
+        overlap: Tokens shared by consecutive windows
+        max_windows: Windows per page; words after the last one are dropped
+
+    Returns:
+        ``(start, end)`` word spans
+    """
+    spans = []
+    start = 0
+    while True:
+        end, used = start, 0
+        while end < len(token_counts) and (end == start or used + token_counts[end] <= max_tokens):
+            used += token_counts[end]
+            end += 1
+        spans.append((start, end))
+        if end >= len(token_counts) or len(spans) == max_windows:
+            return spans
+        # Step back from the end until enough tokens are shared, keeping room
+        # for the next word so every window reaches past the previous one
+        next_start, shared = end, 0
+        while (next_start > start + 1 and shared < overlap
+               and shared + token_counts[next_start - 1] + token_counts[end] <= max_tokens):
+            next_start -= 1
+            shared += token_counts[next_start]
+        start = next_start
+
+def encode_windows(processor, images: list, words: List[List[str]], boxes: List[List[List[int]]],
+                   overlap: int = 128, max_windows: int = 4,
+                   max_tokens: Optional[int] = None) -> Dict[str, torch.Tensor]:
+    """Run the processor over the windows of a batch of pages.
+
+    Args:
+        processor: LayoutLMv3 processor (fast tokenizer)
+        images: Page images
+        words: Words per page
+        boxes: Normalized word boxes per page
+        overlap: Tokens shared by consecutive windows
+        max_windows: Windows per page
+        max_tokens: Tokens per window without special tokens; defaults to
+            the tokenizer's limit (510 for LayoutLMv3)
+
+    Returns:
+        Dictionary with the processor outputs of all windows
+        (``pixel_values``, ``input_ids``, ``bbox`` and
+        ``window_attention_mask``), ``window_index`` with the positions of
+        every page's merged tokens in the flattened window tokens,
+        ``attention_mask`` of the merged pages and ``truncated``, the number
+        of pages whose words did not all fit into their windows
+    """
+    tokenizer = processor.tokenizer
+    if max_tokens is None:
+        max_tokens = tokenizer.model_max_length - tokenizer.num_special_tokens_to_add()
+    counted = tokenizer(words, boxes=boxes, add_special_tokens=False, verbose=False)
+    window_words, window_boxes, window_pages, owned = [], [], [], []
+    truncated = 0
+    for page, (page_words, page_boxes) in enumerate(zip(words, boxes)):
+        counts = [0] * len(page_words)
+        for word in counted.word_ids(page):
+            counts[word] += 1
+        order = list(range(len(page_words)))
+        if sum(counts) > max_tokens:
+            order = box_order(page_boxes)
+        spans = plan_windows([counts[i] for i in order], max_tokens, overlap, max_windows)
+        truncated += spans[-1][1] < len(order)
+        for k, (start, end) in enumerate(spans):
+            # Overlapping words belong to the window whose edge is further away
+            first = start if k == 0 else (spans[k - 1][1] + start) // 2
+            last = end if k + 1 == len(spans) else (end + spans[k + 1][0]) // 2
+            window_words.append([page_words[i] for i in order[start:end]])
+            window_boxes.append([page_boxes[i] for i in order[start:end]])
+            window_pages.append(page)
+            owned.append((first - start, last - start, k == 0, k + 1 == len(spans)))
+
+    encoding = tokenizer(
+        window_words,
+        boxes=window_boxes,
+        return_tensors="pt",
+        padding=True,
+        truncation=True
+    )
+    # Each image is resized once and shared by the windows of its page
+    pixel_values = processor.image_processor(images, return_tensors="pt")["pixel_values"]
+
+    seq_len = encoding["input_ids"].size(1)
+    merged = [[] for _ in words]
+    for window, (page, (first, last, opens, closes)) in enumerate(zip(window_pages, owned)):
+        for pos, word in enumerate(encoding.word_ids(window)):
+            special = word is None and encoding["attention_mask"][window, pos]
+            if (word is not None and first <= word < last) or (special and (opens if pos == 0 else closes)):
+                merged[page].append(window * seq_len + pos)
+    window_index = torch.zeros(len(words), max(len(m) for m in merged), dtype=torch.long)
+    attention_mask = torch.zeros_like(window_index)
+    for page, positions in enumerate(merged):
+        window_index[page, :len(positions)] = torch.tensor(positions, dtype=torch.long)
+        attention_mask[page, :len(positions)] = 1
+
+    return {
+        "pixel_values": pixel_values[torch.tensor(window_pages)],
+        "input_ids": encoding["input_ids"],
+        "window_attention_mask": encoding["attention_mask"],
+        "bbox": encoding["bbox"],
+        "window_index": window_index,
+        "attention_mask": attention_mask,
+        "truncated": truncated
+    }
+
+def merge_windows(feats: torch.Tensor, window_index: torch.Tensor) -> torch.Tensor:
+    """Gather the window features of every page, shape (pages, merged_len, dim).
+
+    Args:
+        feats: Features of all windows, shape (windows, seq_len, dim)
+        window_index: ``window_index`` from ``encode_windows``
+    """
+    return feats.flatten(0, 1)[window_index]
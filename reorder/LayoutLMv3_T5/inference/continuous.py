@@ -0,0 +1,239 @@
+"""Continuous batching for the T5 reorder decoder.
+
+A static batch decodes until its longest page is done, so the slots of
+pages that finished early sit idle. ``ContinuousBatchDecoder`` keeps a
+fixed number of decode slots instead. Each slot owns its rows of a
+preallocated self-attention KV cache and of the cross-attention keys and
+values of its page. Every step decodes one token for all occupied slots,
+and a finished page frees its slot for the next page at once.
+
+The decoder step is written against the T5 modules (``q``/``k``/``v``/``o``,
+layer norms, feed-forward layers, relative attention bias) rather than
+``generate``, because every slot sits at its own position. Calling the
+modules keeps the dynamically quantized int8 model working too.
+"""
+
+from collections import deque
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn.functional as F
+
+def pad_tokens(rows: Sequence[Sequence[int]], pad_token_id: int) -> torch.Tensor:
+    """Stack token lists into a right-padded tensor, like ``generate`` output."""
+    out = torch.full((len(rows), max(len(row) for row in rows)), pad_token_id, dtype=torch.long)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = torch.tensor(row, dtype=torch.long)
+    return out
+
+class ContinuousBatchDecoder:
+    """Greedy T5 decoding over a fixed set of slots with per-slot KV caches.
+
+    Pages are ``admit``-ted into free slots with their encoder states and a
+    length limit; ``step`` decodes one token for every occupied slot and
+    returns the pages that finished. Outputs equal greedy ``generate`` per
+    page. Counters accumulate so callers can report slot occupancy.
+    """
+
+    def __init__(self, t5_model, num_slots: int = 8, max_length: int = 512):
+        """Initialize decoder.
+
+        Args:
+            t5_model: T5 model in eval mode (fp32 or dynamically quantized)
+            num_slots: Pages decoded concurrently
+            max_length: Longest output including the start token; sizes the
+                self-attention cache
+        """
+        self.t5_model = t5_model
+        self.decoder = t5_model.get_decoder()
+        self.config = t5_model.config
+        self.num_slots = num_slots
+        self.max_length = max_length
+        self.num_heads = self.config.num_heads
+        self.head_dim = self.config.d_kv
+        self.pages: List[Optional[Tuple[Any, List[int], int]]] = [None] * num_slots  # key, tokens, limit
+        self.positions = None
+        self._self_kv = None  # per layer: keys and values of shape (slots, heads, max_length, d_kv)
+        self._cross_kv = None  # per layer: keys and values of shape (slots, heads, source_len, d_kv)
+        self._cross_mask = None  # (slots, source_len), True for real source tokens
+        self.steps = 0  # decoder passes
+        self.slot_steps = 0  # tokens decoded over all slots
+        self.admitted = 0  # pages admitted
+
+    @property
+    def active(self) -> int:
+        """Number of occupied slots."""
+        return sum(page is not None for page in self.pages)
+
+    @property
+    def free_slots(self) -> int:
+        """Number of free slots."""
+        return self.num_slots - self.active
+
+    def encode(self, inputs_embeds: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Run the T5 encoder over a batch of projected pages."""
+        with torch.no_grad():
+            return self.t5_model.get_encoder()(
+                inputs_embeds=inputs_embeds,
+                attention_mask=attention_mask
+            ).last_hidden_state
+
+    def _split_heads(self, x: torch.Tensor) -> torch.Tensor:
+        return x.view(x.size(0), -1, self.num_heads, self.head_dim).transpose(1, 2)
+
+    def _allocate(self, like: torch.Tensor, source_len: int) -> None:
+        """Create the caches on first use and widen the cross cache to ``source_len``."""
+        if self._self_kv is None:
+            shape = (self.num_slots, self.num_heads, self.max_length, self.head_dim)
+            self._self_kv = [(like.new_zeros(shape), like.new_zeros(shape)) for _ in self.decoder.block]
+            self._cross_kv = [(like.new_zeros(shape[:2] + (0, self.head_dim)),) * 2 for _ in self.decoder.block]
+            self._cross_mask = torch.zeros(self.num_slots, 0, dtype=torch.bool, device=like.device)
+            self.positions = torch.zeros(self.num_slots, dtype=torch.long, device=like.device)
+        grow = source_len - self._cross_mask.size(1)
+        if grow > 0:
+            self._cross_kv = [tuple(F.pad(t, (0, 0, 0, grow)) for t in kv) for kv in self._cross_kv]
+            self._cross_mask = F.pad(self._cross_mask, (0, grow))
+
+    @torch.no_grad()
+    def admit(self, key: Any, encoder_hidden: torch.Tensor, attention_mask: torch.Tensor,
+              max_length: Optional[int] = None) -> None:
+        """Place one encoded page into a free slot.
+
+        Args:
+            key: Identifies the page in the output of ``step``
+            encoder_hidden: T5 encoder states of the page, shape (seq_len, d_model)
+            attention_mask: Encoder attention mask of the page, shape (seq_len,)
+            max_length: Longest output including the start token (defaults to
+                and is capped by the decoder's ``max_length``)
+        """
+        slot = self.pages.index(None)
+        length = int(attention_mask.sum())
+        hidden = encoder_hidden[:length].unsqueeze(0)
+        self._allocate(hidden, length)
+        for (keys, values), block in zip(self._cross_kv, self.decoder.block):
+            attention = block.layer[1].EncDecAttention
+            keys[slot, :, :length] = self._split_heads(attention.k(hidden))[0].to(keys.dtype)
+            values[slot, :, :length] = self._split_heads(attention.v(hidden))[0].to(values.dtype)
+        self._cross_mask[slot] = False
+        self._cross_mask[slot, :length] = True
+        self.positions[slot] = 0
+        limit = min(max_length or self.max_length, self.max_length)
+        self.pages[slot] = (key, [self.config.decoder_start_token_id], limit)
+        self.admitted += 1
+
+    def _attend(self, attention, hidden: torch.Tensor, keys: torch.Tensor, values: torch.Tensor,
+                bias: torch.Tensor) -> torch.Tensor:
+        query = self._split_heads(attention.q(hidden))
+        scores = torch.matmul(query, keys.transpose(2, 3).to(query.dtype)) + bias
+        weights = torch.softmax(scores.float(), dim=-1).to(query.dtype)
+        out = torch.matmul(weights, values.to(query.dtype)).transpose(1, 2).reshape(hidden.size(0), 1, -1)
+        return attention.o(out)
+
+    @torch.no_grad()
+    def step(self) -> List[Tuple[Any, List[int]]]:
+        """Decode one token for every occupied slot.
+
+        Returns:
+            ``(key, tokens)`` of the pages that finished in this step; tokens
+            start with the decoder start token and end with EOS unless the
+            page reached its length limit
+        """
+        occupied = [slot for slot, page in enumerate(self.pages) if page is not None]
+        if not occupied:
+            return []
+        device = self.positions.device
+        rows = torch.tensor(occupied, device=device)
+        # Full slices avoid copying the caches while every slot is busy
+        index = slice(None) if len(occupied) == self.num_slots else rows
+        positions = self.positions[rows]
+        span = int(positions.max()) + 1
+        last_tokens = torch.tensor([self.pages[slot][1][-1] for slot in occupied], device=device)
+        hidden = self.decoder.embed_tokens(last_tokens).unsqueeze(1)
+
+        # Relative position bias of each slot's position against its own history
+        first = self.decoder.block[0].layer[0].SelfAttention
+        relative = torch.arange(span, device=device)[None, :] - positions[:, None]
+        buckets = first._relative_position_bucket(
+            relative,
+            bidirectional=False,
+            num_buckets=first.relative_attention_num_buckets,
+            max_distance=first.relative_attention_max_distance
+        )
+        self_bias = first.relative_attention_bias(buckets).permute(0, 2, 1).unsqueeze(2).to(hidden.dtype)
+        self_bias = self_bias.masked_fill((relative > 0)[:, None, None, :], torch.finfo(hidden.dtype).min)
+        cross_mask = self._cross_mask[index]
+        cross_bias = torch.zeros(cross_mask.shape, dtype=hidden.dtype, device=device)
+        cross_bias = cross_bias.masked_fill(~cross_mask, torch.finfo(hidden.dtype).min)[:, None, None, :]
+
+        for block, (self_keys, self_values), (cross_keys, cross_values) in zip(
+                self.decoder.block, self._self_kv, self._cross_kv):
+            layer = block.layer[0]
+            normed = layer.layer_norm(hidden)
+            attention = layer.SelfAttention
+            self_keys[rows, :, positions] = self._split_heads(attention.k(normed))[:, :, 0].to(self_keys.dtype)
+            self_values[rows, :, positions] = self._split_heads(attention.v(normed))[:, :, 0].to(self_values.dtype)
+            hidden = hidden + self._attend(attention, normed, self_keys[index, :, :span],
+                                           self_values[index, :, :span], self_bias)
+            layer = block.layer[1]
+            hidden = hidden + self._attend(layer.EncDecAttention, layer.layer_norm(hidden),
+                                           cross_keys[index], cross_values[index], cross_bias)
+            hidden = block.layer[2](hidden)
+
+        hidden = self.decoder.final_layer_norm(hidden)
+        if getattr(self.config, "scale_decoder_outputs", self.config.tie_word_embeddings):
+            hidden = hidden * self.config.d_model ** -0.5
+        next_tokens = self.t5_model.lm_head(hidden)[:, 0].argmax(-1).tolist()
+        self.positions[rows] += 1
+        self.steps += 1
+        self.slot_steps += len(occupied)
+
+        finished = []
+        for slot, token in zip(occupied, next_tokens):
+            key, tokens, limit = self.pages[slot]
+            tokens.append(token)
+            if token == self.config.eos_token_id or len(tokens) >= limit:
+                finished.append((key, tokens))
+                self.pages[slot] = None
+        return finished
+
+    def reset(self) -> List[Any]:
+        """Drop every page in flight and return their keys."""
+        keys = [page[0] for page in self.pages if page is not None]
+        self.pages = [None] * self.num_slots
+        return keys
+
+def decode_stream(decoder: ContinuousBatchDecoder,
+                  batches: Iterable[Tuple[Sequence[Any], torch.Tensor, torch.Tensor, Sequence[int]]]
+                  ) -> Iterator[List[Tuple[Any, List[int]]]]:
+    """Decode a stream of batches, refilling free slots between steps.
+
+    A new batch is encoded only when the pages waiting for a slot cannot
+    fill the free ones, so at most one batch of encoder states waits.
+
+    Args:
+        decoder: Continuous batch decoder
+        batches: ``(keys, inputs_embeds, attention_mask, max_lengths)`` per
+            batch, with projected encoder inputs
+
+    Yields:
+        ``(key, tokens)`` lists of the pages finished by each step
+    """
+    source = iter(batches)
+    waiting = deque()
+    exhausted = False
+    while True:
+        while not exhausted and len(waiting) < decoder.free_slots:
+            try:
+                keys, inputs_embeds, attention_mask, max_lengths = next(source)
+            except StopIteration:
+                exhausted = True
+                break
+            hidden = decoder.encode(inputs_embeds, attention_mask)
+            waiting.extend(zip(keys, hidden, attention_mask, max_lengths))
+        while waiting and decoder.free_slots:
+            decoder.admit(*waiting.popleft())
+        if not decoder.active:
+            return
+        finished = decoder.step()
+        if finished:
+            yield finished
@@ -0,0 +1,207 @@
+"""TorchScript export of the LayoutLMv3 encoder and projection per length bucket."""
+
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+EXPORT_MANIFEST = "export.json"
+DEFAULT_BUCKETS = (64, 128, 256, 512)
+
+class EncoderProjection(nn.Module):
+    """LayoutLMv3 encoder followed by the projection into T5 embedding space.
+
+    Returns only the projected text positions, i.e. the ``inputs_embeds`` the
+    T5 model consumes.
+    """
+
+    def __init__(self, layout_model: nn.Module, projection: nn.Module):
+        """Initialize module.
+
+        Args:
+            layout_model: LayoutLMv3 encoder
+            projection: LayoutLMv3 to T5 projection
+        """
+        super().__init__()
+        self.layout_model = layout_model
+        self.projection = projection
+
+    def forward(self, input_ids: torch.Tensor, bbox: torch.Tensor, attention_mask: torch.Tensor,
+                pixel_values: torch.Tensor) -> torch.Tensor:
+        hidden = self.layout_model(
+            input_ids=input_ids,
+            bbox=bbox,
+            attention_mask=attention_mask,
+            pixel_values=pixel_values
+        ).last_hidden_state
+        return self.projection(hidden[:, :input_ids.size(1), :])
+
+def example_inputs(layout_model: nn.Module, batch_size: int, seq_len: int,
+                   device: torch.device, seed: int = 0) -> Dict[str, torch.Tensor]:
+    """Random encoder inputs of a given shape, shaped like processor output.
+
+    Args:
+        layout_model: LayoutLMv3 encoder (for vocabulary and image size)
+        batch_size: Number of pages
+        seq_len: Number of text tokens per page
+        device: Device of the returned tensors
+        seed: Seed of the generator
+
+    Returns:
+        Dictionary with input_ids, bbox, attention_mask and pixel_values
+    """
+    config = layout_model.config
+    gen = torch.Generator().manual_seed(seed)
+    # Vary the real length per page so padding is part of the traced inputs
+    lengths = torch.randint(max(1, seq_len // 2), seq_len + 1, (batch_size,), generator=gen)
+    lengths[0] = seq_len
+    attention_mask = (torch.arange(seq_len) < lengths[:, None]).long()
+    input_ids = torch.randint(3, config.vocab_size, (batch_size, seq_len), generator=gen)
+    input_ids = input_ids.masked_fill(attention_mask == 0, config.pad_token_id)
+    corners = torch.randint(0, 1000, (batch_size, seq_len, 2, 2), generator=gen).sort(dim=2).values
+    bbox = corners.transpose(2, 3).reshape(batch_size, seq_len, 4) * attention_mask[..., None]
+    pixel_values = torch.randn(batch_size, config.num_channels, config.input_size, config.input_size,
+                               generator=gen)
+    inputs = {"input_ids": input_ids, "bbox": bbox, "attention_mask": attention_mask,
+              "pixel_values": pixel_values}
+    return {k: v.to(device) for k, v in inputs.items()}
+
+def export_encoder(layout_model: nn.Module, projection: nn.Module, export_dir: str,
+                   buckets: Sequence[int] = DEFAULT_BUCKETS, batch_size: int = 8,
+                   device: Optional[torch.device] = None) -> None:
+    """Trace the encoder and projection once per bucket and save the graphs.
+
+    Each bucket is traced at a fixed sequence length and frozen, so shape
+    arithmetic and Python control flow are resolved at export time. Batch
+    size stays free. ``export.json`` records the buckets and graph files.
+
+    Args:
+        layout_model: Trained LayoutLMv3 encoder
+        projection: Trained projection
+        export_dir: Output directory
+        buckets: Padded sequence lengths to export
+        batch_size: Batch size of the tracing inputs
+        device: Device the graphs are traced on (and run on later)
+    """
+    device = device or torch.device("cpu")
+    os.makedirs(export_dir, exist_ok=True)
+    module = EncoderProjection(layout_model, projection).to(device).eval()
+    files = {}
+    with torch.no_grad():
+        for bucket in sorted(buckets):
+            inputs = example_inputs(layout_model, batch_size, bucket, device)
+            traced = torch.jit.trace(module, tuple(inputs.values()), check_trace=False)
+            traced = torch.jit.freeze(traced)
+            files[str(bucket)] = f"encoder_{bucket}.pt"
+            torch.jit.save(traced, os.path.join(export_dir, files[str(bucket)]))
+            print(f"Exported bucket {bucket} to {files[str(bucket)]}")
+
+    with open(os.path.join(export_dir, EXPORT_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({
+            "format": "torchscript",
+            "device": device.type,
+            "pad_token_id": layout_model.config.pad_token_id,
+            "buckets": files,
+        }, f, indent=2)
+
+class ExportedEncoder:
+    """Runs exported encoder+projection graphs, padding inputs to a bucket.
+
+    Batches are padded to the smallest exported length that fits them. Padded
+    positions are masked out, so the outputs for real tokens match eager mode.
+    """
+
+    def __init__(self, export_dir: str, device: Optional[torch.device] = None):
+        """Load every exported bucket.
+
+        Args:
+            export_dir: Directory written by ``export_encoder``
+            device: Device to run on (defaults to the export device)
+        """
+        with open(os.path.join(export_dir, EXPORT_MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.device = device or torch.device(manifest["device"])
+        self.pad_token_id = manifest["pad_token_id"]
+        self.graphs = {
+            int(bucket): torch.jit.load(os.path.join(export_dir, filename), map_location=self.device)
+            for bucket, filename in manifest["buckets"].items()
+        }
+        self.buckets = sorted(self.graphs)
+
+    def bucket_for(self, seq_len: int) -> int:
+        """Return the smallest exported length holding ``seq_len`` tokens."""
+        for bucket in self.buckets:
+            if seq_len <= bucket:
+                return bucket
+        raise ValueError(f"Sequence length {seq_len} exceeds the largest exported bucket {self.buckets[-1]}")
+
+    def __call__(self, input_ids: torch.Tensor, bbox: torch.Tensor, attention_mask: torch.Tensor,
+                 pixel_values: torch.Tensor) -> torch.Tensor:
+        """Return projected text features of shape (batch, seq_len, d_model)."""
+        seq_len = input_ids.size(1)
+        pad = self.bucket_for(seq_len) - seq_len
+        if pad:
+            input_ids = F.pad(input_ids, (0, pad), value=self.pad_token_id)
+            bbox = F.pad(bbox, (0, 0, 0, pad))
+            attention_mask = F.pad(attention_mask, (0, pad))
+        with torch.no_grad():
+            out = self.graphs[seq_len + pad](input_ids, bbox, attention_mask, pixel_values)
+        return out[:, :seq_len]
+
+def verify_export(exported: ExportedEncoder, layout_model: nn.Module, projection: nn.Module,
+                  batch_sizes: Sequence[int] = (1, 3), atol: float = 1e-4) -> Dict[int, float]:
+    """Compare exported graphs with eager mode on unpadded inputs.
+
+    Every bucket is checked at its full length and at a length just above the
+    previous bucket, which exercises the padding path.
+
+    Args:
+        exported: Loaded exported encoder
+        layout_model: Eager LayoutLMv3 encoder
+        projection: Eager projection
+        batch_sizes: Batch sizes to check (differing from the tracing batch)
+        atol: Largest accepted absolute difference
+
+    Returns:
+        Largest absolute difference per bucket
+
+    Raises:
+        ValueError: If a difference exceeds ``atol``
+    """
+    module = EncoderProjection(layout_model, projection).to(exported.device).eval()
+    diffs = {}
+    previous = 0
+    with torch.no_grad():
+        for bucket in exported.buckets:
+            diff = 0.0
+            for seq_len in sorted({previous + 1, bucket}):
+                for batch_size in batch_sizes:
+                    inputs = example_inputs(layout_model, batch_size, seq_len, exported.device, seed=seq_len)
+                    mask = inputs["attention_mask"][..., None]
+                    eager = module(**inputs) * mask
+                    graph = exported(**inputs) * mask
+                    diff = max(diff, (eager - graph).abs().max().item())
+            diffs[bucket] = diff
+            previous = bucket
+    bad = {bucket: diff for bucket, diff in diffs.items() if diff > atol}
+    if bad:
+        raise ValueError(f"Exported encoder differs from eager mode: {bad}")
+    return diffs
+
+def start_execution():
+    """Export the encoder and projection of the configured checkpoint."""
+    from .inference import InferenceConfig, load_models
+
+    config = InferenceConfig()
+    if not config.exported_encoder_dir:
+        raise ValueError("Set InferenceConfig.exported_encoder_dir to export the encoder")
+    device = torch.device("cpu")
+    layout_model, projection, _ = load_models(config, device)
+    export_encoder(layout_model, projection, config.exported_encoder_dir,
+                   config.export_buckets, config.batch_size, device)
+    diffs = verify_export(ExportedEncoder(config.exported_encoder_dir), layout_model, projection)
+    for bucket, diff in diffs.items():
+        print(f"Bucket {bucket}: max abs diff vs eager {diff:.2e}")
@@ -1,21 +1,37 @@
 """Inference script for LayoutLMv3 + T5 model."""
 
-import os
 import json
+import os
+import queue
+import threading
+import time
 import torch
-from typing import Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from PIL import Image
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, SequentialSampler, Subset
 from transformers import (
     AutoProcessor,
     LayoutLMv3Model,
     T5ForConditionalGeneration,
     AutoTokenizer
 )
-from torch.nn import LayerNorm, GELU
 from dataclasses import dataclass
 
+from common.result_sink import JsonlResultSink, default_results_path
 from ..fine_tune import *
+from ..fine_tune.data.ndjson_index import NdjsonIndex, load_record_lengths
+from ..fine_tune.data.pipeline import ChunkPrefetcher, QueueWaitTimer, build_loader
+from ..fine_tune.data.bucketing import TokenBudgetBatchSampler
+from ..fine_tune.config import TrainConfig
+from ..fine_tune.projection import build_projection
+from ..fine_tune.pointer import PointerHead, gather_words, pointer_texts, word_positions
+from ..fine_tune.windowing import encode_windows, merge_windows
+from .continuous import ContinuousBatchDecoder, decode_stream, pad_tokens
+from .export import DEFAULT_BUCKETS, EncoderProjection, ExportedEncoder
+from .length_budget import LENGTH_BUDGET_FILE, BudgetedGreedyDecoder, load_or_calibrate
+from .quantization import load_quantized_checkpoint, quantize_dynamic_int8, save_quantized_checkpoint
+from .speculative import CopySpeculativeDecoder
+from .weights import MODEL_NAMES, load_inference_weights
 
 @dataclass
 class InferenceConfig:
@@ -26,8 +42,38 @@ class InferenceConfig:
     checkpoint_dir: str = "/home/vault/iwfa/iwfa110h/LAYOUT_LMV3_T5_SMALL"
     epoch: int = 30
     batch_size: int = 8
-    chunk_size: int = 1000
     max_output_length: int = 512
+    num_workers: int = 4
+    prefetch_factor: int = 2  # batches buffered per worker
+    pin_memory: bool = True
+    max_tokens: int = 0  # padded tokens per batch; 0 keeps fixed batch_size batches
+    max_batch_size: int = 64  # cap on samples per token-budget batch
+    bucket_pool_size: int = 1000  # pages sorted by length together
+    queue_depth: int = 4  # batches buffered between pipeline stages
+    backend: str = "fp32"  # "fp32" (GPU when available) or "int8" (dynamic quantization, CPU)
+    quantized_checkpoint: str = ""  # int8 checkpoint to load, or to write after quantizing
+    weights_file: str = ""  # inference-only safetensors export to load instead of the training checkpoint
+    weights_fp16: bool = False  # store exported weights in fp16 (half the file size)
+    cpu_threads: int = 0  # torch intra-op threads on CPU; 0 keeps the default
+    max_pages: int = 0  # only run the first max_pages pages; 0 runs all
+    exported_encoder_dir: str = ""  # TorchScript encoder+projection graphs; empty runs eager
+    export_buckets: Tuple[int, ...] = DEFAULT_BUCKETS  # padded lengths exported per graph
+    resume: bool = True  # skip pages already in the partial results of an interrupted run
+    fsync_every: int = 100  # pages appended between fsyncs of the partial results
+    head: str = "t5"  # decoder the checkpoint was trained with: "t5" or "pointer"
+    speculative: bool = False  # T5 drafts copied from the source words; same output as greedy
+    draft_tokens: int = 10  # longest copy draft verified per decoder pass
+    draft_ngram: int = 3  # longest generated suffix matched against the source
+    length_budget: bool = False  # per-page T5 length caps from the source token count
+    length_budget_path: str = ""  # calibrated budget JSON; empty uses checkpoint_dir/length_budget.json
+    train_json: str = TrainConfig.train_json  # labelled NDJSON the budget is calibrated on
+    budget_quantile: float = 0.999  # output/source length ratio quantile the caps cover
+    budget_margin: int = 8  # tokens added to every cap
+    continuous_batching: bool = False  # refill T5 decode slots as pages finish instead of per batch
+    decode_slots: int = 8  # pages decoded concurrently with continuous batching
+    sliding_window: bool = TrainConfig.sliding_window  # overlapping windows instead of truncating long pages
+    window_overlap: int = TrainConfig.window_overlap  # tokens shared by consecutive windows
+    max_windows: int = TrainConfig.max_windows  # windows per page
 
 class OcrInferenceDataset(Dataset):
     """Dataset for inference."""
@@ -50,7 +96,8 @@ class OcrInferenceDataset(Dataset):
             "image": image,
             "words": words,
             "boxes": boxes,
-            "img_name": img_name
+            "img_name": img_name,
+            "index": idx
         }
 
 @dataclass
@@ -58,125 +105,458 @@ class InferenceCollator:
     """Collator for inference batches."""
     
     processor: object
+    pointer: bool = False  # add the first-token position of every word
+    source_tokenizer: object = None  # T5 tokenizer; adds source_ids for copy drafts
+    sliding_window: bool = False  # overlapping windows instead of truncating pages over 512 tokens
+    window_overlap: int = 128  # tokens shared by consecutive windows
+    max_windows: int = 4  # windows per page
     
     def __call__(self, features: list) -> dict:
         images = [f["image"] for f in features]
         words = [f["words"] for f in features]
         boxes = [f["boxes"] for f in features]
         img_names = [f["img_name"] for f in features]
+        indices = [f["index"] for f in features]
 
-        encoding = self.processor(
-            images,
-            words,
-            boxes=boxes,
-            return_tensors="pt",
-            padding=True,
-            truncation=True
-        )
+        if self.sliding_window:
+            batch = encode_windows(self.processor, images, words, boxes, overlap=self.window_overlap,
+                                   max_windows=self.max_windows)
+        else:
+            encoding = self.processor(
+                images,
+                words,
+                boxes=boxes,
+                return_tensors="pt",
+                padding=True,
+                truncation=True
+            )
 
-        return {
-            "pixel_values": encoding["pixel_values"],
-            "input_ids": encoding["input_ids"],
-            "attention_mask": encoding["attention_mask"],
-            "bbox": encoding["bbox"],
-            "img_names": img_names
-        }
+            batch = {
+                "pixel_values": encoding["pixel_values"],
+                "input_ids": encoding["input_ids"],
+                "attention_mask": encoding["attention_mask"],
+                "bbox": encoding["bbox"]
+            }
+        batch.update(img_names=img_names, indices=indices, words=words)
+        if self.pointer:
+            batch["word_index"], batch["word_mask"] = word_positions(encoding, len(features))
+        if self.source_tokenizer is not None:
+            batch["source_ids"] = self.source_tokenizer(
+                [" ".join(w) for w in words],
+                add_special_tokens=False
+            ).input_ids
+        return batch
+
+class ResultWriter:
+    """Decodes model outputs and appends predictions in a background thread.
+
+    Each page is appended to a ``JsonlResultSink`` as soon as it is decoded,
+    in whatever order bucketed batches arrive; the dataset index is stored
+    with it so the final JSON can be written in input order. The queue in
+    front of the thread is bounded, so a slow disk eventually throttles
+    generation instead of buffering without limit.
+    """
+
+    _DONE = object()
+
+    def __init__(self, sink: JsonlResultSink, decode: Callable[[torch.Tensor, List[List[str]]], List[str]],
+                 depth: int = 4):
+        """Start the writer thread.
+
+        Args:
+            sink: Results file the predictions are appended to
+            decode: Turns model outputs and source words into texts
+                (``ReorderSession.decode``)
+            depth: Maximum number of batches waiting to be written
+        """
+        self.sink = sink
+        self.decode = decode
+        self.pages = 0
+        self.put_wait = 0.0
+        self._error = None
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, indices: List[int], img_names: List[str], outputs: torch.Tensor,
+            words: List[List[str]]) -> None:
+        """Queue one batch of model outputs (on CPU) for decoding and writing."""
+        start = time.perf_counter()
+        self._queue.put((indices, img_names, outputs, words))
+        self.put_wait += time.perf_counter() - start
+
+    def close(self) -> int:
+        """Finish writing and return the number of pages written."""
+        self._queue.put(self._DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.pages
+
+    def _run(self) -> None:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._DONE:
+                    break
+                indices, img_names, outputs, words = item
+                texts = self.decode(outputs, words)
+                for idx, img_name, txt in zip(indices, img_names, texts):
+                    self.sink.write(img_name, txt, index=idx)
+                self.pages += len(indices)
+        except BaseException as e:  # re-raised by close()
+            self._error = e
+            # Keep draining so the model stage never blocks on a dead writer
+            while self._queue.get() is not self._DONE:
+                pass
+
+def load_models(config: InferenceConfig, device: torch.device):
+    """Load the trained encoder, projection and T5 model for a backend.
+
+    With ``backend="int8"`` a saved quantized checkpoint is loaded directly;
+    without one the fp32 weights are quantized (and saved when
+    ``quantized_checkpoint`` is set). The fp32 weights come from
+    ``weights_file`` when set, otherwise from the training checkpoint.
+
+    Args:
+        config: Inference configuration
+        device: Device for the fp32 backend
+
+    Returns:
+        Tuple of (layout_model, projection, t5_model) in eval mode
+    """
+    if config.backend == "int8" and config.quantized_checkpoint and os.path.exists(config.quantized_checkpoint):
+        print(f"Loading int8 checkpoint {config.quantized_checkpoint}")
+        return load_quantized_checkpoint(config.quantized_checkpoint)
+
+    if config.weights_file:
+        # Built from the stored configs around the memory-mapped weights
+        models = load_inference_weights(config.weights_file, MODEL_NAMES,
+                                        device=device if config.backend == "fp32" else None)
+        layout_model, projection, t5_model = (models[name] for name in MODEL_NAMES)
+    else:
+        model_config = ModelConfig()
+        model_ckpt = os.path.join(config.checkpoint_dir, f"model_epoch_{config.epoch}.pth")
+
+        # Initialize models
+        layout_model = LayoutLMv3Model.from_pretrained(model_config.layoutlm_model_name)
+        t5_model = T5ForConditionalGeneration.from_pretrained(model_config.t5_model_name)
+        projection = build_projection(t5_model)
+
+        # Load checkpoint
+        ckpt = torch.load(model_ckpt, map_location="cpu")
+        layout_model.load_state_dict(ckpt['layout_model'])
+        t5_model.load_state_dict(ckpt['t5_model'])
+        projection.load_state_dict(ckpt['projection'])
+        del ckpt
+
+    if config.backend == "int8":
+        quantize_dynamic_int8(layout_model, projection, t5_model)
+        if config.quantized_checkpoint:
+            save_quantized_checkpoint(config.quantized_checkpoint, layout_model, projection, t5_model)
+            print(f"Saved int8 checkpoint {config.quantized_checkpoint}")
+        return layout_model, projection, t5_model
 
-def run_inference(config: InferenceConfig, device: Optional[torch.device] = None):
-    """Run inference with given configuration."""
-    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model_config = ModelConfig()
-    
-    # Paths
-    model_ckpt = os.path.join(config.checkpoint_dir, f"model_epoch_{config.epoch}.pth")
-    proc_ckpt = os.path.join(config.checkpoint_dir, f"processor_epoch_{config.epoch}")
-    
-    # Load processor and tokenizer
-    processor = AutoProcessor.from_pretrained(proc_ckpt, apply_ocr=False)
-    t5_tokenizer = AutoTokenizer.from_pretrained(model_config.t5_model_name)
-    
-    # Initialize models
-    layout_model = LayoutLMv3Model.from_pretrained(model_config.layoutlm_model_name)
-    t5_model = T5ForConditionalGeneration.from_pretrained(model_config.t5_model_name)
-    
-    # Build projection
-    projection = torch.nn.Sequential(
-        torch.nn.Linear(768, t5_model.config.d_model),
-        LayerNorm(t5_model.config.d_model),
-        GELU()
-    )
-    
-    # Load checkpoint
-    ckpt = torch.load(model_ckpt, map_location="cpu")
-    layout_model.load_state_dict(ckpt['layout_model'])
-    t5_model.load_state_dict(ckpt['t5_model'])
-    projection.load_state_dict(ckpt['projection'])
-    
     # Move to device and set eval mode
     layout_model.to(device).eval()
     t5_model.to(device).eval()
     projection.to(device).eval()
-    
-    # Prepare output
-    writer = open(config.output_json, "w", encoding="utf-8")
-    writer.write("{\n")
-    first_entry = True
-    
-    # Process data
-    for chunk in iter_ndjson_in_chunks(config.test_json, chunk_size=config.chunk_size):
-        ds = OcrInferenceDataset(chunk, config.test_img_dir)
-        loader = DataLoader(
-            ds,
-            batch_size=config.batch_size,
-            shuffle=False,
-            collate_fn=InferenceCollator(processor)
+    return layout_model, projection, t5_model
+
+def load_pointer_head(config: InferenceConfig, d_model: int, device: torch.device) -> PointerHead:
+    """Load the trained pointer head of the configured epoch in eval mode.
+
+    The head is small and stays fp32 with every backend.
+
+    Args:
+        config: Inference configuration
+        d_model: Size of the projected features
+        device: Device to run on
+    """
+    if config.weights_file:
+        return load_inference_weights(config.weights_file, ("pointer_head",), device=device)["pointer_head"]
+    model_ckpt = os.path.join(config.checkpoint_dir, f"model_epoch_{config.epoch}.pth")
+    pointer_head = PointerHead(d_model)
+    # Memory-mapped, so only the head's tensors are read from the checkpoint
+    pointer_head.load_state_dict(torch.load(model_ckpt, map_location="cpu", mmap=True)['pointer_head'])
+    return pointer_head.to(device).eval()
+
+class ReorderSession:
+    """Loaded processor, tokenizer and models, ready to reorder batches.
+
+    Shared by the batch job and the inference server so both load and run
+    the model the same way.
+    """
+
+    def __init__(self, config: InferenceConfig, device: Optional[torch.device] = None):
+        """Load everything needed for inference.
+
+        Args:
+            config: Inference configuration
+            device: Device for the fp32 backend (int8 always runs on CPU)
+        """
+        # Exported graphs run on the device they were traced on
+        exported = ExportedEncoder(config.exported_encoder_dir) if config.exported_encoder_dir else None
+        if exported is not None:
+            device = exported.device
+        if config.backend == "int8":
+            device = torch.device("cpu")
+        device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if device.type == "cpu" and config.cpu_threads:
+            torch.set_num_threads(config.cpu_threads)
+        model_config = ModelConfig()
+
+        # Load processor and tokenizer
+        proc_ckpt = os.path.join(config.checkpoint_dir, f"processor_epoch_{config.epoch}")
+        self.processor = AutoProcessor.from_pretrained(proc_ckpt, apply_ocr=False)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_config.t5_model_name)
+        layout_model, projection, self.t5_model = load_models(config, device)
+        self.encode = exported if exported is not None else EncoderProjection(layout_model, projection)
+        self.pointer_head = None
+        if config.head == "pointer":
+            if config.sliding_window:
+                raise ValueError("sliding_window cannot be combined with head='pointer'")
+            self.pointer_head = load_pointer_head(config, self.t5_model.config.d_model, device)
+            self.t5_model = None
+        self.speculative = None
+        if config.speculative and self.t5_model is not None:
+            self.speculative = CopySpeculativeDecoder(self.t5_model, config.draft_tokens, config.draft_ngram)
+        self.budget = self.budget_decoder = None
+        if config.length_budget and self.t5_model is not None:
+            self.budget = load_or_calibrate(
+                config.length_budget_path or os.path.join(config.checkpoint_dir, LENGTH_BUDGET_FILE),
+                config.train_json,
+                self.tokenizer,
+                quantile=config.budget_quantile,
+                margin=config.budget_margin
+            )
+            self.budget_decoder = BudgetedGreedyDecoder(self.t5_model)
+        self.continuous = None
+        if config.continuous_batching and self.t5_model is not None:
+            if self.speculative is not None:
+                raise ValueError("continuous_batching cannot be combined with speculative decoding")
+            self.continuous = ContinuousBatchDecoder(self.t5_model, config.decode_slots, config.max_output_length)
+        self.device = device
+        self.max_output_length = config.max_output_length
+        self.sliding_window = config.sliding_window
+        self.window_overlap = config.window_overlap
+        self.max_windows = config.max_windows
+        self.truncated_pages = 0  # pages encoded so far whose words did not all fit into max_windows
+
+    def collator(self) -> InferenceCollator:
+        """Return a collator producing the inputs this session's head needs."""
+        return InferenceCollator(
+            self.processor,
+            pointer=self.pointer_head is not None,
+            source_tokenizer=self.tokenizer if self.speculative is not None or self.budget is not None else None,
+            sliding_window=self.sliding_window,
+            window_overlap=self.window_overlap,
+            max_windows=self.max_windows
         )
 
-        for batch in loader:
-            pv = batch["pixel_values"].to(device)
-            mask = batch["attention_mask"].to(device)
-            bbox = batch["bbox"].to(device)
-            img_names = batch["img_names"]
-            input_ids = batch["input_ids"].to(device)
-
-            with torch.no_grad(), torch.cuda.amp.autocast():
-                lm_out = layout_model(
-                    pixel_values=pv,
-                    input_ids=input_ids,
-                    attention_mask=mask,
-                    bbox=bbox
-                )
-                seq_len = input_ids.size(1)
-                text_feats = lm_out.last_hidden_state[:, :seq_len, :]
-                proj_feats = projection(text_feats)
-
-                gen_ids = t5_model.generate(
-                    inputs_embeds=proj_feats,
-                    attention_mask=mask,
-                    max_length=config.max_output_length
-                )
-
-            texts = t5_tokenizer.batch_decode(gen_ids, skip_special_tokens=True)
-            
-            # Write results
-            for img_name, txt in zip(img_names, texts):
-                if not first_entry:
-                    writer.write(",\n")
-                first_entry = False
-                writer.write(f"{json.dumps(img_name)}: {json.dumps(txt, ensure_ascii=False)}")
-
-            writer.flush()
-            
-            # Clean up
-            del pv, mask, bbox, lm_out, text_feats, proj_feats, gen_ids, input_ids
-            torch.cuda.empty_cache()
-
-        del ds, loader
-        torch.cuda.empty_cache()
-
-    writer.write("\n}")
-    writer.close()
-    print(f"Inference complete — results written to {config.output_json}")
+    def encode_batch(self, batch: dict, non_blocking: bool = False) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Move a collated batch to the device and project it for T5.
+
+        Call under ``torch.no_grad()`` (and autocast on GPU).
+
+        Returns:
+            Tuple of (projected features, attention mask) on the device
+        """
+        pv = batch["pixel_values"].to(self.device, non_blocking=non_blocking)
+        mask = batch["attention_mask"].to(self.device, non_blocking=non_blocking)
+        bbox = batch["bbox"].to(self.device, non_blocking=non_blocking)
+        input_ids = batch["input_ids"].to(self.device, non_blocking=non_blocking)
+        window_mask = batch.get("window_attention_mask", batch["attention_mask"])
+        self.truncated_pages += batch.get("truncated", 0)
+        proj_feats = self.encode(
+            input_ids=input_ids,
+            bbox=bbox,
+            attention_mask=window_mask.to(self.device, non_blocking=non_blocking),
+            pixel_values=pv
+        )
+        if "window_index" in batch:
+            proj_feats = merge_windows(proj_feats, batch["window_index"].to(self.device, non_blocking=non_blocking))
+        return proj_feats, mask
+
+    def max_lengths(self, batch: dict) -> List[int]:
+        """Generation ``max_length`` per page: the length budget, or the flat limit."""
+        if self.budget is None:
+            return [self.max_output_length] * len(batch["indices"])
+        return [self.budget.max_length(len(ids), self.max_output_length) for ids in batch["source_ids"]]
+
+    def generate(self, batch: dict, non_blocking: bool = False) -> torch.Tensor:
+        """Generate T5 token ids, or pointer word orders, for a collated batch.
+
+        Args:
+            batch: Output of ``InferenceCollator``
+            non_blocking: Whether host-to-device copies may be asynchronous
+                (pinned batches only)
+
+        Returns:
+            Generated ids, or word indices in reading order, on CPU
+        """
+        with torch.no_grad(), torch.cuda.amp.autocast(enabled=self.device.type == "cuda"):
+            proj_feats, mask = self.encode_batch(batch, non_blocking)
+
+            if self.pointer_head is not None:
+                word_mask = batch["word_mask"].to(self.device, non_blocking=non_blocking)
+                word_index = batch["word_index"].to(self.device, non_blocking=non_blocking)
+                return self.pointer_head.decode(gather_words(proj_feats, word_index), word_mask).cpu()
+            max_length = self.max_lengths(batch)
+            if self.speculative is not None:
+                return self.speculative.generate(proj_feats, mask, batch["source_ids"], max_length)
+            if self.budget_decoder is not None:
+                return self.budget_decoder.generate(proj_feats, mask, max_length, self.max_output_length)
+            gen_ids = self.t5_model.generate(
+                inputs_embeds=proj_feats,
+                attention_mask=mask,
+                max_length=self.max_output_length
+            )
+        return gen_ids.cpu()
+
+    def generate_stream(self, batches: Iterable[dict],
+                        non_blocking: bool = False) -> Iterator[Tuple[List[Tuple[int, str, List[str]]], torch.Tensor]]:
+        """Generate T5 token ids for a stream of batches with continuous batching.
+
+        Pages leave in the order they finish, not in batch order.
+
+        Args:
+            batches: Outputs of ``InferenceCollator``
+            non_blocking: Whether host-to-device copies may be asynchronous
+                (pinned batches only)
+
+        Yields:
+            Tuple of (pages, gen_ids): the ``(index, img_name, words)`` of the
+            pages finished by one decoder step and their ids on CPU, padded
+            like ``generate`` output
+        """
+        def encoded():
+            for batch in batches:
+                proj_feats, mask = self.encode_batch(batch, non_blocking)
+                pages = zip(batch["indices"], batch["img_names"], batch["words"])
+                yield list(pages), proj_feats, mask, self.max_lengths(batch)
+
+        with torch.no_grad(), torch.cuda.amp.autocast(enabled=self.device.type == "cuda"):
+            for finished in decode_stream(self.continuous, encoded()):
+                pages = [page for page, _ in finished]
+                yield pages, pad_tokens([tokens for _, tokens in finished], self.t5_model.config.pad_token_id)
+
+    def decode(self, outputs: torch.Tensor, words: List[List[str]]) -> List[str]:
+        """Turn the output of ``generate`` into one text per page.
+
+        Args:
+            outputs: Generated ids or pointer word orders, on CPU
+            words: Source words per page
+
+        Returns:
+            Reordered texts
+        """
+        if self.pointer_head is not None:
+            return pointer_texts(outputs, words)
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+def results_run_key(config: InferenceConfig) -> str:
+    """Settings that decide the results; partial results of other settings are not resumed."""
+    return json.dumps({
+        "test_json": config.test_json,
+        "checkpoint": os.path.join(config.checkpoint_dir, f"model_epoch_{config.epoch}.pth"),
+        "weights_file": config.weights_file,
+        "backend": config.backend,
+        "quantized_checkpoint": config.quantized_checkpoint,
+        "head": config.head,
+        "max_output_length": config.max_output_length,
+        "length_budget": [config.length_budget, config.budget_quantile, config.budget_margin],
+        "sliding_window": [config.sliding_window, config.window_overlap, config.max_windows],
+    }, sort_keys=True)
+
+def run_inference(config: InferenceConfig, device: Optional[torch.device] = None) -> Dict:
+    """Run inference with given configuration.
+
+    Args:
+        config: Inference configuration
+        device: Device for the fp32 backend (int8 always runs on CPU)
+
+    Returns:
+        Dictionary with the number of pages, wall time and pages/sec
+    """
+    session = ReorderSession(config, device)
+    device = session.device
+
+    # Three stages on bounded queues: loader workers decode images and run
+    # the processor, this thread encodes and generates, and the writer thread
+    # decodes and writes. Generation never waits on PIL or disk, and the
+    # allocator cache stays warm across batches.
+    pin_memory = config.pin_memory and device.type == "cuda"
+    records = NdjsonIndex(config.test_json)
+    selected = range(min(config.max_pages, len(records)) if config.max_pages else len(records))
+    sink = JsonlResultSink(default_results_path(config.output_json), resume=config.resume,
+                           fsync_every=config.fsync_every, run_key=results_run_key(config))
+    if len(sink):
+        selected = [idx for idx in selected if records[idx]["img_name"] not in sink]
+    ds = Subset(OcrInferenceDataset(records, config.test_img_dir), selected)
+    if config.max_tokens:
+        batching = {"batch_sampler": TokenBudgetBatchSampler(
+            SequentialSampler(ds),
+            load_record_lengths(records)[list(selected)],
+            config.max_tokens,
+            config.bucket_pool_size,
+            shuffle=False,
+            max_batch_size=config.max_batch_size
+        )}
+    else:
+        batching = {"batch_size": config.batch_size, "shuffle": False}
+    loader = build_loader(
+        ds,
+        session.collator(),
+        num_workers=config.num_workers,
+        prefetch_factor=config.prefetch_factor,
+        pin_memory=pin_memory,
+        **batching
+    )
+    wait_timer = QueueWaitTimer()
+    results = ResultWriter(sink, session.decode, depth=config.queue_depth)
+    start = time.perf_counter()
+
+    # Process data
+    batches = wait_timer.wrap(ChunkPrefetcher(loader, depth=config.queue_depth))
+    if session.continuous is not None:
+        for pages, gen_ids in session.generate_stream(batches, non_blocking=pin_memory):
+            indices, img_names, words = map(list, zip(*pages))
+            results.put(indices, img_names, gen_ids, words)
+    else:
+        for batch in batches:
+            gen_ids = session.generate(batch, non_blocking=pin_memory)
+            results.put(batch["indices"], batch["img_names"], gen_ids, batch["words"])
+
+    pages = results.close()
+    elapsed = time.perf_counter() - start
+    total = sink.finalize(config.output_json, sort_key=lambda record: record["index"], indent=None)
+    print(f"{pages} pages in {elapsed:.1f}s ({pages / max(elapsed, 1e-9):.2f} pages/sec)")
+    if wait_timer.steps:
+        print(f"Model stage waited {wait_timer.total:.1f}s for input "
+              f"({wait_timer.total / wait_timer.steps * 1000:.1f} ms/batch) "
+              f"and {results.put_wait:.1f}s for the writer")
+    stats = {"pages": pages, "seconds": elapsed, "pages_per_sec": pages / max(elapsed, 1e-9)}
+    if config.sliding_window:
+        print(f"Sliding window: {session.truncated_pages} pages still truncated after "
+              f"max_windows={config.max_windows} windows")
+        stats["truncated_pages"] = session.truncated_pages
+    if session.budget_decoder is not None and session.budget_decoder.passes:
+        budget = session.budget_decoder.report()
+        print(f"Length budget: {budget['passes']} decoder passes and {budget['row_steps']} page-steps "
+              f"instead of ~{budget['fixed_passes']} and ~{budget['fixed_row_steps']} at "
+              f"max_output_length={config.max_output_length}; {budget['capped_pages']} pages capped, "
+              f"decoding took {budget['decode_seconds']:.1f}s, ~{budget['est_seconds_saved']:.1f}s less than "
+              f"the flat limit")
+        stats.update(budget)
+    if session.continuous is not None and session.continuous.steps:
+        decoder = session.continuous
+        occupancy = decoder.slot_steps / (decoder.steps * decoder.num_slots)
+        print(f"Continuous batching: {decoder.steps} decoder steps over {decoder.num_slots} slots, "
+              f"{occupancy:.0%} slot occupancy")
+        stats.update({"decode_steps": decoder.steps, "slot_occupancy": occupancy})
+    print(f"Inference complete — {total} results written to {config.output_json}")
+    return stats
 
 def start_execution():
     """Main function to run inference."""
@@ -0,0 +1,224 @@
+"""Per-page generation budgets for the T5 reorder decoder.
+
+The reordered text holds the same words as the input, so its T5 length is
+close to the T5 length of ``src_word_list``. A budget of
+``ceil(scale * source_tokens) + margin`` tokens per page, with ``scale``
+calibrated on the training NDJSON, stops degenerate runs on short pages
+long before the flat ``max_output_length``. ``BudgetedGreedyDecoder``
+evicts pages from the batch as soon as they emit EOS or reach their
+budget, so the remaining pages decode with a smaller batch.
+"""
+
+import json
+import math
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Sequence
+
+import numpy as np
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
+from ..fine_tune.data.ndjson_reader import iter_ndjson_in_chunks
+
+LENGTH_BUDGET_FILE = "length_budget.json"
+
+@dataclass
+class LengthBudget:
+    """Calibrated output length budget."""
+    scale: float  # output tokens per source token at the calibration quantile
+    margin: int  # tokens added to every budget
+    quantile: float  # quantile of the output/source ratio ``scale`` was taken at
+    coverage: float  # share of calibration pages whose target fits the budget
+    records: int  # calibration pages
+
+    def max_length(self, source_tokens: int, limit: int) -> int:
+        """Generation ``max_length`` (including the start token) for one page.
+
+        Args:
+            source_tokens: T5 token count of the page's source words
+            limit: Flat ``max_output_length`` the budget never exceeds
+        """
+        return min(limit, math.ceil(self.scale * source_tokens) + self.margin + 1)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "LengthBudget":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+def calibrate_length_budget(train_json: str, tokenizer, quantile: float = 0.999, margin: int = 8,
+                            max_records: int = 20000, chunk_size: int = 1000) -> LengthBudget:
+    """Fit the budget scale on labelled training pages.
+
+    Target lengths are counted like the training labels (with EOS), source
+    lengths like the inference collator (without special tokens).
+
+    Args:
+        train_json: Training NDJSON with ``src_word_list`` and ``ordered_src_doc``
+        tokenizer: T5 tokenizer
+        quantile: Share of pages whose output/source ratio ``scale`` covers
+        margin: Tokens added to every budget, mostly for short pages
+        max_records: Pages read from the start of the file
+        chunk_size: Pages tokenized together
+
+    Returns:
+        Calibrated budget
+    """
+    source_lengths, target_lengths = [], []
+    for chunk in iter_ndjson_in_chunks(train_json, chunk_size=chunk_size):
+        chunk = [r for r in chunk if "ordered_src_doc" in r][:max_records - len(source_lengths)]
+        sources = tokenizer([" ".join(r["src_word_list"]) for r in chunk], add_special_tokens=False).input_ids
+        targets = tokenizer([" ".join(r["ordered_src_doc"]) for r in chunk]).input_ids
+        source_lengths.extend(len(ids) for ids in sources)
+        target_lengths.extend(len(ids) for ids in targets)
+        if len(source_lengths) >= max_records:
+            break
+    if not source_lengths:
+        raise ValueError(f"No labelled pages in {train_json} to calibrate the length budget on")
+
+    source = np.maximum(np.array(source_lengths, dtype=np.float64), 1.0)
+    target = np.array(target_lengths, dtype=np.float64)
+    scale = float(np.quantile(target / source, quantile))
+    coverage = float(np.mean(target <= np.ceil(scale * source) + margin))
+    return LengthBudget(scale=scale, margin=margin, quantile=quantile, coverage=coverage,
+                        records=len(source_lengths))
+
+def load_or_calibrate(path: str, train_json: str, tokenizer, quantile: float = 0.999, margin: int = 8,
+                      **kwargs) -> LengthBudget:
+    """Load a saved budget, or calibrate one and save it to ``path``.
+
+    A saved budget calibrated for another quantile or margin is replaced.
+
+    Args:
+        path: Budget JSON
+        train_json: Training NDJSON used when ``path`` does not fit
+        tokenizer: T5 tokenizer
+        quantile: Share of pages whose output/source ratio the budget covers
+        margin: Tokens added to every budget
+        **kwargs: Passed to ``calibrate_length_budget``
+    """
+    if os.path.exists(path):
+        budget = LengthBudget.load(path)
+        if budget.quantile == quantile and budget.margin == margin:
+            return budget
+        print(f"{path} was calibrated for quantile {budget.quantile} and margin {budget.margin}, recalibrating")
+    print(f"Calibrating the length budget on {train_json}")
+    budget = calibrate_length_budget(train_json, tokenizer, quantile=quantile, margin=margin, **kwargs)
+    budget.save(path)
+    print(f"Length budget: {budget.scale:.3f} x source tokens + {budget.margin} "
+          f"(covers {budget.coverage:.2%} of {budget.records} pages), saved to {path}")
+    return budget
+
+class BudgetedGreedyDecoder:
+    """Greedy T5 decoding with a length limit per page and early eviction.
+
+    A page leaves the batch, together with its cache entries and encoder
+    states, once it emits EOS or reaches its limit. Up to the limits the
+    output equals greedy ``generate``. Counters accumulate over calls and
+    compare the work done with what the flat limit would have cost.
+    """
+
+    def __init__(self, t5_model):
+        """Initialize decoder.
+
+        Args:
+            t5_model: T5 model in eval mode (fp32 or dynamically quantized)
+        """
+        self.t5_model = t5_model
+        self.seconds = 0.0  # time spent decoding
+        self.passes = 0  # decoder passes
+        self.row_steps = 0  # tokens decoded over all pages
+        self.capped = 0  # pages stopped by their budget rather than EOS
+        self.fixed_passes = 0  # passes the flat limit would have needed (estimate)
+        self.fixed_row_steps = 0  # row-steps the flat limit would have needed (estimate)
+
+    @torch.no_grad()
+    def generate(self, inputs_embeds: torch.Tensor, attention_mask: torch.Tensor,
+                 max_lengths: Sequence[int], fixed_length: int) -> torch.Tensor:
+        """Greedily decode a batch of pages.
+
+        Args:
+            inputs_embeds: Projected encoder inputs of shape (batch, seq_len, d_model)
+            attention_mask: Encoder attention mask
+            max_lengths: ``max_length`` (including the start token) per page
+            fixed_length: Flat limit the budgets replace, for the statistics
+
+        Returns:
+            Generated ids like ``t5_model.generate``: decoder start token
+            first, padded with the pad token
+        """
+        start = time.perf_counter()
+        config = self.t5_model.config
+        device = inputs_embeds.device
+        encoder_hidden = self.t5_model.get_encoder()(
+            inputs_embeds=inputs_embeds,
+            attention_mask=attention_mask
+        ).last_hidden_state
+        limits = torch.tensor(max_lengths, dtype=torch.long)
+        tokens = torch.full((len(limits), int(limits.max())), config.pad_token_id, dtype=torch.long)
+        tokens[:, 0] = config.decoder_start_token_id
+        lengths = torch.ones(len(limits), dtype=torch.long)
+        active = torch.arange(len(limits))
+        step_input = tokens[:, :1].to(device)
+        past = None
+        while len(active):
+            out = self.t5_model(
+                encoder_outputs=BaseModelOutput(last_hidden_state=encoder_hidden),
+                attention_mask=attention_mask,
+                decoder_input_ids=step_input,
+                past_key_values=past,
+                use_cache=True
+            )
+            past = out.past_key_values
+            next_tokens = out.logits[:, -1].argmax(-1)
+            chosen = next_tokens.cpu()
+            tokens[active, lengths[active]] = chosen
+            lengths[active] += 1
+            self.passes += 1
+            self.row_steps += len(active)
+
+            ended = chosen == config.eos_token_id
+            finished = ended | (lengths[active] >= limits[active])
+            self.capped += int((finished & ~ended).sum())
+            if finished.any():
+                keep = torch.nonzero(~finished).squeeze(1)
+                if not len(keep):
+                    break
+                # Evict finished pages from the cache and the encoder states
+                keep_device = keep.to(device)
+                past.batch_select_indices(keep_device)
+                encoder_hidden = encoder_hidden[keep_device]
+                attention_mask = attention_mask[keep_device]
+                next_tokens = next_tokens[keep_device]
+                active = active[keep]
+            step_input = next_tokens.unsqueeze(1)
+
+        # Without budgets, capped pages would have kept decoding up to the flat
+        # limit, and every page of the batch until the longest one finished
+        ended = (tokens == config.eos_token_id).any(1)
+        fixed = torch.where(ended, lengths, torch.full_like(lengths, fixed_length))
+        self.fixed_passes += int(fixed.max()) - 1
+        self.fixed_row_steps += (int(fixed.max()) - 1) * len(fixed)
+        self.seconds += time.perf_counter() - start
+        return tokens[:, :int(lengths.max())]
+
+    def report(self) -> Dict[str, float]:
+        """Decoding work done and saved relative to the flat limit.
+
+        The saved time is estimated from the mean time per decoder pass.
+        """
+        per_pass = self.seconds / max(self.passes, 1)
+        return {
+            "decode_seconds": self.seconds,
+            "passes": self.passes,
+            "row_steps": self.row_steps,
+            "capped_pages": self.capped,
+            "fixed_passes": self.fixed_passes,
+            "fixed_row_steps": self.fixed_row_steps,
+            "est_seconds_saved": max(0.0, per_pass * (self.fixed_passes - self.passes)),
+        }
@@ -0,0 +1,128 @@
+"""Dynamic int8 quantization of the LayoutLMv3 + T5 reorder model for CPU."""
+
+import json
+from typing import Dict, Tuple
+
+import torch
+import torch.nn as nn
+from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+from transformers import LayoutLMv3Config, LayoutLMv3Model, T5Config, T5ForConditionalGeneration
+
+from ..fine_tune.projection import build_projection
+
+QUANTIZED_FORMAT = "int8-dynamic-v1"
+# LayoutLMv3 indexes the weights of its relative position bias Linears
+# directly instead of calling them, so they must stay fp32
+SKIP_MODULES = ("rel_pos_bias", "rel_pos_x_bias", "rel_pos_y_bias")
+
+def quantize_dynamic_int8(layout_model: nn.Module, projection: nn.Module,
+                          t5_model: nn.Module) -> None:
+    """Replace every ``nn.Linear`` of the three models by a dynamic int8 version.
+
+    Weights are stored as int8 and activations are quantized on the fly, so
+    the models run on CPU only. Embeddings, convolutions, norms and the
+    LayoutLMv3 relative position tables stay fp32.
+
+    Args:
+        layout_model: LayoutLMv3 encoder (modified in place)
+        projection: LayoutLMv3 to T5 projection (modified in place)
+        t5_model: T5 model (modified in place)
+    """
+    for model in (layout_model, projection, t5_model):
+        model.to("cpu").eval()
+        qconfig_spec = {
+            name: default_dynamic_qconfig
+            for name, module in model.named_modules()
+            if isinstance(module, nn.Linear) and name.rsplit(".", 1)[-1] not in SKIP_MODULES
+        }
+        quantize_dynamic(model, qconfig_spec, dtype=torch.qint8, inplace=True)
+
+def export_int8_state(model: nn.Module) -> Dict[str, torch.Tensor]:
+    """Flatten a quantized model into plain tensors.
+
+    Int8 weights are stored as their integer representation plus scale and
+    zero point, so the checkpoint holds nothing but ordinary tensors.
+    """
+    state = {
+        name: value for name, value in model.state_dict().items()
+        if torch.is_tensor(value) and not value.is_quantized
+    }
+    for name, module in model.named_modules():
+        if isinstance(module, DynamicQuantizedLinear):
+            weight, bias = module._weight_bias()
+            state[f"{name}.weight_int8"] = weight.int_repr()
+            state[f"{name}.weight_scale"] = torch.tensor(weight.q_scale(), dtype=torch.float64)
+            state[f"{name}.weight_zero_point"] = torch.tensor(weight.q_zero_point())
+            if bias is not None:
+                state[f"{name}.bias"] = bias
+    return state
+
+def _import_int8_state(model: nn.Module, state: Dict[str, torch.Tensor]) -> None:
+    """Load ``export_int8_state`` output into a quantized model of the same shape."""
+    # Start from the model's own state dict, which carries the version
+    # metadata the quantized modules need when loading
+    native = model.state_dict()
+    expected = {k for k, v in native.items() if torch.is_tensor(v) and not v.is_quantized}
+    int8_keys = set()
+    for name, module in model.named_modules():
+        if isinstance(module, DynamicQuantizedLinear):
+            keys = [f"{name}.{suffix}" for suffix in ("weight_int8", "weight_scale", "weight_zero_point", "bias")]
+            weight = torch._make_per_tensor_quantized_tensor(
+                state[keys[0]], float(state[keys[1]]), int(state[keys[2]])
+            )
+            native[f"{name}._packed_params._packed_params"] = (weight, state.get(keys[3]))
+            int8_keys.update(keys)
+
+    missing = expected - state.keys()
+    unexpected = state.keys() - expected - int8_keys
+    if missing or unexpected:
+        raise ValueError(f"Quantized checkpoint does not match the model: "
+                         f"missing {sorted(missing)[:5]}, unexpected {sorted(unexpected)[:5]}")
+    native.update({k: state[k] for k in expected})
+    model.load_state_dict(native)
+
+def save_quantized_checkpoint(path: str, layout_model: nn.Module, projection: nn.Module,
+                              t5_model: nn.Module) -> None:
+    """Save quantized models together with the configs needed to rebuild them.
+
+    Args:
+        path: Output ``.pth`` file
+        layout_model: Quantized LayoutLMv3 encoder
+        projection: Quantized projection
+        t5_model: Quantized T5 model
+    """
+    torch.save({
+        "format": QUANTIZED_FORMAT,
+        "layout_config": layout_model.config.to_json_string(),
+        "t5_config": t5_model.config.to_json_string(),
+        "layout_model": export_int8_state(layout_model),
+        "projection": export_int8_state(projection),
+        "t5_model": export_int8_state(t5_model),
+    }, path)
+
+def load_quantized_checkpoint(path: str) -> Tuple[nn.Module, nn.Module, nn.Module]:
+    """Rebuild quantized models from ``save_quantized_checkpoint`` output.
+
+    The fp32 architecture is created from the stored configs (no pretrained
+    weights are downloaded), quantized, and filled with the int8 weights.
+
+    Args:
+        path: Checkpoint written by ``save_quantized_checkpoint``
+
+    Returns:
+        Tuple of (layout_model, projection, t5_model) in eval mode on CPU
+    """
+    ckpt = torch.load(path, map_location="cpu", weights_only=True)
+    if ckpt.get("format") != QUANTIZED_FORMAT:
+        raise ValueError(f"{path} is not a quantized reorder checkpoint")
+
+    layout_model = LayoutLMv3Model(LayoutLMv3Config.from_dict(json.loads(ckpt["layout_config"])))
+    t5_model = T5ForConditionalGeneration(T5Config.from_dict(json.loads(ckpt["t5_config"])))
+    projection = build_projection(t5_model)
+    quantize_dynamic_int8(layout_model, projection, t5_model)
+
+    _import_int8_state(layout_model, ckpt["layout_model"])
+    _import_int8_state(projection, ckpt["projection"])
+    _import_int8_state(t5_model, ckpt["t5_model"])
+    return layout_model, projection, t5_model
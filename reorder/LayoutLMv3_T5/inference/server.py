@@ -0,0 +1,288 @@
+"""Micro-batching HTTP service for the LayoutLMv3 + T5 reorder model.
+
+Start it with ``python main.py LayoutLMv3_T5 serve`` from ``reorder/``. The
+checkpoint is loaded once with the ``InferenceConfig`` used by batch
+inference. Endpoints:
+
+* ``POST /reorder`` with ``{"image": <base64>, "src_word_list": [...],
+  "src_wordbox_list": [...], "img_name": <optional>}`` returns
+  ``{"img_name", "text", "latency_ms"}``
+* ``GET /metrics`` returns request counts, queue depth, batch sizes and
+  p50/p99 latencies
+* ``GET /health``
+
+With ``InferenceConfig.continuous_batching`` the server admits requests into
+free T5 decode slots between decoder steps instead of forming batches.
+"""
+
+import asyncio
+import base64
+import io
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from common.http import HttpError, serve_json
+from .continuous import pad_tokens
+from .inference import InferenceConfig, ReorderSession
+
+@dataclass
+class ServerConfig:
+    """Configuration for the inference server."""
+    host: str = "127.0.0.1"
+    port: int = 8080
+    max_batch_size: int = 8  # requests coalesced into one model batch
+    max_wait_ms: float = 10.0  # longest the first request of a batch waits for more
+    max_queue: int = 256  # pending requests before new ones are rejected with 503
+    latency_window: int = 10000  # most recent requests the percentiles cover
+
+def decode_request(payload: Any) -> Dict:
+    """Validate a ``/reorder`` body and turn it into a dataset-style item.
+
+    Raises:
+        HttpError: If the body is malformed
+    """
+    if not isinstance(payload, dict):
+        raise HttpError(400, "Body must be a JSON object")
+    words = payload.get("src_word_list")
+    boxes = payload.get("src_wordbox_list")
+    if not isinstance(words, list) or not isinstance(boxes, list) or len(words) != len(boxes):
+        raise HttpError(400, "src_word_list and src_wordbox_list must be lists of equal length")
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(payload["image"]))).convert("RGB")
+    except Exception as e:
+        raise HttpError(400, f"Could not decode image: {e}")
+    return {
+        "image": image,
+        "words": words,
+        "boxes": boxes,
+        "img_name": payload.get("img_name", ""),
+        "index": 0
+    }
+
+def _percentiles(values) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p99": 0.0}
+    p50, p99 = np.percentile(np.fromiter(values, dtype=np.float64), [50, 99])
+    return {"p50": round(float(p50), 2), "p99": round(float(p99), 2)}
+
+class MicroBatcher:
+    """Coalesces concurrent requests into model batches.
+
+    The first queued request opens a batch, which is closed when it holds
+    ``max_batch_size`` requests or ``max_wait_ms`` has passed. Batches run
+    one at a time in a model thread, so the event loop keeps accepting and
+    queueing requests during generation.
+    """
+
+    def __init__(self, session: ReorderSession, config: ServerConfig):
+        """Initialize batcher.
+
+        Args:
+            session: Loaded reorder model
+            config: Server configuration
+        """
+        self.session = session
+        self.config = config
+        self.collator = session.collator()
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reorder-model")
+        self.latencies = deque(maxlen=config.latency_window)
+        self.queue_waits = deque(maxlen=config.latency_window)
+        self.counts = {"requests": 0, "rejected": 0, "errors": 0, "batches": 0, "batched_requests": 0}
+        self.max_queue_depth = 0
+
+    async def submit(self, item: Dict) -> str:
+        """Queue one decoded request and wait for its text.
+
+        Raises:
+            HttpError: 503 when the queue is full
+        """
+        if self.queue.qsize() >= self.config.max_queue:
+            self.counts["rejected"] += 1
+            raise HttpError(503, "Too many pending requests")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[Dict, asyncio.Future, float]]:
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.config.max_wait_ms / 1000
+        while len(batch) < self.config.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _reorder(self, items: List[Dict]) -> List[str]:
+        batch = self.collator(items)
+        return self.session.decode(self.session.generate(batch), batch["words"])
+
+    async def run(self) -> None:
+        """Form and run batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            self.queue_waits.extend((started - queued) * 1000 for _, _, queued in batch)
+            self.counts["batches"] += 1
+            self.counts["batched_requests"] += len(batch)
+            try:
+                texts = await loop.run_in_executor(self.executor, self._reorder, [item for item, _, _ in batch])
+            except Exception as e:
+                self.counts["errors"] += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+
+    def metrics(self) -> Dict:
+        """Return counters, queue depth and latency percentiles."""
+        return {
+            **self.counts,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "mean_batch_size": round(self.counts["batched_requests"] / max(self.counts["batches"], 1), 2),
+            "latency_ms": _percentiles(self.latencies),
+            "queue_wait_ms": _percentiles(self.queue_waits),
+        }
+
+class ContinuousBatcher(MicroBatcher):
+    """Admits requests into the session's continuous decoder between steps.
+
+    Queued requests are encoded and placed into free decode slots before
+    every decoder step, and each request is answered as soon as its page
+    finishes, without waiting for the longer pages it was admitted with.
+    ``batches`` counts admissions; ``max_batch_size`` and ``max_wait_ms``
+    do not apply, the number of slots bounds the concurrency instead.
+    """
+
+    def __init__(self, session: ReorderSession, config: ServerConfig):
+        """Initialize batcher.
+
+        Args:
+            session: Loaded reorder model with a continuous decoder
+            config: Server configuration
+        """
+        super().__init__(session, config)
+        self.decoder = session.continuous
+        self.counts["decode_steps"] = 0
+        self.slot_steps = 0
+
+    def _step(self, admitted: List[Tuple[Dict, asyncio.Future, float]]) -> List[Tuple[asyncio.Future, str]]:
+        session = self.session
+        with torch.no_grad(), torch.cuda.amp.autocast(enabled=session.device.type == "cuda"):
+            if admitted:
+                batch = self.collator([item for item, _, _ in admitted])
+                proj_feats, mask = session.encode_batch(batch)
+                hidden = self.decoder.encode(proj_feats, mask)
+                for (_, future, _), words, row, row_mask, limit in zip(
+                        admitted, batch["words"], hidden, mask, session.max_lengths(batch)):
+                    self.decoder.admit((future, words), row, row_mask, limit)
+            self.slot_steps += self.decoder.active
+            finished = self.decoder.step()
+        if not finished:
+            return []
+        gen_ids = pad_tokens([tokens for _, tokens in finished], session.t5_model.config.pad_token_id)
+        texts = session.decode(gen_ids, [words for (_, words), _ in finished])
+        return [(future, text) for ((future, _), _), text in zip(finished, texts)]
+
+    async def run(self) -> None:
+        """Admit requests and run decoder steps until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            admitted = []
+            if not self.decoder.active:
+                admitted.append(await self.queue.get())
+            while len(admitted) < self.decoder.free_slots and not self.queue.empty():
+                admitted.append(self.queue.get_nowait())
+            if admitted:
+                started = time.perf_counter()
+                self.queue_waits.extend((started - queued) * 1000 for _, _, queued in admitted)
+                self.counts["batches"] += 1
+                self.counts["batched_requests"] += len(admitted)
+            self.counts["decode_steps"] += 1
+            try:
+                finished = await loop.run_in_executor(self.executor, self._step, admitted)
+            except Exception as e:
+                # The slots may be half updated, so every page in flight fails
+                failed = {future for future, _ in self.decoder.reset()}
+                failed.update(future for _, future, _ in admitted)
+                self.counts["errors"] += len(failed)
+                for future in failed:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for future, text in finished:
+                if not future.done():
+                    future.set_result(text)
+
+    def metrics(self) -> Dict:
+        """Return counters, queue depth, slot occupancy and latency percentiles."""
+        return {
+            **super().metrics(),
+            "active_slots": self.decoder.active,
+            "mean_active_slots": round(self.slot_steps / max(self.counts["decode_steps"], 1), 2),
+        }
+
+async def serve(inference_config: InferenceConfig, server_config: ServerConfig) -> None:
+    """Load the model and serve requests until cancelled.
+
+    Args:
+        inference_config: Checkpoint, backend and generation settings
+        server_config: Network and batching settings
+    """
+    session = ReorderSession(inference_config)
+    batcher = (ContinuousBatcher if session.continuous is not None else MicroBatcher)(session, server_config)
+    loop = asyncio.get_running_loop()
+
+    async def reorder(payload: Any) -> Tuple[int, Dict]:
+        start = time.perf_counter()
+        batcher.counts["requests"] += 1
+        # Base64 and PNG decoding stay off the event loop
+        item = await loop.run_in_executor(None, decode_request, payload)
+        text = await batcher.submit(item)
+        latency_ms = (time.perf_counter() - start) * 1000
+        batcher.latencies.append(latency_ms)
+        return 200, {"img_name": item["img_name"], "text": text, "latency_ms": round(latency_ms, 2)}
+
+    async def metrics(_: Any) -> Tuple[int, Dict]:
+        return 200, batcher.metrics()
+
+    async def health(_: Any) -> Tuple[int, Dict]:
+        return 200, {"status": "ok", "device": str(session.device)}
+
+    batch_task = asyncio.create_task(batcher.run())
+    server = await serve_json({
+        ("POST", "/reorder"): reorder,
+        ("GET", "/metrics"): metrics,
+        ("GET", "/health"): health,
+    }, server_config.host, server_config.port)
+    print(f"Serving on http://{server_config.host}:{server.sockets[0].getsockname()[1]}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+        batcher.executor.shutdown(wait=False)
+
+def start_execution():
+    """Run the inference server."""
+    try:
+        asyncio.run(serve(InferenceConfig(), ServerConfig()))
+    except KeyboardInterrupt:
+        pass
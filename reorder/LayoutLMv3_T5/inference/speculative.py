@@ -0,0 +1,140 @@
+"""Copy-draft speculative decoding for the T5 reorder decoder.
+
+Reordered text mostly copies runs of the input words, so the tokens that
+follow the latest generated n-gram can usually be read off the tokenized
+``src_word_list``. Those tokens are proposed as a draft and checked by one
+decoder pass over all of them: every draft token that matches the greedy
+choice is accepted, and the pass also yields the greedy token after the
+last accepted one. The output is the greedy output of ``t5_model.generate``,
+only with fewer decoder passes. No draft model or retraining is needed.
+"""
+
+from typing import List, Sequence, Union
+
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
+class CopySpeculativeDecoder:
+    """Greedy T5 decoding with drafts copied from the source tokens.
+
+    Pages are encoded together and then decoded one at a time, because the
+    number of accepted tokens differs per page. Counters accumulate over
+    calls so benchmarks can report decoder passes and acceptance.
+    """
+
+    def __init__(self, t5_model, num_draft_tokens: int = 10, ngram_size: int = 3):
+        """Initialize decoder.
+
+        Args:
+            t5_model: T5 model in eval mode (fp32 or dynamically quantized)
+            num_draft_tokens: Longest draft verified in one decoder pass
+            ngram_size: Longest generated suffix looked up in the source;
+                shorter suffixes are tried when it does not occur
+        """
+        self.t5_model = t5_model
+        self.num_draft_tokens = num_draft_tokens
+        self.ngram_size = ngram_size
+        self.tokens = 0  # tokens generated
+        self.passes = 0  # decoder passes
+        self.drafted = 0  # draft tokens proposed
+        self.accepted = 0  # draft tokens accepted
+
+    def draft(self, tokens: Sequence[int], source: torch.Tensor, limit: int) -> List[int]:
+        """Propose the source tokens following the latest generated n-gram.
+
+        Args:
+            tokens: Generated tokens without the decoder start token
+            source: Source token ids (1-D, CPU)
+            limit: Longest draft allowed
+
+        Returns:
+            Draft tokens, empty when no suffix occurs in the source
+        """
+        limit = min(limit, self.num_draft_tokens)
+        for n in range(min(self.ngram_size, len(tokens)), 0, -1):
+            if limit <= 0:
+                break
+            if len(source) <= n:
+                # Too short for this n-gram and a continuation, but not for shorter ones
+                continue
+            ngram = torch.tensor(tokens[-n:], dtype=source.dtype)
+            # Only occurrences followed by at least one token can be continued
+            hits = (source[:-1].unfold(0, n, 1) == ngram).all(1).nonzero()
+            if len(hits):
+                start = hits[0, 0].item() + n
+                return source[start:start + limit].tolist()
+        return []
+
+    @torch.no_grad()
+    def generate(self, inputs_embeds: torch.Tensor, attention_mask: torch.Tensor,
+                 source_ids: Sequence[Sequence[int]], max_length: Union[int, Sequence[int]]) -> torch.Tensor:
+        """Greedily decode a batch of pages.
+
+        Args:
+            inputs_embeds: Projected encoder inputs of shape (batch, seq_len, d_model)
+            attention_mask: Encoder attention mask
+            source_ids: T5 token ids of every page's source words
+            max_length: Longest output including the decoder start token,
+                for all pages or per page
+
+        Returns:
+            Generated ids like ``t5_model.generate``: decoder start token
+            first, padded with the pad token
+        """
+        config = self.t5_model.config
+        encoder_hidden = self.t5_model.get_encoder()(
+            inputs_embeds=inputs_embeds,
+            attention_mask=attention_mask
+        ).last_hidden_state
+        if isinstance(max_length, int):
+            max_length = [max_length] * len(source_ids)
+        rows = []
+        for i, source in enumerate(source_ids):
+            rows.append(self._generate_row(
+                encoder_hidden[i:i + 1],
+                attention_mask[i:i + 1],
+                torch.tensor(source, dtype=torch.long),
+                max_length[i],
+                config.decoder_start_token_id,
+                config.eos_token_id
+            ))
+        out = torch.full((len(rows), max(len(row) for row in rows)), config.pad_token_id, dtype=torch.long)
+        for i, row in enumerate(rows):
+            out[i, :len(row)] = torch.tensor(row, dtype=torch.long)
+        return out
+
+    def _generate_row(self, encoder_hidden: torch.Tensor, attention_mask: torch.Tensor,
+                      source: torch.Tensor, max_length: int, start_token: int, eos_token: int) -> List[int]:
+        tokens = [start_token]
+        encoder_outputs = BaseModelOutput(last_hidden_state=encoder_hidden)
+        past = None
+        while len(tokens) < max_length:
+            # The cache holds every token but the last one
+            draft = self.draft(tokens[1:], source, max_length - len(tokens) - 1)
+            out = self.t5_model(
+                encoder_outputs=encoder_outputs,
+                attention_mask=attention_mask,
+                decoder_input_ids=torch.tensor([[tokens[-1], *draft]], device=encoder_hidden.device),
+                past_key_values=past,
+                use_cache=True
+            )
+            past = out.past_key_values
+            greedy = out.logits[0].argmax(-1).tolist()
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == greedy[accepted]:
+                accepted += 1
+            new_tokens = draft[:accepted] + [greedy[accepted]]
+            # Drop the cache entries of rejected draft tokens
+            if accepted < len(draft):
+                past.crop(accepted - len(draft))
+            self.passes += 1
+            self.drafted += len(draft)
+            self.accepted += accepted
+
+            if eos_token in new_tokens:
+                new_tokens = new_tokens[:new_tokens.index(eos_token) + 1]
+            tokens.extend(new_tokens)
+            self.tokens += len(new_tokens)
+            if new_tokens[-1] == eos_token:
+                break
+        return tokens
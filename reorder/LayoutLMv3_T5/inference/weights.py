@@ -0,0 +1,161 @@
+"""Inference-only safetensors weights for the LayoutLMv3 + T5 reorder model.
+
+Training checkpoints carry optimizer, scheduler and scaler state, and
+loading one means building both base models with ``from_pretrained`` only
+to overwrite their weights. An exported weights file holds nothing but the
+model weights, optionally in fp16, with the model configs in its metadata.
+Loading builds the models on the meta device from those configs and
+assigns the memory-mapped tensors, so no base weights are downloaded and
+every weight is materialized once.
+"""
+
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import torch
+import torch.nn as nn
+from safetensors import safe_open
+from safetensors.torch import load_file, save_file
+from transformers import LayoutLMv3Config, LayoutLMv3Model, PreTrainedModel, T5Config, T5ForConditionalGeneration
+
+from ..fine_tune.pointer import PointerHead
+from ..fine_tune.projection import build_projection
+
+WEIGHTS_FORMAT = "reorder-weights-v1"
+MODEL_NAMES = ("layout_model", "projection", "t5_model")
+
+def _build_models(layout_config: LayoutLMv3Config, t5_config: T5Config,
+                  pointer_head: bool) -> Dict[str, nn.Module]:
+    t5_model = T5ForConditionalGeneration(t5_config)
+    models = {
+        "layout_model": LayoutLMv3Model(layout_config),
+        "projection": build_projection(t5_model),
+        "t5_model": t5_model,
+    }
+    if pointer_head:
+        models["pointer_head"] = PointerHead(t5_config.d_model)
+    return models
+
+def export_inference_weights(checkpoint_path: str, output_path: str, layout_config: LayoutLMv3Config,
+                             t5_config: T5Config, fp16: bool = False) -> Dict[str, int]:
+    """Write the model weights of a training checkpoint as safetensors.
+
+    Non-persistent buffers are stored too, so loading never has to
+    initialize a module. Tied weights are stored once and recorded as
+    aliases.
+
+    Args:
+        checkpoint_path: ``model_epoch_N.pth`` written by training
+        output_path: ``.safetensors`` file to write
+        layout_config: Config of the LayoutLMv3 encoder
+        t5_config: Config of the T5 model
+        fp16: Store floating point weights in fp16
+
+    Returns:
+        Number of tensors and bytes written
+    """
+    ckpt = torch.load(checkpoint_path, map_location="cpu", mmap=True)
+    models = _build_models(layout_config, t5_config, "pointer_head" in ckpt)
+    tensors, aliases, seen = {}, {}, {}
+    for name, model in models.items():
+        model.load_state_dict(ckpt[name])
+        state = dict(model.state_dict())
+        state.update(model.named_buffers())
+        for key, value in state.items():
+            key = f"{name}.{key}"
+            # Tied weights share storage; safetensors refuses to store them twice
+            identity = (value.data_ptr(), value.dtype, tuple(value.shape), value.stride())
+            if identity in seen:
+                aliases[key] = seen[identity]
+                continue
+            seen[identity] = key
+            if fp16 and value.is_floating_point():
+                value = value.half()
+            tensors[key] = value.contiguous()
+    del ckpt
+
+    save_file(tensors, output_path, metadata={
+        "format": WEIGHTS_FORMAT,
+        "models": json.dumps(list(models)),
+        "layout_config": layout_config.to_json_string(),
+        "t5_config": t5_config.to_json_string(),
+        "aliases": json.dumps(aliases),
+        "dtype": "fp16" if fp16 else "fp32",
+    })
+    return {"tensors": len(tensors), "bytes": os.path.getsize(output_path)}
+
+def _assign(model: nn.Module, state: Dict[str, torch.Tensor]) -> None:
+    """Load ``state`` into a meta-device model by taking over its tensors."""
+    persistent = model.state_dict().keys()
+    missing = set(persistent) - state.keys()
+    if missing:
+        raise ValueError(f"Weights file does not match the model: missing {sorted(missing)[:5]}")
+    model.load_state_dict({k: state[k] for k in persistent}, assign=True)
+    for key, _ in list(model.named_buffers()):
+        if key not in persistent:
+            module_name, _, buffer_name = key.rpartition(".")
+            model.get_submodule(module_name)._buffers[buffer_name] = state[key]
+
+def load_inference_weights(path: str, names: Sequence[str] = MODEL_NAMES,
+                           device: Optional[torch.device] = None,
+                           dtype: torch.dtype = torch.float32) -> Dict[str, nn.Module]:
+    """Build models from an exported weights file.
+
+    Args:
+        path: File written by ``export_inference_weights``
+        names: Models to build (``MODEL_NAMES`` and optionally ``"pointer_head"``)
+        device: Device to move the models to; CPU models keep using the
+            memory-mapped file when no conversion is needed
+        dtype: Floating point dtype of the returned models
+
+    Returns:
+        Models by name, in eval mode
+    """
+    with safe_open(path, framework="pt") as f:
+        metadata = f.metadata() or {}
+    if metadata.get("format") != WEIGHTS_FORMAT:
+        raise ValueError(f"{path} is not an exported reorder weights file")
+    stored = json.loads(metadata["models"])
+    unknown = set(names) - set(stored)
+    if unknown:
+        raise ValueError(f"{path} holds no {sorted(unknown)}")
+
+    tensors = load_file(path)
+    for alias, key in json.loads(metadata["aliases"]).items():
+        tensors[alias] = tensors[key]
+    with torch.device("meta"):
+        models = _build_models(
+            LayoutLMv3Config.from_dict(json.loads(metadata["layout_config"])),
+            T5Config.from_dict(json.loads(metadata["t5_config"])),
+            "pointer_head" in names
+        )
+    built = {}
+    for name in names:
+        prefix = f"{name}."
+        _assign(models[name], {k[len(prefix):]: v for k, v in tensors.items() if k.startswith(prefix)})
+        built[name] = models[name].to(device=device, dtype=dtype).eval()
+        if isinstance(built[name], PreTrainedModel):
+            # Converting fp16 weights copies each parameter, which unties lm_head from the embeddings
+            built[name].tie_weights()
+    return built
+
+def start_execution():
+    """Export the configured checkpoint to ``InferenceConfig.weights_file``."""
+    from ..fine_tune import ModelConfig
+    from .inference import InferenceConfig
+
+    config = InferenceConfig()
+    if not config.weights_file:
+        raise ValueError("Set InferenceConfig.weights_file to export inference weights")
+    model_config = ModelConfig()
+    model_ckpt = os.path.join(config.checkpoint_dir, f"model_epoch_{config.epoch}.pth")
+    written = export_inference_weights(
+        model_ckpt,
+        config.weights_file,
+        LayoutLMv3Config.from_pretrained(model_config.layoutlm_model_name),
+        T5Config.from_pretrained(model_config.t5_model_name),
+        fp16=config.weights_fp16
+    )
+    print(f"Wrote {written['tensors']} tensors to {config.weights_file} "
+          f"({written['bytes'] / 2**20:.0f} MiB, checkpoint {os.path.getsize(model_ckpt) / 2**20:.0f} MiB)")
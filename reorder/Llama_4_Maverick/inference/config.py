@@ -1,5 +1,21 @@
 import os
 
+from common.image_prep import ImagePrepConfig
+
 DATA_DIR = r"E:\\TestData\\testset"
 JSON_PATH = r"E:\\TestData\\testset_wo_label.json"
 OUTPUT_PATH = "extracted_texts_llama_testdata.json"
+RESUME = True  # skip images already in the partial results of an interrupted run
+API_BASE_URL = ""  # empty uses the Groq API; e.g. http://127.0.0.1:8001 for common.stub_chat_server
+CONCURRENCY = 4  # requests in flight
+REQUESTS_PER_MINUTE = 30  # 0 disables the request limit
+TOKENS_PER_MINUTE = 0  # 0 disables the token limit
+TOKENS_PER_REQUEST = 12000  # estimated prompt + completion tokens of one page, for TOKENS_PER_MINUTE
+MAX_RETRIES = 6  # retries of a 429/5xx answer before a page is reported as failed
+RESPONSE_CACHE_PATH = "llama_responses.sqlite"  # answers of unchanged requests; empty disables the cache
+RESPONSE_CACHE_MAX_MB = 512  # least recently used responses are evicted beyond this size
+EXAMPLE_CACHE_DIR = ".prompt_cache"  # encoded few-shot example images by content hash; empty disables
+# Uploads the pages unchanged; compare settings with common.image_prep_benchmark before downscaling
+IMAGE_PREP = ImagePrepConfig()
+IMAGE_CACHE_DIR = ".image_cache"  # prepared page images by source hash; empty disables
+IMAGE_WORKERS = 4  # processes preparing images; 0 prepares in the request threads
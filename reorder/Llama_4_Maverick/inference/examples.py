@@ -1,7 +1,13 @@
 from langchain.schema.messages import HumanMessage, AIMessage
 from .image_utils import image_file_to_base64
+from common.prompt_prefix import cached_image_url
+from .config import EXAMPLE_CACHE_DIR
 
-def get_few_shot_examples():
+def example_image_url(path, encode):
+    # Encoded once per image content and encoder settings, and reused by later runs
+    return cached_image_url(path, encode, EXAMPLE_CACHE_DIR, getattr(encode, "variant", "source"))
+
+def get_few_shot_examples(encode=image_file_to_base64):
     examples = []
 
     # Example 3
@@ -12,7 +18,7 @@ def get_few_shot_examples():
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": image_file_to_base64(example3_img_path)
+                        "url": example_image_url(example3_img_path, encode)
                     }
                 }
             ]
@@ -41,7 +47,7 @@ def get_few_shot_examples():
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": image_file_to_base64(example6_img_path)
+                        "url": example_image_url(example6_img_path, encode)
                     }
                 }
             ]
@@ -65,7 +71,7 @@ def get_few_shot_examples():
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": image_file_to_base64(example9_img_path1)
+                        "url": example_image_url(example9_img_path1, encode)
                     }
                 }
             ]
@@ -99,7 +105,7 @@ def get_few_shot_examples():
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": image_file_to_base64(example9_img_path2)
+                        "url": example_image_url(example9_img_path2, encode)
                     }
                 }
             ]
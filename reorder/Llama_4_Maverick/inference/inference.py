@@ -1,22 +1,24 @@
 import json
-import time
+import asyncio
 import dotenv
 import os
+from functools import partial
 
-from .image_utils import image_file_to_base64
-from .ocr_client import get_groq_client, get_system_message
+from common.image_prep import ImagePreparer
+from common.request_engine import EngineConfig, RequestEngine
+from common.response_cache import ResponseCache
+from common.result_sink import JsonlResultSink, default_results_path
+from .ocr_client import MODEL_NAME, get_groq_client, get_system_message
 from .examples import get_few_shot_examples
-from .process import perform_ocr_with_examples
-from .config import DATA_DIR, JSON_PATH, OUTPUT_PATH
+from .process import build_prompt_prefix, lookup_cached_ocr, perform_ocr_with_examples
+from .config import (DATA_DIR, JSON_PATH, OUTPUT_PATH, RESUME, API_BASE_URL, CONCURRENCY,
+                     REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, TOKENS_PER_REQUEST, MAX_RETRIES,
+                     RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_MB, IMAGE_PREP, IMAGE_CACHE_DIR, IMAGE_WORKERS)
 
 dotenv.load_dotenv()
 
-def start_execution():
-    client = get_groq_client()
-    system_message = get_system_message()
-    few_shot_examples = get_few_shot_examples()
-    extracted_texts = {}
-
+def iter_pages(sink):
+    """Yield ``(img_name, img_path)`` of the pages still to process, streaming the JSON lines."""
     with open(JSON_PATH, "r", encoding="utf-8") as f:
         for line in f:
             try:
@@ -26,26 +28,70 @@ def start_execution():
                 continue
 
             img_name = data.get("img_name")
-            if not img_name:
+            if not img_name or img_name in sink:
                 continue
 
             img_path = os.path.join(DATA_DIR, img_name)
             if not os.path.exists(img_path):
                 print(f"Image not found: {img_path}")
                 continue
+            yield img_name, img_path
 
-            print(f"Processing {img_name}...")
-            try:
-                decoded_output = perform_ocr_with_examples(
-                    img_path, client, system_message, few_shot_examples, image_file_to_base64
-                )
-                extracted_texts[img_name] = decoded_output
-                print(f"Extracted text for {img_name}:\n{decoded_output}\n{'-'*40}")
-                time.sleep(1)
-            except Exception as e:
-                print(f"Error processing {img_name}: {str(e)}")
-
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as json_file:
-        json.dump(extracted_texts, json_file, indent=4)
-    print(f"All extracted texts have been saved to {OUTPUT_PATH}.")
+async def run_requests(ocr, pages, sink, lookup=None):
+    """Send the pages through the request engine and write the results in input order.
+
+    Pages answered by ``lookup`` (the response cache) skip the rate limits.
+    """
+    engine = RequestEngine(EngineConfig(
+        concurrency=CONCURRENCY,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        tokens_per_minute=TOKENS_PER_MINUTE,
+        max_retries=MAX_RETRIES
+    ))
+    try:
+        results = engine.map(lambda page: ocr(page[1]), pages, estimate_tokens=lambda page: TOKENS_PER_REQUEST,
+                             lookup=(lambda page: lookup(page[1])) if lookup is not None else None)
+        async for (img_name, img_path), result in results:
+            if isinstance(result, Exception):
+                print(f"Error processing {img_name}: {str(result)}")
+                continue
+            sink.write(img_name, result)
+            print(f"Extracted text for {img_name}:\n{result}\n{'-'*40}")
+    finally:
+        engine.close()
+    print(f"Requests: {engine.report()}")
+
+def open_response_cache():
+    return ResponseCache(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_MB * 2**20) if RESPONSE_CACHE_PATH else None
+
+def build_ocr(encode, cache=None):
+    """OCR and cache lookup functions of one image path, sharing the client and the prompt prefix.
+
+    The lookup is None without a response cache.
+    """
+    # The request engine retries and backs off; SDK retries would multiply its attempts
+    client = get_groq_client(API_BASE_URL, sdk_retries=False)
+    prefix = build_prompt_prefix(get_system_message(), get_few_shot_examples(encode))
+    print(f"Prompt prefix: {len(prefix.messages)} messages, {prefix.nbytes / 2**20:.2f} MiB")
+    ocr = partial(perform_ocr_with_examples, client=client, prefix=prefix,
+                  image_file_to_base64=encode, cache=cache)
+    lookup = partial(lookup_cached_ocr, client=client, prefix=prefix,
+                     image_file_to_base64=encode, cache=cache) if cache is not None else None
+    return ocr, lookup
+
+def start_execution():
+    sink = JsonlResultSink(default_results_path(OUTPUT_PATH), resume=RESUME,
+                           run_key=f"{MODEL_NAME}|{JSON_PATH}|{IMAGE_PREP.variant}")
+
+    preparer = ImagePreparer(IMAGE_PREP, IMAGE_CACHE_DIR, IMAGE_WORKERS)
+    cache = open_response_cache()
+    ocr, lookup = build_ocr(preparer, cache)
+    asyncio.run(run_requests(ocr, iter_pages(sink), sink, lookup))
+    print(f"Images: {preparer.stats()}")
+    preparer.close()
+    if cache is not None:
+        print(f"Response cache: {cache.stats()}")
+        cache.close()
+
+    total = sink.finalize(OUTPUT_PATH)
+    print(f"All {total} extracted texts have been saved to {OUTPUT_PATH}.")
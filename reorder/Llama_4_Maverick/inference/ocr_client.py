@@ -2,10 +2,16 @@ import os
 from langchain_groq import ChatGroq
 from langchain.schema.messages import SystemMessage
 
-def get_groq_client():
+MODEL_NAME = "meta-llama/llama-4-maverick-17b-128e-instruct"
+
+def get_groq_client(base_url=None, sdk_retries=True):
+    # base_url points the client at another endpoint, e.g. the local stub server.
+    # Without sdk_retries the caller (the request engine) is the only one retrying 429 and 5xx answers
     return ChatGroq(
         api_key=os.environ.get("GROQ_API_KEY"),
-        model_name="meta-llama/llama-4-maverick-17b-128e-instruct"
+        model_name=MODEL_NAME,
+        base_url=base_url or None,
+        max_retries=2 if sdk_retries else 0
     )
 
 def get_system_message():
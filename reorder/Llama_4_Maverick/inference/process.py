@@ -1,14 +1,42 @@
 import time
 from langchain.schema.messages import HumanMessage
 
-def perform_ocr_with_examples(image_path, client, system_message, few_shot_examples, image_file_to_base64):
-    conversation = [system_message] + few_shot_examples
+from common.prompt_prefix import PromptPrefix
+from common.response_cache import request_key
+
+INSTRUCTION = "Please extract the ordered text from this image following the demonstrated format shown."
+
+def decoding_params(client):
+    """Decoding parameters of a ChatGroq client that change its answers."""
+    return {"temperature": client.temperature, "max_tokens": client.max_tokens}
+
+def build_prompt_prefix(system_message, few_shot_examples):
+    """Build the system message and few-shot conversation shared by every request once."""
+    return PromptPrefix.build([system_message] + few_shot_examples)
+
+def ocr_cache_key(image_path, client, prefix, image_file_to_base64):
+    """Response cache key of the request for one page."""
+    return request_key(client.model_name, prefix.digest, decoding_params(client), image_path,
+                       getattr(image_file_to_base64, "variant", "source"))
+
+def lookup_cached_ocr(image_path, client, prefix, image_file_to_base64, cache):
+    """Cached answer for one page, or None; tried before the request engine spends any rate limit."""
+    return cache.get(ocr_cache_key(image_path, client, prefix, image_file_to_base64))
+
+def perform_ocr_with_examples(image_path, client, prefix, image_file_to_base64, cache=None):
+    # Rebuilding the prefix per page would serialize and hash the examples on every request
+    if not isinstance(prefix, PromptPrefix):
+        raise TypeError(f"prefix must be a PromptPrefix from build_prompt_prefix, not {type(prefix).__name__}")
+
     final_user_message = HumanMessage(
         content=[
             {"type": "image_url", "image_url": {"url": image_file_to_base64(image_path)}},
-            {"type": "text", "text": "Please extract the ordered text from this image following the demonstrated format shown."}
+            {"type": "text", "text": INSTRUCTION}
         ]
     )
-    conversation.append(final_user_message)
-    response = client.invoke(conversation)
-    return response.content.strip()
+    response = client.invoke(prefix.with_page(final_user_message))
+    text = response.content.strip()
+    # Cache hits never get here: run_requests answers them with lookup_cached_ocr
+    if cache is not None:
+        cache.put(ocr_cache_key(image_path, client, prefix, image_file_to_base64), text)
+    return text
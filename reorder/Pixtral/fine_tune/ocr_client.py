@@ -1,12 +1,16 @@
 import os
 import dotenv
 from mistralai import Mistral
+from mistralai.utils import RetryConfig
 
 dotenv.load_dotenv()
 
-def get_mistral_client():
+def get_mistral_client(server_url=None, sdk_retries=True):
     api_key = os.environ.get("MISTRAL_API_KEY")
-    return Mistral(api_key=api_key)
+    # server_url points the client at another endpoint, e.g. the local stub server.
+    # Without sdk_retries the caller (the request engine) is the only one retrying 429 and 5xx answers
+    retries = {} if sdk_retries else {"retry_config": RetryConfig("none", None, False)}
+    return Mistral(api_key=api_key, server_url=server_url or None, **retries)
 
 def upload_training_file(client, file_path):
     print(f"Uploading training file: {file_path}")
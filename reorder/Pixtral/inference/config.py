@@ -1,4 +1,20 @@
+from common.image_prep import ImagePrepConfig
+
 MODEL_ID = "ft:pixtral-12b-latest:d0e61814:20250523:ocr-reorder:8369d281"  # your fine-tuned model
 TEST_IMAGES_DIR = r"E:\\Data\\output_valid_img"
 TESTSET_JSON_PATH = r"E:\\Data\\valid_dataset.json"
 OUTPUT_JSON_PATH = "extracted_texts_valdataset_fewshot_pixtral.json"
+RESUME = True  # skip images already in the partial results of an interrupted run
+API_BASE_URL = ""  # empty uses the Mistral API; e.g. http://127.0.0.1:8001 for common.stub_chat_server
+CONCURRENCY = 4  # requests in flight
+REQUESTS_PER_MINUTE = 60  # 0 disables the request limit
+TOKENS_PER_MINUTE = 0  # 0 disables the token limit
+TOKENS_PER_REQUEST = 12000  # estimated prompt + completion tokens of one page, for TOKENS_PER_MINUTE
+MAX_RETRIES = 6  # retries of a 429/5xx answer before a page is reported as failed
+RESPONSE_CACHE_PATH = "pixtral_responses.sqlite"  # answers of unchanged requests; empty disables the cache
+RESPONSE_CACHE_MAX_MB = 512  # least recently used responses are evicted beyond this size
+EXAMPLE_CACHE_DIR = ".prompt_cache"  # encoded few-shot example images by content hash; empty disables
+# Uploads the pages unchanged; compare settings with common.image_prep_benchmark before downscaling
+IMAGE_PREP = ImagePrepConfig()
+IMAGE_CACHE_DIR = ".image_cache"  # prepared page images by source hash; empty disables
+IMAGE_WORKERS = 4  # processes preparing images; 0 prepares in the request threads
@@ -1,11 +1,17 @@
 from ..fine_tune import *
+from common.prompt_prefix import cached_image_url
+from .config import EXAMPLE_CACHE_DIR
 
-def get_few_shot_examples():
+def example_image_url(path, encode):
+    # Encoded once per image content and encoder settings, and reused by later runs
+    return cached_image_url(path, encode, EXAMPLE_CACHE_DIR, getattr(encode, "variant", "source"))
+
+def get_few_shot_examples(encode=image_file_to_base64):
     # Example 3
     example3_img_path = r"E:\\Data\\output_train_img\\doc_00c51cec52464b73f2a850591b7e5457fc5d2de1.page_2.png"
     example3_human = {
         "content": [
-            {"type": "image_url", "image_url": {"url": image_file_to_base64(example3_img_path)}}
+            {"type": "image_url", "image_url": {"url": example_image_url(example3_img_path, encode)}}
         ]
     }
     example3_ai = {
@@ -24,7 +30,7 @@ def get_few_shot_examples():
     example6_img_path = r"E:\\Data\\output_train_img\\doc_0a1ea1410d79980d9a21d3e0bd16d1c920deccff.page_15.png"
     example6_human = {
         "content": [
-            {"type": "image_url", "image_url": {"url": image_file_to_base64(example6_img_path)}}
+            {"type": "image_url", "image_url": {"url": example_image_url(example6_img_path, encode)}}
         ]
     }
     example6_ai = {
@@ -37,7 +43,7 @@ def get_few_shot_examples():
     example9_img_path = r"E:\\Data\\output_train_img\\doc_00aff3757f87ebdfa666e19cda073e0d3a30943c.page_2.png"
     example9_human = {
         "content": [
-            {"type": "image_url", "image_url": {"url": image_file_to_base64(example9_img_path)}}
+            {"type": "image_url", "image_url": {"url": example_image_url(example9_img_path, encode)}}
         ]
     }
     example9_ai = {
@@ -61,7 +67,7 @@ def get_few_shot_examples():
     example10_img_path = r"E:\\Data\\output_train_img\\doc_00b5005717fb8925b94ecc069b9ad4954590f125.page_14.png"
     example10_human = {
         "content": [
-            {"type": "image_url", "image_url": {"url": image_file_to_base64(example10_img_path)}}
+            {"type": "image_url", "image_url": {"url": example_image_url(example10_img_path, encode)}}
         ]
     }
     example10_ai = {
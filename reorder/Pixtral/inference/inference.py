@@ -1,43 +1,92 @@
 import os
 import json
-import time
+import asyncio
+from functools import partial
 from tqdm import tqdm
 
-from .config import MODEL_ID, TEST_IMAGES_DIR, TESTSET_JSON_PATH, OUTPUT_JSON_PATH
+from common.image_prep import ImagePreparer
+from common.request_engine import EngineConfig, RequestEngine
+from common.response_cache import ResponseCache
+from common.result_sink import JsonlResultSink, default_results_path
+from .config import (MODEL_ID, TEST_IMAGES_DIR, TESTSET_JSON_PATH, OUTPUT_JSON_PATH, RESUME, API_BASE_URL,
+                     CONCURRENCY, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, TOKENS_PER_REQUEST, MAX_RETRIES,
+                     RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_MB, IMAGE_PREP, IMAGE_CACHE_DIR, IMAGE_WORKERS)
 from ..fine_tune import *
 from .examples import get_few_shot_examples
-from .process import perform_ocr_with_examples
+from .process import build_prompt_prefix, lookup_cached_ocr, perform_ocr_with_examples
+
+async def run_requests(ocr, pages, sink, lookup=None):
+    """Send the pages through the request engine and write the results in input order.
+
+    Pages answered by ``lookup`` (the response cache) skip the rate limits.
+    """
+    engine = RequestEngine(EngineConfig(
+        concurrency=CONCURRENCY,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        tokens_per_minute=TOKENS_PER_MINUTE,
+        max_retries=MAX_RETRIES
+    ))
+    progress = tqdm(total=len(pages), desc="Processing images")
+    try:
+        results = engine.map(lambda page: ocr(page[1]), pages, estimate_tokens=lambda page: TOKENS_PER_REQUEST,
+                             lookup=(lambda page: lookup(page[1])) if lookup is not None else None)
+        async for (img_name, img_path), result in results:
+            progress.update()
+            if isinstance(result, Exception):
+                print(f"Error processing {img_name}: {str(result)}")
+                continue
+            sink.write(img_name, result)
+            print(f"Extracted text for {img_name}:\n{result}\n{'-'*40}")
+    finally:
+        progress.close()
+        engine.close()
+    print(f"Requests: {engine.report()}")
+
+def open_response_cache():
+    return ResponseCache(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_MB * 2**20) if RESPONSE_CACHE_PATH else None
+
+def build_ocr(encode, cache=None):
+    """OCR and cache lookup functions of one image path, sharing the client and the prompt prefix.
+
+    The lookup is None without a response cache.
+    """
+    # The request engine retries and backs off; SDK retries would multiply its attempts
+    client = get_mistral_client(API_BASE_URL, sdk_retries=False)
+    prefix = build_prompt_prefix(get_few_shot_examples(encode))
+    print(f"Prompt prefix: {len(prefix.messages)} messages, {prefix.nbytes / 2**20:.2f} MiB")
+    ocr = partial(perform_ocr_with_examples, client, prefix=prefix, model_id=MODEL_ID,
+                  image_file_to_base64=encode, cache=cache)
+    lookup = partial(lookup_cached_ocr, prefix=prefix, model_id=MODEL_ID,
+                     image_file_to_base64=encode, cache=cache) if cache is not None else None
+    return ocr, lookup
 
 def start_execution():
-    client = get_mistral_client()
-    few_shot_examples = get_few_shot_examples()
-    extracted_texts = {}
+    sink = JsonlResultSink(default_results_path(OUTPUT_JSON_PATH), resume=RESUME,
+                           run_key=f"{MODEL_ID}|{TESTSET_JSON_PATH}|{IMAGE_PREP.variant}")
 
     with open(TESTSET_JSON_PATH, "r", encoding="utf-8") as f:
         test_data = [json.loads(line) for line in f if line.strip()]
 
-    for data in tqdm(test_data, desc="Processing images"):
+    pages = []
+    for data in test_data:
         img_name = data.get("img_name")
-        if not img_name:
+        if not img_name or img_name in sink:
             continue
         img_path = os.path.join(TEST_IMAGES_DIR, img_name)
         if not os.path.exists(img_path):
             print(f"Image not found: {img_path}")
             continue
+        pages.append((img_name, img_path))
 
-        print(f"Processing {img_name}...")
-        try:
-            decoded_output = perform_ocr_with_examples(
-                client, img_path, few_shot_examples, MODEL_ID, image_file_to_base64
-            )
-            extracted_texts[img_name] = decoded_output
-            print(f"Extracted text for {img_name}:\n{decoded_output}\n{'-'*40}")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Error processing {img_name}: {str(e)}")
-
-    os.makedirs(os.path.dirname(OUTPUT_JSON_PATH), exist_ok=True)
-    with open(OUTPUT_JSON_PATH, "w", encoding="utf-8") as json_file:
-        json.dump(extracted_texts, json_file, indent=4)
-    print(f"All extracted texts have been saved to {OUTPUT_JSON_PATH}.")
+    preparer = ImagePreparer(IMAGE_PREP, IMAGE_CACHE_DIR, IMAGE_WORKERS)
+    cache = open_response_cache()
+    ocr, lookup = build_ocr(preparer, cache)
+    asyncio.run(run_requests(ocr, pages, sink, lookup))
+    print(f"Images: {preparer.stats()}")
+    preparer.close()
+    if cache is not None:
+        print(f"Response cache: {cache.stats()}")
+        cache.close()
 
+    total = sink.finalize(OUTPUT_JSON_PATH)
+    print(f"All {total} extracted texts have been saved to {OUTPUT_JSON_PATH}.")
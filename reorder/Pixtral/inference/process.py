@@ -1,11 +1,18 @@
 import time
 
-def perform_ocr_with_examples(client, image_path, few_shot_examples, model_id, image_file_to_base64):
-    system_message = (
-        "You are an OCR assistant. For every provided image, extract the text in the correct reading order. "
-        "Return your answer as a plain text string exactly as demonstrated in the examples."
-    )
-    messages = [{"role": "system", "content": system_message}]
+from common.prompt_prefix import PromptPrefix
+from common.response_cache import request_key
+
+SYSTEM_MESSAGE = (
+    "You are an OCR assistant. For every provided image, extract the text in the correct reading order. "
+    "Return your answer as a plain text string exactly as demonstrated in the examples."
+)
+INSTRUCTION = "Please extract the ordered text from this image following the demonstrated format shown."
+DECODING_PARAMS = {"temperature": 0.0, "max_tokens": 8192}
+
+def build_prompt_prefix(few_shot_examples):
+    """Build the system message and few-shot conversation shared by every request once."""
+    messages = [{"role": "system", "content": SYSTEM_MESSAGE}]
     # Add few-shot examples to the conversation
     for i in range(0, len(few_shot_examples), 2):
         human_message = few_shot_examples[i]
@@ -14,13 +21,28 @@ def perform_ocr_with_examples(client, image_path, few_shot_examples, model_id, i
         ocr_text = assistant_message["content"]
         messages.append({"role": "user", "content": [{"type": "image_url", "image_url": {"url": image_url}}]})
         messages.append({"role": "assistant", "content": ocr_text})
+    return PromptPrefix.build(messages)
+
+def ocr_cache_key(image_path, prefix, model_id, image_file_to_base64):
+    """Response cache key of the request for one page."""
+    return request_key(model_id, prefix.digest, DECODING_PARAMS, image_path,
+                       getattr(image_file_to_base64, "variant", "source"))
+
+def lookup_cached_ocr(image_path, prefix, model_id, image_file_to_base64, cache):
+    """Cached answer for one page, or None; tried before the request engine spends any rate limit."""
+    return cache.get(ocr_cache_key(image_path, prefix, model_id, image_file_to_base64))
+
+def perform_ocr_with_examples(client, image_path, prefix, model_id, image_file_to_base64, cache=None):
+    # Rebuilding the prefix per page would serialize and hash the examples on every request
+    if not isinstance(prefix, PromptPrefix):
+        raise TypeError(f"prefix must be a PromptPrefix from build_prompt_prefix, not {type(prefix).__name__}")
 
-    # Add final user message (current test image)
-    messages.append({
+    # Only the final user message (current test image) is built per request
+    messages = prefix.with_page({
         "role": "user",
         "content": [
             {"type": "image_url", "image_url": {"url": image_file_to_base64(image_path)}},
-            {"type": "text", "text": "Please extract the ordered text from this image following the demonstrated format shown."}
+            {"type": "text", "text": INSTRUCTION}
         ]
     })
 
@@ -28,7 +50,10 @@ def perform_ocr_with_examples(client, image_path, few_shot_examples, model_id, i
     response = client.chat.complete(
         model=model_id,
         messages=messages,
-        temperature=0.0,
-        max_tokens=8192
+        **DECODING_PARAMS
     )
-    return response.choices[0].message.content.strip()
+    text = response.choices[0].message.content.strip()
+    # Cache hits never get here: run_requests answers them with lookup_cached_ocr
+    if cache is not None:
+        cache.put(ocr_cache_key(image_path, prefix, model_id, image_file_to_base64), text)
+    return text
@@ -0,0 +1,5 @@
+TESTSET_JSON_PATH = r"E:\\TestData\\testset_wo_label.json"
+OUTPUT_JSON_PATH = "extracted_texts_xycut_testdata.json"
+BATCH_PAGES = 256  # pages ordered together in one vectorized pass
+MIN_CONFIDENCE = 0.0  # pages below this go to the LayoutLMv3_T5 model; 0 disables routing
+NEURAL_IMAGES_DIR = r"E:\\TestData\\testset"  # page images for pages routed to LayoutLMv3_T5
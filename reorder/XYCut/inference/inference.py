@@ -0,0 +1,61 @@
+import json
+import os
+import time
+from dataclasses import replace
+from itertools import islice
+
+from .config import TESTSET_JSON_PATH, OUTPUT_JSON_PATH, BATCH_PAGES, MIN_CONFIDENCE, NEURAL_IMAGES_DIR
+from .xycut import reorder_pages
+
+def iter_record_batches(json_path, batch_pages):
+    with open(json_path, "r", encoding="utf-8") as f:
+        records = (json.loads(line) for line in f if line.strip())
+        while True:
+            batch = list(islice(records, batch_pages))
+            if not batch:
+                return
+            yield batch
+
+def reorder_with_neural_model(records):
+    """Reorder pages with the LayoutLMv3_T5 model, as ``{img_name: text}``."""
+    from LayoutLMv3_T5.inference.inference import InferenceConfig, run_inference
+
+    routed_json = OUTPUT_JSON_PATH + ".routed.json"
+    with open(routed_json, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    # The routed pages differ from run to run, so partial results of an earlier run never apply
+    config = replace(
+        InferenceConfig(),
+        test_json=routed_json,
+        test_img_dir=NEURAL_IMAGES_DIR,
+        output_json=OUTPUT_JSON_PATH + ".neural.json",
+        resume=False
+    )
+    run_inference(config)
+    with open(config.output_json, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def start_execution():
+    extracted_texts = {}
+    low_confidence = []
+    start = time.perf_counter()
+    for batch in iter_record_batches(TESTSET_JSON_PATH, BATCH_PAGES):
+        pages = [(record["src_word_list"], record["src_wordbox_list"]) for record in batch]
+        for record, (text, confidence) in zip(batch, reorder_pages(pages)):
+            extracted_texts[record["img_name"]] = text
+            if confidence < MIN_CONFIDENCE:
+                low_confidence.append(record)
+    elapsed = time.perf_counter() - start
+    print(f"Ordered {len(extracted_texts)} pages in {elapsed:.2f}s "
+          f"({len(extracted_texts) / max(elapsed, 1e-9):.0f} pages/sec)")
+
+    if low_confidence:
+        print(f"Routing {len(low_confidence)} pages below confidence {MIN_CONFIDENCE} to LayoutLMv3_T5")
+        extracted_texts.update(reorder_with_neural_model(low_confidence))
+
+    tmp_path = OUTPUT_JSON_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as json_file:
+        json.dump(extracted_texts, json_file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, OUTPUT_JSON_PATH)
+    print(f"All extracted texts have been saved to {OUTPUT_JSON_PATH}.")
@@ -0,0 +1,151 @@
+"""Reading order from word boxes with recursive XY-cut and line grouping.
+
+The recursion runs level by level over a whole batch of pages at once:
+every region of every page is cut in the same handful of NumPy operations,
+so the Python overhead is per cut level rather than per region or page.
+Regions are kept as contiguous runs of a flat word permutation, and
+segmented running maxima (a per-region offset keeps ``maximum.accumulate``
+from leaking across regions) give the projection profile gaps of all
+regions in one pass.
+"""
+
+from itertools import chain
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+X_GAP_RATIO = 1.5  # column gutters must be at least this many line heights wide
+CUT_TOLERANCE = 0.8  # gaps at least this fraction of a region's widest gap are cut together
+LINE_OVERLAP = 0.5  # a new line starts when word centers move down this many line heights
+
+def _segment_gaps(lo: np.ndarray, hi: np.ndarray, reg: np.ndarray, starts: np.ndarray,
+                  span: float) -> np.ndarray:
+    """Gap before each interval in the projection profile of its region.
+
+    Intervals must be sorted by region, then by ``lo``. The first interval
+    of every region gets ``-inf``.
+    """
+    offset = reg * span
+    reach = np.maximum.accumulate(hi + offset) - offset
+    gaps = np.empty(len(lo))
+    gaps[1:] = lo[1:] - reach[:-1]
+    gaps[starts] = -np.inf
+    return gaps
+
+def _page_line_heights(boxes: np.ndarray, page: np.ndarray, page_starts: np.ndarray,
+                       sizes: np.ndarray) -> np.ndarray:
+    """Median word height of every page."""
+    heights = np.sort(boxes[:, 3] - boxes[:, 1] + page * (boxes[:, 3].max() + 1.0))
+    heights -= page * (boxes[:, 3].max() + 1.0)
+    low = heights[page_starts + (sizes - 1) // 2]
+    high = heights[page_starts + sizes // 2]
+    return np.maximum((low + high) / 2, 1e-6)
+
+def reading_order_batch(pages: Sequence[Sequence[Sequence[float]]]) -> List[Tuple[np.ndarray, float]]:
+    """Reading order of the words of many pages.
+
+    Each region is cut along its widest projection gap: vertically when a
+    column gutter of at least ``X_GAP_RATIO`` line heights is wider than
+    every row gap, otherwise horizontally at any row gap. All gaps close to
+    the widest one are cut together. Regions without gaps are read line by
+    line, left to right.
+
+    Args:
+        pages: For every page, ``[x0, y0, x1, y1]`` per word in any
+            consistent unit
+
+    Returns:
+        For every page, a tuple of (word indices in reading order,
+        confidence in [0, 1]). Confidence is the share of words in regions
+        XY-cut separated cleanly; words in overlapping or skewed multi-line
+        regions, which fall back to line grouping, count against it.
+    """
+    sizes = np.array([len(boxes) for boxes in pages], dtype=np.int64)
+    nonempty = np.flatnonzero(sizes)
+    results = [(np.zeros(0, dtype=np.int64), 1.0)] * len(pages)
+    if not len(nonempty):
+        return results
+    sizes = sizes[nonempty]
+    # Flattening the nested lists is much faster than np.asarray on them
+    raw = np.fromiter(chain.from_iterable(chain.from_iterable(pages[i] for i in nonempty)),
+                      dtype=np.float64, count=4 * int(sizes.sum())).reshape(-1, 4)
+    raw -= raw.min()
+    # Tolerate boxes given with swapped corners
+    boxes = np.concatenate([np.minimum(raw[:, :2], raw[:, 2:]), np.maximum(raw[:, :2], raw[:, 2:])], axis=1)
+    span = boxes.max() * 2 + 1.0
+
+    page = np.repeat(np.arange(len(sizes)), sizes)
+    page_starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    word_line_height = _page_line_heights(boxes, page, page_starts, sizes)[page]
+
+    perm = np.arange(len(boxes))
+    starts = np.zeros(len(boxes), dtype=bool)
+    starts[page_starts] = True
+    done = np.repeat(sizes == 1, sizes)
+    while not done.all():
+        # Work on the words of unfinished regions only
+        idx = np.flatnonzero(~done)
+        sub_perm, sub_starts = perm[idx], starts[idx]
+        reg = np.cumsum(sub_starts) - 1
+        region_starts = np.flatnonzero(sub_starts)
+        b = boxes[sub_perm]
+        y_order = np.argsort(reg * span + b[:, 1], kind="stable")
+        x_order = np.argsort(reg * span + b[:, 0], kind="stable")
+        y_gaps = _segment_gaps(b[y_order, 1], b[y_order, 3], reg, sub_starts, span)
+        x_gaps = _segment_gaps(b[x_order, 0], b[x_order, 2], reg, sub_starts, span)
+        best_y = np.maximum.reduceat(y_gaps, region_starts)
+        best_x = np.maximum.reduceat(x_gaps, region_starts)
+
+        line_height = word_line_height[sub_perm[region_starts]]
+        cut_x = (best_x >= X_GAP_RATIO * line_height) & (best_x > best_y)
+        cut_y = ~cut_x & (best_y > 0)
+        cutting = cut_x | cut_y
+
+        # Every order keeps regions in place, so they can be mixed per region
+        pos_x, pos_y = cut_x[reg], cut_y[reg]
+        order = np.where(pos_x, x_order, np.where(pos_y, y_order, np.arange(len(idx))))
+        gaps = np.where(pos_x, x_gaps, np.where(pos_y, y_gaps, -np.inf))
+        best = np.where(cut_x, best_x, best_y)
+        sub_starts = sub_starts | (cutting[reg] & (gaps >= CUT_TOLERANCE * best[reg]))
+        perm[idx] = sub_perm[order]
+        starts[idx] = sub_starts
+
+        # Regions that were not cut are final, and so are single words
+        child = np.cumsum(sub_starts) - 1
+        done[idx] = ~cutting[reg] | (np.bincount(child)[child] == 1)
+
+    # Read every final region line by line
+    reg = np.cumsum(starts) - 1
+    b = boxes[perm]
+    center_y = (b[:, 1] + b[:, 3]) / 2
+    by_y = np.argsort(reg * span + center_y, kind="stable")
+    new_line = starts.copy()
+    new_line[1:] |= np.diff(center_y[by_y]) > LINE_OVERLAP * word_line_height[perm[by_y]][1:]
+    line = np.cumsum(new_line)
+    perm = perm[by_y[np.argsort(line * span + b[by_y, 0], kind="stable")]]
+
+    lines_per_region = np.bincount(reg, weights=new_line)
+    tangled = np.bincount(page[perm], weights=(lines_per_region > 1)[reg], minlength=len(sizes))
+    for k, i in enumerate(nonempty):
+        start = page_starts[k]
+        results[i] = (perm[start:start + sizes[k]] - start, 1.0 - tangled[k] / sizes[k])
+    return results
+
+def reading_order(boxes: Sequence[Sequence[float]]) -> Tuple[np.ndarray, float]:
+    """Reading order of the words of one page (see ``reading_order_batch``)."""
+    return reading_order_batch([boxes])[0]
+
+def reorder_pages(pages: Sequence[Tuple[Sequence[str], Sequence[Sequence[float]]]]) -> List[Tuple[str, float]]:
+    """Join the words of many pages in geometric reading order.
+
+    Args:
+        pages: ``(src_word_list, src_wordbox_list)`` per page
+
+    Returns:
+        ``(reordered text, confidence)`` per page
+    """
+    orders = reading_order_batch([boxes for _, boxes in pages])
+    return [
+        (" ".join(words[i] for i in order), confidence)
+        for (words, _), (order, confidence) in zip(pages, orders)
+    ]
@@ -0,0 +1 @@
+# This file initializes the common module.
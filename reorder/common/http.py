@@ -0,0 +1,169 @@
+"""Minimal asyncio HTTP/1.1 server and client exchanging JSON bodies.
+
+Only what the local reorder services need: JSON request and response
+bodies with ``Content-Length``, keep-alive connections and routing on
+method and path. No TLS, chunked encoding or pipelining.
+"""
+
+import asyncio
+import json
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# A handler receives the decoded JSON body (None without a body) and
+# returns the status code and the JSON response, optionally followed by a
+# dict of extra response headers
+Handler = Callable[[Optional[Any]], Awaitable[Tuple]]
+
+class HttpError(Exception):
+    """Error answered with an HTTP status code and a JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+async def _read_message(reader: asyncio.StreamReader) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+    """Read the start line, headers and body of one HTTP message.
+
+    Returns:
+        Tuple of (start line, lower-cased headers, body), or None when the
+        peer closed the connection
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return lines[0], headers, body
+
+def _encode_message(start_line: str, payload: Any, keep_alive: bool = True,
+                    extra_headers: Tuple[str, ...] = ()) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+    head = [
+        start_line,
+        *extra_headers,
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+async def serve_json(routes: Dict[Tuple[str, str], Handler], host: str = "127.0.0.1",
+                     port: int = 8000) -> asyncio.AbstractServer:
+    """Start serving JSON handlers.
+
+    Args:
+        routes: Handlers keyed by ``(method, path)``, e.g. ``("POST", "/reorder")``
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+
+    Returns:
+        The started asyncio server
+    """
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                keep_alive = True
+                extra_headers = {}
+                try:
+                    message = await _read_message(reader)
+                    if message is None:
+                        break
+                    start_line, headers, body = message
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    method, target = start_line.split(" ")[:2]
+                    handler = routes.get((method, target.split("?", 1)[0]))
+                    if handler is None:
+                        raise HttpError(404, f"No route for {method} {target}")
+                    try:
+                        payload = json.loads(body) if body else None
+                    except ValueError:
+                        raise HttpError(400, "Body is not valid JSON")
+                    status, response, *rest = await handler(payload)
+                    extra_headers = rest[0] if rest else {}
+                except HttpError as e:
+                    status, response = e.status, {"error": e.message}
+                    # An oversized body was not read, so the stream cannot be reused
+                    keep_alive = keep_alive and e.status != 413
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:  # answered as 500, the server keeps running
+                    status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+                writer.write(_encode_message(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                                             response, keep_alive,
+                                             tuple(f"{k}: {v}" for k, v in extra_headers.items())))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
+
+class JsonHttpClient:
+    """Keep-alive JSON client for one host, reconnecting when needed.
+
+    One request is in flight per client; open several clients for
+    concurrent requests.
+    """
+
+    def __init__(self, host: str, port: int):
+        """Initialize client.
+
+        Args:
+            host: Server host
+            port: Server port
+        """
+        self.host = host
+        self.port = port
+        self.last_headers: Dict[str, str] = {}  # lower-cased headers of the last response
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method: str, path: str, payload: Any = None) -> Tuple[int, Any]:
+        """Send one request and return ``(status, decoded JSON body)``."""
+        for attempt in range(2):
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self._writer.write(_encode_message(f"{method} {path} HTTP/1.1", payload,
+                                                   extra_headers=(f"Host: {self.host}:{self.port}",)))
+                await self._writer.drain()
+                message = await _read_message(self._reader)
+                if message is None:
+                    raise ConnectionResetError("Server closed the connection")
+            except ConnectionError:
+                # A keep-alive connection may have been closed by the server
+                await self.close()
+                if attempt:
+                    raise
+                continue
+            start_line, headers, body = message
+            self.last_headers = headers
+            if headers.get("connection", "").lower() == "close":
+                await self.close()
+            return int(start_line.split(" ")[1]), json.loads(body) if body else None
+
+    async def close(self) -> None:
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._reader = self._writer = None
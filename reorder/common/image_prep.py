@@ -0,0 +1,212 @@
+"""Image preparation before upload to the hosted vision models.
+
+Pages were sent as the raw PNG bytes on disk: multi-megabyte payloads at a
+resolution the providers downscale anyway, billed in vision tokens by size.
+``ImagePreparer`` turns a page into the data URL to upload:
+
+- it downscales to a long-side limit and/or a vision-token budget (one
+  token per ``patch_size`` square),
+- converts pages without colour to grayscale (``grayscale="auto"``) or all
+  pages (``"on"``),
+- and re-encodes as PNG, JPEG or WebP.
+
+Prepared bytes are cached on disk by the SHA-256 of the source bytes and
+the preparation settings, and images are prepared in a process pool, so
+decoding and resizing run in parallel with the requests in flight. With
+the default ``ImagePrepConfig`` the source bytes are uploaded unchanged.
+"""
+
+import base64
+import hashlib
+import io
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+def source_mime_type(path: str) -> str:
+    """MIME type of an image file from its extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ['.jpg', '.jpeg']:
+        return "image/jpeg"
+    elif ext == '.png':
+        return "image/png"
+    return "application/octet-stream"
+
+def data_url(mime_type: str, data: bytes) -> str:
+    """Base64 data URL of image bytes."""
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+def image_file_to_base64(path: str) -> str:
+    """Data URL of an image file's bytes as they are on disk."""
+    with open(path, "rb") as image_file:
+        return data_url(source_mime_type(path), image_file.read())
+
+@dataclass(frozen=True)
+class ImagePrepConfig:
+    """Settings of the image preparation; the defaults upload images unchanged."""
+    max_long_side: int = 0  # pixels of the longer side; 0 keeps the size
+    max_vision_tokens: int = 0  # patches of patch_size x patch_size; 0 disables the budget
+    patch_size: int = 16  # pixels per vision token side (16 for Pixtral)
+    grayscale: str = "off"  # "off", "auto" (pages without colour) or "on"
+    format: str = ""  # "png", "jpeg" or "webp"; empty keeps the source bytes when nothing else changes
+    quality: int = 85  # JPEG/WebP quality
+    max_colour_share: float = 0.002  # share of coloured pixels up to which "auto" treats a page as gray
+
+    @property
+    def passthrough(self) -> bool:
+        """Whether the source bytes are uploaded unchanged."""
+        return not (self.max_long_side or self.max_vision_tokens or self.grayscale != "off" or self.format)
+
+    @property
+    def variant(self) -> str:
+        """Name of the settings, part of every cache key."""
+        if self.passthrough:
+            return "source"
+        return (f"long{self.max_long_side}-tok{self.max_vision_tokens}x{self.patch_size}-"
+                f"gray{self.grayscale}{self.max_colour_share:g}-{self.format or 'png'}{self.quality}")
+
+def target_size(width: int, height: int, config: ImagePrepConfig) -> Tuple[int, int]:
+    """Size after applying the long-side limit and the vision-token budget."""
+    scale = 1.0
+    if config.max_long_side:
+        scale = min(scale, config.max_long_side / max(width, height))
+    if config.max_vision_tokens:
+        p = config.patch_size
+        scale = min(scale, math.sqrt(config.max_vision_tokens * p * p / (width * height)))
+        # Rounding up to whole patches may still exceed the budget
+        while (scale > 0.01 and
+               math.ceil(width * scale / p) * math.ceil(height * scale / p) > config.max_vision_tokens):
+            scale *= 0.99
+    if scale >= 1.0:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def is_gray(image, max_colour_share: float) -> bool:
+    """Whether a page has no colour worth keeping.
+
+    A pixel is coloured when its channels differ by more than 32 levels;
+    scanner tint and JPEG noise stay below that.
+    """
+    import numpy as np
+    from PIL import Image
+
+    if image.mode in ("L", "LA", "1"):
+        return True
+    pixels = np.asarray(image.convert("RGB").resize((256, 256), Image.NEAREST), dtype=np.int16)
+    return float(((pixels.max(axis=2) - pixels.min(axis=2)) > 32).mean()) <= max_colour_share
+
+def prepare_image(data: bytes, config: ImagePrepConfig) -> Tuple[str, bytes]:
+    """Downscale and re-encode image bytes.
+
+    Args:
+        data: Source image bytes
+        config: Preparation settings
+
+    Returns:
+        MIME type and the prepared bytes
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    size = target_size(image.width, image.height, config)
+    if size != image.size:
+        image = image.convert("RGB") if image.mode not in ("RGB", "L") else image
+        image = image.resize(size, Image.LANCZOS)
+    if config.grayscale == "on" or (config.grayscale == "auto" and is_gray(image, config.max_colour_share)):
+        image = image.convert("L")
+    fmt = config.format or "png"
+    if fmt in ("jpeg", "webp") and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    out = io.BytesIO()
+    if fmt == "png":
+        image.save(out, format="PNG")
+    else:
+        image.save(out, format=fmt.upper(), quality=config.quality)
+    return MIME_TYPES[fmt], out.getvalue()
+
+def _prepare_cached(path: str, config: ImagePrepConfig, cache_dir: str) -> Tuple[str, bytes, int, bool]:
+    """Prepare one file, reading and filling the disk cache.
+
+    Returns:
+        MIME type, prepared bytes, source size and whether the cache hit
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    fmt = config.format or "png"
+    key = hashlib.sha256(data + config.variant.encode("utf-8")).hexdigest()
+    cached = os.path.join(cache_dir, f"{key}.{fmt}") if cache_dir else ""
+    if cached and os.path.exists(cached):
+        with open(cached, "rb") as f:
+            return MIME_TYPES[fmt], f.read(), len(data), True
+    mime_type, prepared = prepare_image(data, config)
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename, so a concurrent or interrupted run never reads a partial image
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(prepared)
+        os.replace(tmp, cached)
+    return mime_type, prepared, len(data), False
+
+class ImagePreparer:
+    """Drop-in replacement of ``image_file_to_base64`` that prepares images first.
+
+    Calls may come from many threads at once (the request engine's
+    workers); each waits for its image from the process pool.
+    """
+
+    def __init__(self, config: ImagePrepConfig, cache_dir: str = "", workers: int = 0):
+        """Initialize preparer.
+
+        Args:
+            config: Preparation settings
+            cache_dir: Directory of the prepared images; empty disables the cache
+            workers: Processes preparing images; 0 prepares in the calling thread
+        """
+        self.config = config
+        self.cache_dir = cache_dir
+        self.variant = config.variant
+        self.counts = {"images": 0, "cache_hits": 0, "source_bytes": 0, "prepared_bytes": 0}
+        self._lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(max_workers=workers) if workers and not config.passthrough else None
+
+    def prepare(self, path: str) -> Tuple[str, bytes]:
+        """MIME type and bytes to upload for an image file."""
+        if self.config.passthrough:
+            with open(path, "rb") as f:
+                data = f.read()
+            mime_type, prepared, source_size, hit = source_mime_type(path), data, len(data), False
+        elif self._pool is not None:
+            mime_type, prepared, source_size, hit = self._pool.submit(
+                _prepare_cached, path, self.config, self.cache_dir).result()
+        else:
+            mime_type, prepared, source_size, hit = _prepare_cached(path, self.config, self.cache_dir)
+        with self._lock:
+            self.counts["images"] += 1
+            self.counts["cache_hits"] += hit
+            self.counts["source_bytes"] += source_size
+            self.counts["prepared_bytes"] += len(prepared)
+        return mime_type, prepared
+
+    def __call__(self, path: str) -> str:
+        """Data URL of the prepared image."""
+        return data_url(*self.prepare(path))
+
+    def stats(self) -> Dict[str, Any]:
+        """Images prepared, cache hits and bytes before and after preparation."""
+        with self._lock:
+            counts = dict(self.counts)
+        counts["ratio"] = round(counts["prepared_bytes"] / counts["source_bytes"], 4) if counts["source_bytes"] else 1.0
+        return counts
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
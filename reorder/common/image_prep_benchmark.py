@@ -0,0 +1,166 @@
+"""Upload bytes, request latency and BLEU of image preparation settings.
+
+The first ``--pages`` pages of a labelled set (NDJSON with ``img_name`` and
+``ordered_src_doc``) are sent through a provider once per preset, without
+the response cache, and the answers are scored with
+``evaluation/reorder_bluescore.py``. With ``--offline`` the images are only
+prepared, and bytes, vision tokens and preparation time are reported
+without calling a provider. Run from ``reorder/``::
+
+    python -m common.image_prep_benchmark --model Pixtral_12B --valid-json valid_dataset.json \\
+        --img-dir valid_images --pages 50 --presets source long1024 long1024-jpeg
+    python -m common.image_prep_benchmark --offline --valid-json valid_dataset.json --img-dir valid_images
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .image_prep import ImagePrepConfig, ImagePreparer
+from .request_engine import EngineConfig, RequestEngine
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PRESETS = {
+    "source": ImagePrepConfig(),
+    "long1024": ImagePrepConfig(max_long_side=1024),
+    "long1024-gray": ImagePrepConfig(max_long_side=1024, grayscale="auto"),
+    "long1024-jpeg": ImagePrepConfig(max_long_side=1024, format="jpeg", quality=85),
+    "long1024-gray-webp": ImagePrepConfig(max_long_side=1024, grayscale="auto", format="webp", quality=80),
+    "long768-gray-jpeg": ImagePrepConfig(max_long_side=768, grayscale="auto", format="jpeg", quality=85),
+    "tokens2048-jpeg": ImagePrepConfig(max_vision_tokens=2048, format="jpeg", quality=85),
+}
+
+def vision_tokens(data: bytes, patch_size: int) -> int:
+    """Patches of ``patch_size`` pixels covering an image."""
+    from PIL import Image
+
+    width, height = Image.open(io.BytesIO(data)).size
+    return math.ceil(width / patch_size) * math.ceil(height / patch_size)
+
+def load_pages(valid_json: str, img_dir: str, limit: int):
+    """``(img_name, img_path)`` of the first ``limit`` pages with an image, and their records."""
+    pages, records = [], []
+    with open(valid_json, "r", encoding="utf-8") as f:
+        for line in f:
+            if len(pages) >= limit:
+                break
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            img_path = os.path.join(img_dir, record.get("img_name", ""))
+            if os.path.isfile(img_path):
+                pages.append((record["img_name"], img_path))
+                records.append(record)
+    return pages, records
+
+def run_offline(pages, presets, workers: int, patch_size: int) -> None:
+    print(f"{'preset':>20} {'KiB/page':>9} {'vs source':>10} {'tokens/page':>12} {'ms/page':>8}")
+    for name in presets:
+        preparer = ImagePreparer(PRESETS[name], cache_dir="", workers=workers)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as threads:
+            prepared = list(threads.map(lambda page: preparer.prepare(page[1]), pages))
+        seconds = time.perf_counter() - start
+        preparer.close()
+        total = sum(len(data) for _, data in prepared)
+        source_bytes = preparer.stats()["source_bytes"]
+        tokens = statistics.mean(vision_tokens(data, patch_size) for _, data in prepared)
+        print(f"{name:>20} {total / len(pages) / 1024:9.0f} {total / source_bytes:10.2%} {tokens:12.0f} "
+              f"{seconds * 1000 / len(pages):8.1f}")
+
+async def _requests(ocr, pages, engine_config: EngineConfig):
+    latencies, predictions, failed = [], {}, 0
+
+    def timed(page):
+        start = time.perf_counter()
+        text = ocr(page[1])
+        latencies.append(time.perf_counter() - start)
+        return text
+
+    engine = RequestEngine(engine_config)
+    try:
+        async for (img_name, _), result in engine.map(timed, pages):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"Error processing {img_name}: {result}")
+            else:
+                predictions[img_name] = result
+    finally:
+        engine.close()
+    return predictions, latencies, failed
+
+def run_online(args, pages, records) -> None:
+    if args.model == "Pixtral_12B":
+        from Pixtral.inference import inference
+    else:
+        from Llama_4_Maverick.inference import inference
+    sys.path.insert(0, REPO_ROOT)
+    from evaluation.reorder_bluescore import calculate_bleu_scores
+
+    engine_config = EngineConfig(
+        concurrency=inference.CONCURRENCY,
+        requests_per_minute=inference.REQUESTS_PER_MINUTE,
+        tokens_per_minute=inference.TOKENS_PER_MINUTE,
+        max_retries=inference.MAX_RETRIES
+    )
+    results = {}
+    for name in args.presets:
+        print(f"=== {name} ===")
+        preparer = ImagePreparer(PRESETS[name], cache_dir="", workers=args.workers)
+        ocr, _ = inference.build_ocr(preparer)
+        predictions, latencies, failed = asyncio.run(_requests(ocr, pages, engine_config))
+        stats = preparer.stats()
+        preparer.close()
+        scores = calculate_bleu_scores(predictions, records)
+        results[name] = {
+            "kib": stats["prepared_bytes"] / max(stats["images"], 1) / 1024,
+            "ratio": stats["ratio"],
+            "p50": statistics.median(latencies) if latencies else 0.0,
+            "p90": statistics.quantiles(latencies, n=10)[-1] if len(latencies) > 1 else 0.0,
+            "bleu": sum(scores.values()) / max(len(scores), 1),
+            "failed": failed,
+        }
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+            with open(os.path.join(args.out_dir, f"predictions_{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(predictions, f, ensure_ascii=False, indent=2)
+
+    print()
+    print(f"{'preset':>20} {'KiB/page':>9} {'vs source':>10} {'p50 s':>7} {'p90 s':>7} {'BLEU':>7} {'failed':>7}")
+    baseline = results[args.presets[0]]["bleu"]
+    for name, r in results.items():
+        print(f"{name:>20} {r['kib']:9.0f} {r['ratio']:10.2%} {r['p50']:7.2f} {r['p90']:7.2f} "
+              f"{r['bleu']:7.4f} {r['failed']:7d}  BLEU delta {r['bleu'] - baseline:+.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="Pixtral_12B", choices=["Pixtral_12B", "Llama_4_Maverick"])
+    parser.add_argument("--valid-json", required=True, help="NDJSON with img_name and ordered_src_doc")
+    parser.add_argument("--img-dir", required=True)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--presets", nargs="+", default=list(PRESETS), choices=list(PRESETS),
+                        help="the first preset is the BLEU baseline")
+    parser.add_argument("--workers", type=int, default=4, help="image preparation processes")
+    parser.add_argument("--patch-size", type=int, default=16, help="pixels per vision token side, for --offline")
+    parser.add_argument("--offline", action="store_true", help="only prepare the images; no requests")
+    parser.add_argument("--out-dir", default="", help="write the predictions of every preset here")
+    args = parser.parse_args()
+
+    pages, records = load_pages(args.valid_json, args.img_dir, args.pages)
+    if not pages:
+        raise SystemExit(f"No images of {args.valid_json} found in {args.img_dir}")
+    if args.offline:
+        run_offline(pages, args.presets, args.workers, args.patch_size)
+    else:
+        run_online(args, pages, records)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Immutable few-shot prompt prefix shared by every request of an inference run.
+
+The system message and the few-shot examples are the same for every page,
+but they were rebuilt, and for the response cache re-serialized and
+re-hashed, on every request. ``PromptPrefix`` is built once: it holds the
+prefix messages, their canonical JSON serialization and its SHA-256
+digest. A request appends the page message to the prefix, so only the page
+is built and hashed per call.
+
+The prefix messages come first and are byte-identical on every request,
+which is what automatic server-side prompt caching keys on. Neither the
+Mistral nor the Groq chat endpoint takes an explicit cache marker, so a
+stable prefix is all a client can do.
+
+The encoded example images are cached on disk by the SHA-256 of the image
+bytes, so startup skips the base64 encoding (and any resizing done by the
+encoder) of unchanged examples. ``common.prompt_prefix_benchmark`` compares
+the per-request cost with the old prompt assembly.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Callable, List, Sequence, Tuple
+
+from .response_cache import canonical, file_digest
+
+def cached_image_url(path: str, encode: Callable[[str], str], cache_dir: str, variant: str = "") -> str:
+    """Data URL of an image, cached on disk by the image's content hash.
+
+    Args:
+        path: Image file
+        encode: Function turning an image path into a data URL
+        cache_dir: Directory of the cached URLs; empty disables the cache
+        variant: Name of the encoding settings, part of the cache key, so
+            URLs encoded differently are kept apart
+
+    Returns:
+        The data URL
+    """
+    if not cache_dir:
+        return encode(path)
+    key = hashlib.sha256(f"{file_digest(path)}:{variant}".encode("utf-8")).hexdigest()
+    cached = os.path.join(cache_dir, f"{key}.url")
+    if os.path.exists(cached):
+        with open(cached, "r", encoding="ascii") as f:
+            return f.read()
+    url = encode(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write then rename, so a concurrent or interrupted run never reads half a URL
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(url)
+    os.replace(tmp, cached)
+    return url
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """Prefix messages with their serialization and digest.
+
+    The messages are shared by all requests and must not be modified.
+    """
+    messages: Tuple[Any, ...]  # dicts or LangChain messages, in prompt order
+    serialized: bytes  # canonical JSON of the messages
+    digest: str  # SHA-256 of ``serialized``, the prompt part of the response cache key
+
+    @classmethod
+    def build(cls, messages: Sequence[Any]) -> "PromptPrefix":
+        """Serialize and hash the prefix messages once."""
+        serialized = json.dumps(canonical(list(messages)), sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return cls(tuple(messages), serialized, hashlib.sha256(serialized).hexdigest())
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the serialized prefix."""
+        return len(self.serialized)
+
+    def with_page(self, *page_messages: Any) -> List[Any]:
+        """Messages of one request: the shared prefix followed by the page."""
+        return [*self.messages, *page_messages]
@@ -0,0 +1,111 @@
+"""Per-request cost of the old and the new few-shot prompt assembly.
+
+The old assembly rebuilt the system message and few-shot examples, and
+re-serialized and re-hashed them for the response cache key, on every
+request; the new one appends the page to a ``PromptPrefix`` built once.
+Without ``--examples`` and ``--page`` synthetic noise images stand in for
+scanned pages. Run from ``reorder/``::
+
+    python -m common.prompt_prefix_benchmark --examples a.png b.png c.png d.png --page page.png
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from .prompt_prefix import PromptPrefix, cached_image_url
+from .response_cache import canonical, request_key
+
+def encode_png(path: str) -> str:
+    """Data URL of a PNG file's bytes."""
+    with open(path, "rb") as f:
+        return "data:image/png;base64," + base64.b64encode(f.read()).decode("ascii")
+
+def make_images(directory: str, count: int, size: int) -> List[str]:
+    """Write ``count`` synthetic page images of height ``size`` and return their paths."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        # Noise stands in for a scanned page; it does not compress, like photos of text
+        pixels = rng.integers(0, 256, (size, int(size * 0.77), 3), dtype=np.uint8)
+        path = os.path.join(directory, f"example_{i}.png")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--examples", nargs="*", default=[], help="few-shot example images; synthetic if empty")
+    parser.add_argument("--page", default="", help="page image; synthetic if empty")
+    parser.add_argument("--size", type=int, default=1600, help="height of the synthetic images")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    synthetic = make_images(workdir, 5, args.size) if not (args.examples and args.page) else []
+    examples = args.examples or synthetic[:4]
+    page = args.page or synthetic[4]
+    system = "You are an OCR assistant. Extract the text in the correct reading order."
+    params = {"temperature": 0.0, "max_tokens": 8192}
+    instruction = {"type": "text", "text": "Please extract the ordered text from this image."}
+
+    start = time.perf_counter()
+    few_shot = []
+    for path in examples:
+        few_shot.append({"content": [{"type": "image_url", "image_url": {"url": encode_png(path)}}]})
+        few_shot.append({"content": "Ordered Text output: ..."})
+    startup_before = time.perf_counter() - start
+    cache_dir = os.path.join(workdir, "prompt_cache")
+    for _ in range(2):  # the first pass fills the image cache
+        start = time.perf_counter()
+        urls = [cached_image_url(path, encode_png, cache_dir) for path in examples]
+        startup_after = time.perf_counter() - start
+    start = time.perf_counter()
+    messages = [{"role": "system", "content": system}]
+    for url in urls:
+        messages.append({"role": "user", "content": [{"type": "image_url", "image_url": {"url": url}}]})
+        messages.append({"role": "assistant", "content": "Ordered Text output: ..."})
+    prefix = PromptPrefix.build(messages)
+    build = time.perf_counter() - start
+    page_url = encode_png(page)
+
+    def before():
+        # The per-request assembly the inference loops did before the prefix
+        prompt = json.dumps(canonical([system, few_shot]), sort_keys=True, ensure_ascii=False)
+        key = request_key("model", hashlib.sha256(prompt.encode("utf-8")).hexdigest(), params, page)
+        messages = [{"role": "system", "content": system}]
+        for i in range(0, len(few_shot), 2):
+            url = few_shot[i]["content"][0]["image_url"]["url"]
+            messages.append({"role": "user", "content": [{"type": "image_url", "image_url": {"url": url}}]})
+            messages.append({"role": "assistant", "content": few_shot[i + 1]["content"]})
+        messages.append({"role": "user", "content": [{"type": "image_url", "image_url": {"url": page_url}},
+                                                     instruction]})
+        return key, messages, prompt.encode("utf-8")
+
+    def after():
+        key = request_key("model", prefix.digest, params, page)
+        page_message = {"role": "user", "content": [{"type": "image_url", "image_url": {"url": page_url}},
+                                                    instruction]}
+        return key, prefix.with_page(page_message), json.dumps(page_message).encode("utf-8")
+
+    print(f"Examples: {startup_before * 1e3:.0f} ms encoding, {startup_after * 1e3:.0f} ms from the image cache")
+    print(f"Prefix: {len(prefix.messages)} messages, {prefix.nbytes / 2**20:.2f} MiB, built once in {build * 1e3:.0f} ms")
+    print(f"{'assembly':>8} {'ms/request':>11} {'serialized by us':>17} {'request payload':>16}")
+    for name, assemble in (("before", before), ("after", after)):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            _, messages, ours = assemble()
+        seconds = (time.perf_counter() - start) / args.requests
+        payload = len(json.dumps({"model": "model", "messages": messages, **params}).encode("utf-8"))
+        print(f"{name:>8} {seconds * 1e3:11.2f} {len(ours) / 2**20:13.2f} MiB {payload / 2**20:12.2f} MiB")
+
+if __name__ == "__main__":
+    main()
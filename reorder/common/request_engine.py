@@ -0,0 +1,248 @@
+"""Concurrent, rate-limited request engine for the hosted VLM inference loops.
+
+The Pixtral and Llama 4 loops send one chat request per page. The engine
+keeps up to ``concurrency`` requests in flight and spaces them with token
+buckets on requests/min and tokens/min. It retries 429 and 5xx answers
+with exponential backoff and full jitter, honouring ``Retry-After``, and
+yields the results in input order. Provider calls may be coroutines or
+blocking SDK calls; blocking calls run in worker threads. A ``lookup``
+answers an item locally (e.g. from the response cache) before it takes any
+rate-limit budget or request slot.
+"""
+
+import asyncio
+import inspect
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Tuple
+
+@dataclass
+class EngineConfig:
+    """Configuration of the request engine."""
+    concurrency: int = 8  # requests in flight
+    requests_per_minute: float = 60.0  # 0 disables the request limit
+    tokens_per_minute: float = 0.0  # 0 disables the token limit
+    burst_seconds: float = 1.0  # seconds of budget that may be spent at once
+    max_retries: int = 6  # retries of a 429/5xx answer before the page fails
+    backoff_base: float = 1.0  # seconds before the first retry, doubled per retry
+    backoff_max: float = 60.0  # longest single backoff
+
+class TokenBucket:
+    """Async token bucket refilled at ``per_minute / 60`` tokens per second.
+
+    Waiters are served in arrival order. A request larger than the bucket
+    is let through once the bucket is full and leaves it in debt, so large
+    requests are delayed but never starved.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0):
+        """Initialize bucket.
+
+        Args:
+            per_minute: Sustained tokens per minute
+            burst_seconds: Seconds of refill the bucket holds
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.waited = 0.0  # seconds spent waiting for tokens
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def hold(self, seconds: float) -> None:
+        """Hand out no tokens for the next ``seconds`` (after a 429)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until ``amount`` tokens are available and take them."""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = self._refill()
+                need = min(amount, self.capacity)
+                if now >= self._blocked_until and self.tokens >= need:
+                    self.tokens -= amount
+                    break
+                await asyncio.sleep(max(self._blocked_until - now, (need - self.tokens) / self.rate, 0.001))
+        self.waited += time.monotonic() - start
+
+def response_status(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK or client exception, if any."""
+    for obj in (exc, getattr(exc, "response", None), getattr(exc, "raw_response", None)):
+        for attr in ("status_code", "status"):
+            value = getattr(obj, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """``Retry-After`` seconds of an exception's response, if any."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        for response in (getattr(exc, "response", None), getattr(exc, "raw_response", None)):
+            headers = getattr(response, "headers", None)
+            if headers is not None and headers.get("retry-after") is not None:
+                value = headers.get("retry-after")
+                break
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a failed request should be retried: 429, 5xx or a dropped connection."""
+    status = response_status(exc)
+    if status is None:
+        return isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError))
+    return status == 429 or status >= 500
+
+class RequestEngine:
+    """Runs provider calls concurrently under rate limits and retries.
+
+    Use ``call`` for a single request and ``map`` for a whole dataset. The
+    engine owns a thread pool for blocking calls; ``close`` it when done.
+    """
+
+    def __init__(self, config: EngineConfig, rng: Callable[[], float] = random.random):
+        """Initialize engine.
+
+        Args:
+            config: Concurrency, rate limit and retry settings
+            rng: Source of jitter in [0, 1)
+        """
+        self.config = config
+        self.rng = rng
+        self.requests = TokenBucket(config.requests_per_minute, config.burst_seconds) \
+            if config.requests_per_minute > 0 else None
+        self.tokens = TokenBucket(config.tokens_per_minute, config.burst_seconds) \
+            if config.tokens_per_minute > 0 else None
+        self.stats: Dict[str, Any] = {"requests": 0, "retries": 0, "failed": 0, "looked_up": 0, "statuses": {}}
+        self._slots = asyncio.Semaphore(config.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=config.concurrency, thread_name_prefix="vlm-request")
+
+    def backoff(self, attempt: int, after: Optional[float] = None) -> float:
+        """Seconds to wait before retry ``attempt`` (0-based): full jitter, at least ``after``."""
+        delay = min(self.config.backoff_max, self.config.backoff_base * 2 ** attempt) * self.rng()
+        return max(delay, after or 0.0)
+
+    async def call(self, fn: Callable, *args, tokens: float = 0.0,
+                   lookup: Optional[Callable] = None) -> Any:
+        """Run one provider call under the rate limits, retrying failures.
+
+        Args:
+            fn: Coroutine function or blocking function making the request
+            *args: Arguments of ``fn``
+            tokens: Estimated tokens of the request, for the tokens/min limit
+            lookup: Blocking function of ``*args`` returning a local answer
+                or None; a local answer is returned without calling ``fn``
+
+        Returns:
+            The answer of ``lookup`` or the result of ``fn``
+
+        Raises:
+            Exception: The last error once it is not retryable or the retries
+                are used up
+        """
+        loop = asyncio.get_running_loop()
+        if lookup is not None:
+            # Runs in the loop's default executor, so lookups never queue behind requests in flight
+            result = await loop.run_in_executor(None, partial(lookup, *args))
+            if result is not None:
+                self.stats["looked_up"] += 1
+                return result
+        attempt = 0
+        while True:
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None and tokens:
+                await self.tokens.acquire(tokens)
+            async with self._slots:
+                self.stats["requests"] += 1
+                try:
+                    if inspect.iscoroutinefunction(fn):
+                        return await fn(*args)
+                    return await loop.run_in_executor(self._executor, partial(fn, *args))
+                except Exception as e:
+                    status = response_status(e)
+                    statuses = self.stats["statuses"]
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if not is_retryable(e) or attempt >= self.config.max_retries:
+                        self.stats["failed"] += 1
+                        raise
+                    delay = self.backoff(attempt, retry_after(e))
+                    if status == 429 and self.requests is not None:
+                        # The provider's window is full for everyone, not just this request
+                        self.requests.hold(delay)
+            self.stats["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _settled(self, fn: Callable, item: Any, tokens: float, lookup: Optional[Callable]) -> Any:
+        try:
+            return await self.call(fn, item, tokens=tokens, lookup=lookup)
+        except Exception as e:
+            return e
+
+    async def map(self, fn: Callable, items: Iterable[Any],
+                  estimate_tokens: Optional[Callable[[Any], float]] = None,
+                  lookup: Optional[Callable[[Any], Any]] = None) -> AsyncIterator[Tuple[Any, Any]]:
+        """Call ``fn(item)`` for every item and yield the results in input order.
+
+        At most ``2 * concurrency`` items are started ahead of the oldest
+        unfinished one, so a slow page holds back a bounded amount of work.
+
+        Args:
+            fn: Coroutine function or blocking function of one item
+            items: Inputs, consumed lazily
+            estimate_tokens: Estimated tokens of an item's request
+            lookup: Local answer of an item or None, tried before ``fn``
+                and outside the rate limits
+
+        Yields:
+            ``(item, result)``, where result is the exception of a failed item
+        """
+        source = iter(items)
+        window = deque()
+
+        def fill():
+            while len(window) < 2 * self.config.concurrency:
+                try:
+                    item = next(source)
+                except StopIteration:
+                    return
+                tokens = estimate_tokens(item) if estimate_tokens is not None else 0.0
+                window.append((item, asyncio.ensure_future(self._settled(fn, item, tokens, lookup))))
+
+        fill()
+        try:
+            while window:
+                item, task = window.popleft()
+                result = await task
+                fill()
+                yield item, result
+        finally:
+            for _, task in window:
+                task.cancel()
+
+    def report(self) -> Dict[str, Any]:
+        """Request counts, retries, failures, local answers, answer statuses and rate-limit waits."""
+        return {
+            **self.stats,
+            "request_limit_wait": round(self.requests.waited, 2) if self.requests is not None else 0.0,
+            "token_limit_wait": round(self.tokens.waited, 2) if self.tokens is not None else 0.0,
+        }
+
+    def close(self) -> None:
+        """Shut down the worker threads."""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,146 @@
+"""Content-addressed on-disk cache of hosted VLM responses.
+
+Re-running the Pixtral or Llama 4 inference re-sends every page, although
+the answer to an unchanged request is already known. Responses are stored
+in SQLite under a SHA-256 key over everything that decides the answer:
+model id, the digest of the prompt prefix (system message and few-shot
+examples), decoding parameters and the bytes of the page image. Paths and
+file names are not part of the key, so a renamed or moved image still hits.
+The cache is bounded by the size of the stored responses and evicts the
+least recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+def canonical(obj: Any) -> Any:
+    """JSON-serializable form of messages given as dicts or LangChain messages."""
+    if isinstance(obj, dict):
+        return {str(k): canonical(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonical(v) for v in obj]
+    if hasattr(obj, "content"):
+        return {"type": getattr(obj, "type", type(obj).__name__), "content": canonical(obj.content)}
+    return obj
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def request_key(model_id: str, prompt_digest: str, params: Dict[str, Any], image_path: str,
+                image_variant: str = "source") -> str:
+    """Cache key of one OCR request.
+
+    Args:
+        model_id: Provider model id
+        prompt_digest: ``PromptPrefix.digest`` of the system message and
+            few-shot examples
+        params: Decoding parameters (temperature, max_tokens, ...)
+        image_path: Page image; only its bytes enter the key
+        image_variant: ``ImagePreparer.variant`` of the uploaded image
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    key = json.dumps([model_id, prompt_digest, canonical(params), file_digest(image_path), image_variant],
+                     sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """SQLite response store with size-bounded LRU eviction.
+
+    Safe to share between the worker threads of the request engine. Hit and
+    miss counts cover the lifetime of the object; entry count and size are
+    read from the database.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 2**20):
+        """Open or create the cache.
+
+        Args:
+            path: SQLite database file
+            max_bytes: Largest total size of the stored responses
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Stored response of ``key``, or None, marking it as recently used."""
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response and evict the least recently used ones over the size limit."""
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, response, size, now, now)
+                )
+                self._bytes += size - (old[0] if old else 0)
+                while self._bytes > self.max_bytes:
+                    victim = self._db.execute(
+                        "SELECT key, size FROM responses WHERE key != ? ORDER BY accessed LIMIT 1", (key,)
+                    ).fetchone()
+                    if victim is None:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (victim[0],))
+                    self._bytes -= victim[1]
+                    self.evictions += 1
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Hits, misses, hit rate, evictions, entries and stored bytes."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._bytes,
+        }
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
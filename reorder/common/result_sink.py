@@ -0,0 +1,174 @@
+"""Crash-safe, resumable result files shared by the reorder inference loops."""
+
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+RESULTS_SUFFIX = ".partial.jsonl"
+
+def default_results_path(output_json: str) -> str:
+    """Return the JSONL results path used for a final JSON output path."""
+    return output_json + RESULTS_SUFFIX
+
+def iter_results(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the complete records of a results file.
+
+    A record cut off by a crash is the last line and has no trailing newline;
+    it is skipped.
+
+    Args:
+        path: JSONL results file
+
+    Yields:
+        Record dictionaries with at least ``img_name`` and ``text``
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            if line.strip():
+                record = json.loads(line)
+                # The header naming the run has no img_name
+                if "img_name" in record:
+                    yield record
+
+class JsonlResultSink:
+    """Append-only JSONL file holding one ``{"img_name", "text"}`` record per page.
+
+    Every record is flushed when written and the file is fsynced every
+    ``fsync_every`` records or ``fsync_interval`` seconds, so a crash loses at
+    most the pages since the last sync. With ``resume`` the existing records
+    are kept and their ``img_name``s can be skipped (``img_name in sink``);
+    otherwise the file is started over. ``finalize`` turns the records into
+    the ``{img_name: text}`` JSON the translation stage reads and deletes the
+    file, so only an interrupted run is ever resumed.
+
+    ``run_key`` names what produced the records (model, checkpoint, test
+    set, ...). It is stored in a header line, and a file left by a run with
+    another key is started over instead of resumed.
+    """
+
+    def __init__(self, path: str, resume: bool = True, fsync_every: int = 100,
+                 fsync_interval: float = 30.0, run_key: str = ""):
+        """Open the results file.
+
+        Args:
+            path: JSONL results file
+            resume: Whether to keep existing results and skip their pages
+            fsync_every: Records written between fsyncs
+            fsync_interval: Longest time in seconds between fsyncs
+            run_key: Identity of the run; results of another run are not resumed
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.done = set()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            valid_bytes = 0
+            stored_key = ""
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    valid_bytes += len(line)
+                    if line.strip():
+                        record = json.loads(line)
+                        if "img_name" in record:
+                            self.done.add(record["img_name"])
+                        else:
+                            stored_key = record.get("run_key", "")
+            if stored_key != run_key:
+                print(f"Not resuming {path}: it holds results of run {stored_key!r}, not {run_key!r}")
+                resume = False
+                self.done.clear()
+            else:
+                # Drop a record cut off by a crash so new records start on a fresh line
+                with open(path, "r+b") as f:
+                    f.truncate(valid_bytes)
+                if self.done:
+                    print(f"Resuming: {len(self.done)} pages already in {path}")
+            new_file = not resume
+        else:
+            new_file = True
+
+        self._file = open(path, "w" if new_file else "a", encoding="utf-8")
+        if new_file:
+            self._file.write(json.dumps({"run_key": run_key}, ensure_ascii=False) + "\n")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def __contains__(self, img_name: str) -> bool:
+        return img_name in self.done
+
+    def __len__(self) -> int:
+        return len(self.done)
+
+    def __enter__(self) -> "JsonlResultSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, img_name: str, text: str, **extra: Any) -> None:
+        """Append the result of one page.
+
+        Args:
+            img_name: Page identifier
+            text: Reordered text
+            **extra: Additional JSON-serializable fields stored with the record
+        """
+        record = {"img_name": img_name, "text": text, **extra}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.done.add(img_name)
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+    def sync(self) -> None:
+        """Force written records to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        """Sync and close the file."""
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def finalize(self, output_json: str, sort_key: Optional[Callable[[Dict], Any]] = None,
+                 indent: Optional[int] = 4) -> int:
+        """Close the sink and write all results as one ``{img_name: text}`` JSON.
+
+        The JSON is written to a temporary file and renamed, so it is either
+        complete or absent. A page written twice keeps its latest text. The
+        results file is deleted once the JSON is in place.
+
+        Args:
+            output_json: Final JSON path
+            sort_key: Optional key ordering the records (default: write order)
+            indent: JSON indentation
+
+        Returns:
+            Number of pages in the JSON
+        """
+        self.close()
+        records = list(iter_results(self.path))
+        if sort_key is not None:
+            records.sort(key=sort_key)
+        results = {record["img_name"]: record["text"] for record in records}
+
+        tmp_path = output_json + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, output_json)
+        os.remove(self.path)
+        return len(results)
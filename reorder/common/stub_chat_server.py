@@ -0,0 +1,201 @@
+"""Local stand-in for the Mistral and Groq chat completion endpoints.
+
+Answers ``POST /v1/chat/completions`` (Mistral) and
+``POST /openai/v1/chat/completions`` (Groq) with OpenAI-style completions,
+after a configurable latency. It enforces its own requests/min limit with
+429 answers carrying ``Retry-After`` and fails a share of requests with 500
+or 503, so the request engine's concurrency, rate limiting and retries can
+be exercised without an API key. The reply text is derived from the last
+user message, which lets callers check that results come back in order.
+
+Serve it and point ``API_BASE_URL`` of the Pixtral or Llama 4 inference
+config at it, or run the engine against it directly. From ``reorder/``::
+
+    python -m common.stub_chat_server --port 8001 --latency 0.5 --rpm 120 --error-rate 0.05
+    python -m common.stub_chat_server --check 200 --concurrency 16 --latency 0.2 --rpm 600
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections import deque
+from typing import Any, List, Optional
+
+from .http import HttpError, JsonHttpClient, serve_json
+from .request_engine import EngineConfig, RequestEngine
+
+CHAT_PATHS = ("/v1/chat/completions", "/openai/v1/chat/completions")
+
+def _message_text(message: dict) -> str:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+def stub_reply(messages: List[dict]) -> str:
+    """Reply of the stub to a conversation: a digest of its last user message."""
+    last = next((m for m in reversed(messages) if m.get("role") == "user"), {})
+    return "stub " + hashlib.sha1(_message_text(last).encode("utf-8")).hexdigest()[:12]
+
+class StubChatServer:
+    """Chat completion handler with latency, a rate limit and injected failures."""
+
+    def __init__(self, latency: float = 0.2, requests_per_minute: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        """Initialize stub.
+
+        Args:
+            latency: Seconds before every answer
+            requests_per_minute: Requests accepted per sliding minute; 0 accepts all
+            error_rate: Share of accepted requests failed with 500 or 503
+            seed: Seed of the failure injection
+        """
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.counts = {"requests": 0, "ok": 0, "rate_limited": 0, "failed": 0}
+        self.in_flight = self.max_in_flight = 0
+        self._accepted = deque()
+
+    async def complete(self, payload: Any):
+        """Handle one chat completion request."""
+        if not isinstance(payload, dict) or not isinstance(payload.get("messages"), list):
+            raise HttpError(400, "Expected a JSON object with a 'messages' list")
+        self.counts["requests"] += 1
+        now = time.monotonic()
+        while self._accepted and now - self._accepted[0] >= 60.0:
+            self._accepted.popleft()
+        if self.requests_per_minute and len(self._accepted) >= self.requests_per_minute:
+            self.counts["rate_limited"] += 1
+            wait = 60.0 - (now - self._accepted[0])
+            return 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}, \
+                {"Retry-After": f"{wait:.2f}"}
+        self._accepted.append(now)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if self.rng.random() < self.error_rate:
+            self.counts["failed"] += 1
+            status = self.rng.choice((500, 503))
+            return status, {"error": {"message": "Injected failure", "type": "server_error"}}
+
+        self.counts["ok"] += 1
+        text = stub_reply(payload["messages"])
+        prompt_tokens = sum(len(_message_text(m).split()) for m in payload["messages"])
+        return 200, {
+            "id": f"stub-{self.counts['ok']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": 2,
+                "total_tokens": prompt_tokens + 2,
+            },
+        }
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8001) -> asyncio.AbstractServer:
+        """Start serving both chat completion paths."""
+        return await serve_json({("POST", path): self.complete for path in CHAT_PATHS}, host, port)
+
+class StubStatusError(Exception):
+    """Non-200 answer of the stub, shaped like the provider SDK errors."""
+
+    def __init__(self, status_code: int, retry_after: Optional[str]):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+async def _check(args) -> None:
+    stub = StubChatServer(args.latency, args.rpm, args.error_rate, seed=0)
+    server = await stub.serve(args.host, 0)
+    port = server.sockets[0].getsockname()[1]
+    clients = asyncio.Queue()
+    for _ in range(args.concurrency):
+        clients.put_nowait(JsonHttpClient(args.host, port))
+
+    async def chat(page: int) -> str:
+        client = await clients.get()
+        try:
+            status, body = await client.request("POST", CHAT_PATHS[page % 2], {
+                "model": "stub",
+                "messages": [{"role": "user", "content": f"page {page}"}],
+            })
+            if status != 200:
+                raise StubStatusError(status, client.last_headers.get("retry-after"))
+            return body["choices"][0]["message"]["content"]
+        finally:
+            clients.put_nowait(client)
+
+    engine = RequestEngine(EngineConfig(
+        concurrency=args.concurrency,
+        requests_per_minute=args.engine_rpm,
+        backoff_base=args.backoff_base,
+        max_retries=args.max_retries
+    ))
+    start = time.perf_counter()
+    order, failed = [], 0
+    async for page, result in engine.map(chat, range(args.check)):
+        order.append(page)
+        if isinstance(result, Exception):
+            failed += 1
+        elif result != stub_reply([{"role": "user", "content": f"page {page}"}]):
+            raise AssertionError(f"Page {page} got the reply of another page")
+    seconds = time.perf_counter() - start
+    engine.close()
+    server.close()
+    while not clients.empty():
+        await clients.get_nowait().close()
+
+    assert order == list(range(args.check)), "Results are not in input order"
+    sequential = args.check * (args.latency + 1.0)
+    print(f"{args.check} pages in {seconds:.2f}s ({args.check / seconds:.1f} pages/s), "
+          f"{failed} failed; the sequential loop with sleep(1) needs about {sequential:.0f}s")
+    print(f"Engine: {engine.report()}")
+    print(f"Stub: {stub.counts}, max in flight {stub.max_in_flight}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per answer")
+    parser.add_argument("--rpm", type=float, default=0.0, help="stub requests/min limit; 0 disables")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500/503 answers")
+    parser.add_argument("--check", type=int, default=0,
+                        help="run the request engine over this many pages against the stub and exit")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--engine-rpm", type=float, default=0.0, help="engine requests/min limit in --check")
+    parser.add_argument("--backoff-base", type=float, default=0.5)
+    parser.add_argument("--max-retries", type=int, default=6)
+    args = parser.parse_args()
+
+    if args.check:
+        asyncio.run(_check(args))
+        return
+
+    async def run():
+        stub = StubChatServer(args.latency, args.rpm, args.error_rate)
+        server = await stub.serve(args.host, args.port)
+        print(f"Stub chat server on http://{args.host}:{args.port} ({', '.join(CHAT_PATHS)})")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import sys
 
 def main():
     if len(sys.argv) < 3:
-        print("Usage: python main.py [LayoutLMv3_T5|LayoutLMv3_T2] [finetune|inference]")
+        print("Usage: python main.py [LayoutLMv3_T5|Llama_4_Maverick|Pixtral_12B|XYCut] [finetune|inference|preprocess|export|export_weights|serve]")
         return
 
     model = sys.argv[1]
@@ -12,9 +12,17 @@ def main():
         if action == "finetune":
             from LayoutLMv3_T5.fine_tune.train import start_execution
         elif action == "inference":
-            from LayoutLMv3_T5.inference import start_execution
+            from LayoutLMv3_T5.inference.inference import start_execution
+        elif action == "preprocess":
+            from LayoutLMv3_T5.fine_tune.preprocess import start_execution
+        elif action == "export":
+            from LayoutLMv3_T5.inference.export import start_execution
+        elif action == "export_weights":
+            from LayoutLMv3_T5.inference.weights import start_execution
+        elif action == "serve":
+            from LayoutLMv3_T5.inference.server import start_execution
         else:
-            print("Action must be 'finetune' or 'inference'")
+            print("Action must be 'finetune', 'inference', 'preprocess', 'export', 'export_weights' or 'serve'")
             return
     elif model == "Llama_4_Maverick":
         if action == "finetune":
@@ -24,6 +32,12 @@ def main():
         else:
             print("Action must be 'finetune' or 'inference'")
             return
+    elif model == "XYCut":
+        if action == "inference":
+            from XYCut.inference.inference import start_execution
+        else:
+            print("Action must be 'inference'")
+            return
     elif model == "Pixtral_12B":
         if action == "finetune":
             from Pixtral.fine_tune.train import start_execution
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from common.request_engine import EngineConfig, RequestEngine
+
+def _run(engine, fn, items, lookup):
+    async def collect():
+        return [pair async for pair in engine.map(fn, items, estimate_tokens=lambda item: 1000, lookup=lookup)]
+    try:
+        return asyncio.run(collect())
+    finally:
+        engine.close()
+
+def _limited_engine():
+    # One request and 1000 tokens per second: a second request would wait about a second
+    return RequestEngine(EngineConfig(concurrency=4, requests_per_minute=60, tokens_per_minute=60000))
+
+def test_looked_up_items_skip_the_rate_limits():
+    def request(item):
+        raise AssertionError(f"item {item} was requested although it was looked up")
+
+    engine = _limited_engine()
+    start = time.perf_counter()
+    results = _run(engine, request, range(60), lookup=lambda item: f"cached {item}")
+    assert time.perf_counter() - start < 1.0
+    assert results == [(item, f"cached {item}") for item in range(60)]
+    assert engine.stats["requests"] == 0
+    assert engine.stats["looked_up"] == 60
+    assert engine.requests.waited == 0.0 and engine.tokens.waited == 0.0
+    assert engine.requests.tokens == engine.requests.capacity
+    assert engine.tokens.tokens == engine.tokens.capacity
+
+def test_lookup_misses_are_requested_in_input_order():
+    engine = _limited_engine()
+    results = _run(engine, lambda item: f"requested {item}", range(6),
+                   lookup=lambda item: f"cached {item}" if item % 3 else None)
+    assert [result for _, result in results] == [
+        "requested 0", "cached 1", "cached 2", "requested 3", "cached 4", "cached 5"]
+    assert engine.stats["requests"] == 2
+    assert engine.stats["looked_up"] == 4
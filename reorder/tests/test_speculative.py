@@ -0,0 +1,21 @@
+import torch
+
+from LayoutLMv3_T5.inference.speculative import CopySpeculativeDecoder
+
+def _decoder(ngram_size=3):
+    # draft only reads the source, so no model is needed
+    return CopySpeculativeDecoder(None, num_draft_tokens=10, ngram_size=ngram_size)
+
+def test_draft_copies_the_tokens_after_the_longest_matching_ngram():
+    source = torch.tensor([1, 2, 3, 4, 2, 3, 5, 6])
+    assert _decoder().draft([9, 2, 3], source, limit=10) == [4, 2, 3, 5, 6]
+    assert _decoder().draft([4, 2, 3], source, limit=2) == [5, 6]
+
+def test_draft_falls_back_to_shorter_ngrams_on_short_sources():
+    source = torch.tensor([5, 6])
+    assert _decoder(ngram_size=3).draft([7, 8, 5], source, limit=10) == [6]
+
+def test_draft_is_empty_without_a_match_or_budget():
+    source = torch.tensor([1, 2, 3, 4])
+    assert _decoder().draft([7, 8, 9], source, limit=10) == []
+    assert _decoder().draft([1, 2], source, limit=0) == []